@@ -52,16 +52,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Static files are answered before sessions, auth and the role routing run
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Moved to end
 
     # My Middleware
     'main_app.middleware.LoginCheckMiddleWare',
+    'main_app.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'college_management_system.urls'
@@ -110,6 +112,54 @@ DATABASES = {
 }
 
 
+# Cache
+# Local-memory by default; point DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION at
+# a file, memcached or redis backend to share snapshots between workers.
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', LOCMEM_CACHE)
+SESSION_CACHE_BACKEND = os.environ.get('SESSION_CACHE_BACKEND', CACHE_BACKEND)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'crm-default'),
+    },
+    # Kept apart from 'default' so clearing snapshots never logs anyone out
+    'sessions': {
+        'BACKEND': SESSION_CACHE_BACKEND,
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'crm-sessions'),
+    },
+}
+
+# Sessions
+# cached_db serves session reads from the 'sessions' cache and writes through
+# to django_session. It is only the default when that cache is shared by all
+# workers (file, memcached, redis): with a per-process cache, a logout or
+# session change in one worker would leave the others serving their cached
+# copy until it expired, so sessions stay in the database alone.
+# Messages live in a signed cookie and never touch the session.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', (
+    'django.contrib.sessions.backends.db' if SESSION_CACHE_BACKEND == LOCMEM_CACHE
+    else 'django.contrib.sessions.backends.cached_db'
+))
+SESSION_CACHE_ALIAS = 'sessions'
+MESSAGE_STORAGE = os.environ.get('MESSAGE_STORAGE', 'django.contrib.messages.storage.cookie.CookieStorage')
+# Expired rows are deleted by `run_worker` every SESSION_PRUNE_INTERVAL seconds
+# (0 disables) or by `python manage.py prune_sessions`, SESSION_PRUNE_BATCH_SIZE at a time
+SESSION_PRUNE_INTERVAL = int(os.environ.get('SESSION_PRUNE_INTERVAL', 60 * 60))
+SESSION_PRUNE_BATCH_SIZE = int(os.environ.get('SESSION_PRUNE_BATCH_SIZE', 5000))
+
+# Unread notification badge counts (see main_app/notifications.py). Signals drop
+# a count when notifications change, but only in the cache of the worker that
+# made the change, so with a per-process cache counts expire within seconds.
+NOTIFICATION_COUNT_TIMEOUT = int(os.environ.get('NOTIFICATION_COUNT_TIMEOUT', 5 if CACHE_BACKEND == LOCMEM_CACHE else 60 * 60))
+
+# Dashboard snapshots (see main_app/snapshots.py). Invalidation only reaches the
+# process that made the change (imports and workflows run in `run_worker`), so
+# with the per-process cache snapshots live seconds rather than minutes
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 5 if CACHE_BACKEND == LOCMEM_CACHE else 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -174,19 +224,72 @@ STATICFILES_DIRS = [
 # Use Django's default static files storage
 # STATICFILES_STORAGE = 'whitenoise.storage.StaticFilesStorage'
 
-# Update database configuration for production
-try:
-    prod_db = dj_database_url.config(conn_max_age=500)
-    if prod_db:
-        DATABASES['default'].update(prod_db)
-except Exception as e:
-    print(f"Database configuration error: {e}")
-    # Fall back to SQLite if production database fails
-    pass
+# Database connections
+# Every gunicorn worker thread keeps its connection for DATABASE_CONN_MAX_AGE
+# seconds (0 = reconnect per request, None = forever) and pings it before
+# reusing it, so a restarted database costs one reconnect instead of a 500.
+# Workers x threads is the connection count per instance; keep it under the
+# server's max_connections, or put PgBouncer in front and set
+# DATABASE_POOLER=pgbouncer (transaction pooling can't keep the server-side
+# cursors .iterator() uses on PostgreSQL, so those are disabled).
+DATABASE_CONN_MAX_AGE = os.environ.get('DATABASE_CONN_MAX_AGE', '600')
+DATABASES['default'].update(
+    CONN_MAX_AGE=None if DATABASE_CONN_MAX_AGE.lower() == 'none' else int(DATABASE_CONN_MAX_AGE),
+    CONN_HEALTH_CHECKS=os.environ.get('DATABASE_CONN_HEALTH_CHECKS', 'True').lower() == 'true',
+)
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default'].setdefault('OPTIONS', {}).update(
+        connect_timeout=int(os.environ.get('DATABASE_CONNECT_TIMEOUT', 5)),
+    )
+    if os.environ.get('DATABASE_POOLER', '').lower() == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+
+# Lead import (see main_app/lead_import.py)
+LEAD_IMPORT_CHUNK_SIZE = int(os.environ.get('LEAD_IMPORT_CHUNK_SIZE', 5000))
+LEAD_IMPORT_BATCH_SIZE = int(os.environ.get('LEAD_IMPORT_BATCH_SIZE', 1000))
+# Imports are queued for `python manage.py run_worker`; set to False to run them in the request
+LEAD_IMPORT_BACKGROUND = os.environ.get('LEAD_IMPORT_BACKGROUND', 'True').lower() == 'true'
+# Seconds after which a RUNNING import is taken to have lost its worker and is marked failed
+IMPORT_JOB_TIMEOUT = int(os.environ.get('IMPORT_JOB_TIMEOUT', 2 * 60 * 60))
+
+# Lead assignment (see main_app/assignment.py): leads per UPDATE ... WHERE id IN (...)
+LEAD_ASSIGNMENT_BATCH_SIZE = int(os.environ.get('LEAD_ASSIGNMENT_BATCH_SIZE', 900))
+
+# Exports (see main_app/exports.py). Excel files are built inside the request,
+# so past XLSX_EXPORT_MAX_ROWS rows an export is streamed as CSV instead; keep
+# it to what a worker writes well within GUNICORN_TIMEOUT
+XLSX_EXPORT_MAX_ROWS = int(os.environ.get('XLSX_EXPORT_MAX_ROWS', 100000))
 
 
 # AI/LLM Settings
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+AI_API_URL = os.environ.get('AI_API_URL', 'https://api.openai.com/v1/responses')
+AI_MODEL = os.environ.get('AI_MODEL', 'gpt-4o-mini')
+AI_TIMEOUT = float(os.environ.get('AI_TIMEOUT', 20))
+AI_DEADLINE = float(os.environ.get('AI_DEADLINE', 45))  # seconds per call, retries included
+AI_CLIENT_POOL_SIZE = int(os.environ.get('AI_CLIENT_POOL_SIZE', 10))
+AI_CIRCUIT_FAILURES = int(os.environ.get('AI_CIRCUIT_FAILURES', 5))
+AI_CIRCUIT_RESET = float(os.environ.get('AI_CIRCUIT_RESET', 30))
+# Model answers are cached in the database by model + prompt hash (see main_app/llm_cache.py)
+AI_CACHE_ENABLED = os.environ.get('AI_CACHE_ENABLED', 'True').lower() == 'true'
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 30 * 24 * 60 * 60))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 50000))
+# Stores count the table on about one row in AI_CACHE_PRUNE_EVERY; `run_worker`
+# prunes it every AI_CACHE_PRUNE_INTERVAL seconds (0 disables)
+AI_CACHE_PRUNE_EVERY = int(os.environ.get('AI_CACHE_PRUNE_EVERY', 100))
+AI_CACHE_PRUNE_INTERVAL = int(os.environ.get('AI_CACHE_PRUNE_INTERVAL', 60 * 60))
+# Bulk scoring (see main_app/scoring.py and `python manage.py score_leads`)
+AI_SCORING_CONCURRENCY = int(os.environ.get('AI_SCORING_CONCURRENCY', 8))
+AI_SCORING_RATE_LIMIT = float(os.environ.get('AI_SCORING_RATE_LIMIT', 5))  # calls per second, 0 = unlimited
+AI_SCORING_MAX_RETRIES = int(os.environ.get('AI_SCORING_MAX_RETRIES', 3))
+AI_SCORING_BATCH_SIZE = int(os.environ.get('AI_SCORING_BATCH_SIZE', 500))
+# The lead workflow (enrich -> score -> route) runs on `python manage.py run_worker`; False runs it in the request
+AI_WORKFLOW_BACKGROUND = os.environ.get('AI_WORKFLOW_BACKGROUND', 'True').lower() == 'true'
+# Seconds after which a RUNNING workflow job is taken to have lost its worker and is queued again
+WORKFLOW_JOB_TIMEOUT = int(os.environ.get('WORKFLOW_JOB_TIMEOUT', 15 * 60))
+# Seconds a model-backed workflow step result is reused for unchanged lead fields
+AI_WORKFLOW_STEP_CACHE_TIMEOUT = int(os.environ.get('AI_WORKFLOW_STEP_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
 
 # Logging configuration
 LOGGING = {
@@ -207,9 +310,37 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'main_app.profiling': {
+            'handlers': ['console'],
+            'level': os.environ.get('PROFILING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
     },
 }
 
+# Request profiling (see main_app/middleware.py ProfilingMiddleware): wall time,
+# query count and DB time per request, logged, sent as Server-Timing and kept
+# for /analytics/profiling/
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True').lower() == 'true'
+PROFILING_BUFFER_SIZE = int(os.environ.get('PROFILING_BUFFER_SIZE', 500))
+PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', 500))
+# Most queries a view may run, by URL name; QUERY_BUDGET_STRICT (on in the
+# test suite) turns an overrun into an error instead of a warning
+QUERY_BUDGETS = {
+    'admin_home': 10,
+    'counsellor_home': 8,
+    'manage_leads': 5,
+    'manage_leads_data': 6,
+    'my_leads_data': 5,
+    'search_leads': 5,
+    'assignment_workload': 5,
+    'counsellor_performance': 11,
+    'manage_businesses': 4,
+    'my_activities': 4,
+}
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False').lower() == 'true'
+
 
 #pip install -r requirements.txt && python manage.py migrate && echo "from django.contrib.auth import get_user_model; User = get_user_model(); User.objects.filter(email='admin@example.com').exists() or User.objects.create_superuser('admin@example.com', 'admin123')" | python manage.py shell
 
@@ -0,0 +1,19 @@
+# Gunicorn settings for the web process (Procfile: gunicorn -c gunicorn.conf.py ...).
+# Each worker thread holds one persistent database connection (see
+# DATABASE_CONN_MAX_AGE in settings.py), so GUNICORN_WORKERS x GUNICORN_THREADS
+# is this instance's share of the database's max_connections.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so slow leaks can't build up; the jitter keeps
+# them from all restarting (and reconnecting) at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import *
+from .scoring import score_leads
+from .search import search_filter
 
 # Register your models here.
 
@@ -16,6 +18,7 @@ class CounsellorAdmin(admin.ModelAdmin):
     list_filter = ('department', 'is_active', 'performance_rating')
     search_fields = ('employee_id', 'admin__first_name', 'admin__last_name', 'admin__email')
     ordering = ('employee_id',)
+    readonly_fields = Counsellor.COUNTER_FIELDS
 
 class LeadSourceAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'created_at')
@@ -28,6 +31,16 @@ class LeadAdmin(admin.ModelAdmin):
     search_fields = ('lead_id', 'first_name', 'last_name', 'email', 'phone', 'company')
     ordering = ('-created_at',)
     readonly_fields = ('lead_id', 'created_at')
+    actions = ['score_selected_leads']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index rather than an icontains scan per search field
+        return search_filter(queryset, search_term), False
+
+    @admin.action(description='Score selected leads (AI with heuristic fallback)')
+    def score_selected_leads(self, request, queryset):
+        report = score_leads(queryset)
+        self.message_user(request, f"Scored {report['scored']} leads ({report['ai']} by AI, {report['cached']} from cache, {report['fallback']} by heuristic).")
 
 class LeadActivityAdmin(admin.ModelAdmin):
     list_display = ('lead', 'counsellor', 'activity_type', 'subject', 'outcome', 'scheduled_date', 'completed_date')
@@ -66,6 +79,24 @@ class NotificationAdminAdmin(admin.ModelAdmin):
     search_fields = ('message',)
     ordering = ('-created_at',)
 
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'file', 'source', 'status', 'rows_processed', 'rows_created', 'error_count', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    ordering = ('-created_at',)
+    readonly_fields = ('errors',)
+
+class WorkflowJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'lead', 'status', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    ordering = ('-created_at',)
+    readonly_fields = ('result',)
+
+class LLMResponseAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model', 'hits', 'created_at', 'last_used_at', 'expires_at')
+    list_filter = ('model',)
+    search_fields = ('key', 'response')
+    ordering = ('-last_used_at',)
+
 # Register models
 admin.site.register(CustomUser, UserModel)
 admin.site.register(Counsellor, CounsellorAdmin)
@@ -77,3 +108,6 @@ admin.site.register(LeadTransfer, LeadTransferAdmin)
 admin.site.register(CounsellorPerformance, CounsellorPerformanceAdmin)
 admin.site.register(NotificationCounsellor, NotificationCounsellorAdmin)
 admin.site.register(NotificationAdmin, NotificationAdminAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
+admin.site.register(WorkflowJob, WorkflowJobAdmin)
+admin.site.register(LLMResponse, LLMResponseAdmin)
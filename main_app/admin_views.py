@@ -1,6 +1,7 @@
 import json
 import pandas as pd
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
 from django.http import HttpResponse, JsonResponse
@@ -14,119 +15,50 @@ from django.contrib.auth.hashers import make_password
 from django.db.models import Count, Sum, Avg, Q, Case, When, Value, DecimalField
 from django.utils import timezone
 
+from . import llm_cache
+from .ai_client import client_stats
+from .assignment import STRATEGIES, assign_leads
+from .dashboard import build_admin_dashboard, build_lead_analytics
+from .exports import BUSINESS_COLUMNS, LEAD_COLUMNS, export_response, filter_businesses
 from .forms import *
+from .jobs import claim_import, enqueue_import, run_import_job
+from .lead_listing import ROW_FIELDS, filter_leads, get_ordering, lead_page, serialize_lead
 from .models import *
+from .performance import month_of, performance_rows, rebuild_performance
+from .profiling import profile_summary, recent_requests
+from .search import ranked_lead_ids
+from .snapshots import get_snapshot
+from .workload import workload_summary
 
 
 def admin_home(request):
     """Admin Dashboard with comprehensive CRM analytics"""
     
     try:
-        # Basic Statistics
-        total_counsellors = Counsellor.objects.filter(is_active=True).count()
-        total_leads = Lead.objects.count()
-        total_business = Business.objects.filter(status='ACTIVE').aggregate(
-            total=Sum('value'))['total'] or 0
-        
-        # Lead Statistics
-        new_leads = Lead.objects.filter(status='NEW').count()
-        contacted_leads = Lead.objects.filter(status='CONTACTED').count()
-        qualified_leads = Lead.objects.filter(status='QUALIFIED').count()
-        closed_won = Lead.objects.filter(status='CLOSED_WON').count()
-        closed_lost = Lead.objects.filter(status='CLOSED_LOST').count()
-        
-        # Monthly Performance
-        current_month = timezone.now().replace(day=1)
-        monthly_leads = Lead.objects.filter(created_at__gte=current_month).count()
-        monthly_business = Business.objects.filter(
-            created_at__gte=current_month, status='ACTIVE'
-        ).aggregate(total=Sum('value'))['total'] or 0
-        
-        # Lead Source Distribution
-        lead_sources = LeadSource.objects.annotate(
-            lead_count=Count('lead')
-        ).values('name', 'lead_count')
-        
-        # Counsellor Performance
-        counsellor_performance = Counsellor.objects.filter(is_active=True).annotate(
-            total_leads=Count('lead'),
-            total_business=Sum('business__value'),
-            conversion_rate=Case(
-                When(total_leads=0, then=Value(0.0)),
-                default=Count('business') * 100.0 / Count('lead'),
-                output_field=DecimalField()
-            )
-        ).values('admin__first_name', 'admin__last_name', 'total_leads', 'total_business', 'conversion_rate')
-        
-        # Recent Activities
-        recent_activities = LeadActivity.objects.select_related(
-            'lead', 'counsellor__admin'
-        ).order_by('-completed_date')[:10]
-        
-        # Lead Status Distribution for Charts
-        lead_status_data = {
-            'NEW': new_leads,
-            'CONTACTED': contacted_leads,
-            'QUALIFIED': qualified_leads,
-            'CLOSED_WON': closed_won,
-            'CLOSED_LOST': closed_lost
-        }
-        
-        # Monthly Trend Data (Last 6 months)
-        monthly_trend = []
-        for i in range(6):
-            month_start = current_month - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=30)
-            month_leads = Lead.objects.filter(
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).count()
-            month_business = Business.objects.filter(
-                created_at__gte=month_start,
-                created_at__lt=month_end,
-                status='ACTIVE'
-            ).aggregate(total=Sum('value'))['total'] or 0
-            monthly_trend.append({
-                'month': month_start.strftime('%B %Y'),
-                'leads': month_leads,
-                'business': float(month_business)
-            })
-        
+        snapshot = get_snapshot('admin_home', build_admin_dashboard)
     except Exception as e:
         # Fallback values if there's an error
-        total_counsellors = 0
-        total_leads = 0
-        total_business = 0
-        new_leads = 0
-        contacted_leads = 0
-        qualified_leads = 0
-        closed_won = 0
-        closed_lost = 0
-        monthly_leads = 0
-        monthly_business = 0
-        lead_sources = []
-        counsellor_performance = []
-        recent_activities = []
-        lead_status_data = {}
-        monthly_trend = []
+        snapshot = {
+            'total_counsellors': 0,
+            'total_leads': 0,
+            'total_business': 0,
+            'new_leads': 0,
+            'contacted_leads': 0,
+            'qualified_leads': 0,
+            'closed_won': 0,
+            'closed_lost': 0,
+            'monthly_leads': 0,
+            'monthly_business': 0,
+            'lead_sources': [],
+            'counsellor_performance': [],
+            'recent_activities': [],
+            'lead_status_data': {},
+            'monthly_trend': [],
+        }
     
     context = {
         'page_title': "CRM Admin Dashboard",
-        'total_counsellors': total_counsellors,
-        'total_leads': total_leads,
-        'total_business': total_business,
-        'new_leads': new_leads,
-        'contacted_leads': contacted_leads,
-        'qualified_leads': qualified_leads,
-        'closed_won': closed_won,
-        'closed_lost': closed_lost,
-        'monthly_leads': monthly_leads,
-        'monthly_business': monthly_business,
-        'lead_sources': list(lead_sources),
-        'counsellor_performance': list(counsellor_performance),
-        'recent_activities': recent_activities,
-        'lead_status_data': lead_status_data,
-        'monthly_trend': monthly_trend,
+        **snapshot,
     }
     return render(request, 'admin_template/home_content.html', context)
 
@@ -207,15 +139,49 @@ def delete_counsellor(request, counsellor_id):
 
 
 def manage_leads(request):
-    """Manage all leads"""
-    leads = Lead.objects.select_related('source', 'assigned_counsellor__admin').all()
+    """Manage all leads (rows are loaded page by page from manage_leads_data)"""
     context = {
-        'leads': leads,
+        'sources': LeadSource.objects.all(),
+        'counsellors': Counsellor.objects.filter(is_active=True).select_related('admin'),
+        'statuses': Lead.LEAD_STATUS,
+        'priorities': Lead.PRIORITY,
         'page_title': 'Manage Leads'
     }
     return render(request, 'admin_template/manage_leads.html', context)
 
 
+def manage_leads_data(request):
+    """Server-side DataTables endpoint for the lead listing"""
+    return JsonResponse(lead_page(Lead.objects.all(), request.GET, Lead.objects.count()))
+
+
+def search_leads(request):
+    """AJAX endpoint: one page of leads matching ?q=, best match first"""
+    query = (request.GET.get('q') or '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    page_size = 25
+    # Fetch one extra id to know whether another page follows, without counting every match
+    ids = ranked_lead_ids(query, offset=(page - 1) * page_size, limit=page_size + 1)
+    rows = {row['id']: row for row in Lead.objects.filter(id__in=ids[:page_size]).values(*ROW_FIELDS)}
+    return JsonResponse({
+        'query': query,
+        'page': page,
+        'has_next': len(ids) > page_size,
+        'results': [serialize_lead(rows[lead_id]) for lead_id in ids[:page_size] if lead_id in rows],
+    })
+
+
+def export_leads(request):
+    """Download the lead listing, with its current filters and ordering, as CSV or XLSX"""
+    field, descending = get_ordering(request.GET)
+    prefix = '-' if descending else ''
+    leads = filter_leads(Lead.objects.all(), request.GET).order_by(f'{prefix}{field}', f'{prefix}id')
+    return export_response(leads, LEAD_COLUMNS, 'leads', request.GET.get('format'))
+
+
 def add_lead(request):
     """Add new lead manually"""
     form = LeadForm(request.POST or None)
@@ -267,95 +233,71 @@ def delete_lead(request, lead_id):
 
 
 def import_leads(request):
-    """Import leads from Excel/CSV file with automatic assignment options"""
+    """Queue an Excel/CSV lead import (with automatic assignment options) as a background job"""
     form = LeadImportForm(request.POST or None, request.FILES or None)
     context = {'form': form, 'page_title': 'Import Leads'}
     
     if request.method == 'POST':
         if form.is_valid():
             try:
-                file = form.cleaned_data['file']
-                source = form.cleaned_data['source']
-                assigned_counsellor = form.cleaned_data.get('assigned_counsellor')
-                auto_assign = request.POST.get('auto_assign', False)
-                assignment_method = request.POST.get('assignment_method', 'round_robin')
-                
-                # Read the file
-                if file.name.endswith('.csv'):
-                    df = pd.read_csv(file)
-                else:
-                    df = pd.read_excel(file)
-                
-                success_count = 0
-                error_count = 0
-                imported_leads = []
-                
-                for index, row in df.iterrows():
-                    try:
-                        # Create lead from row data
-                        lead_data = {
-                            'first_name': row.get('first_name', ''),
-                            'last_name': row.get('last_name', ''),
-                            'email': row.get('email', ''),
-                            'phone': str(row.get('phone', '')),
-                            'company': row.get('company', ''),
-                            'position': row.get('position', ''),
-                            'industry': row.get('industry', ''),
-                            'source': source,
-                            'assigned_counsellor': assigned_counsellor,
-                            'expected_value': row.get('expected_value', 0),
-                            'notes': row.get('notes', ''),
-                            'address': row.get('address', ''),
-                            'city': row.get('city', ''),
-                            'state': row.get('state', ''),
-                            'country': row.get('country', ''),
-                            'postal_code': str(row.get('postal_code', '')),
-                            'website': row.get('website', ''),
-                            'linkedin': row.get('linkedin', ''),
-                        }
-                        
-                        lead = Lead.objects.create(**lead_data)
-                        imported_leads.append(lead)
-                        success_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        continue
-                
-                # Auto-assign leads if requested
-                if auto_assign and imported_leads and not assigned_counsellor:
-                    try:
-                        active_counsellors = Counsellor.objects.filter(is_active=True)
-                        if active_counsellors.exists():
-                            unassigned_leads = [lead for lead in imported_leads if not lead.assigned_counsellor]
-                            
-                            if assignment_method == 'round_robin':
-                                _assign_round_robin(unassigned_leads, active_counsellors)
-                            elif assignment_method == 'workload_balanced':
-                                _assign_workload_balanced(unassigned_leads, active_counsellors)
-                            elif assignment_method == 'performance_based':
-                                _assign_performance_based(unassigned_leads, active_counsellors)
-                            elif assignment_method == 'specialization_based':
-                                _assign_specialization_based(unassigned_leads, active_counsellors)
-                            
-                            messages.success(request, f"Successfully imported {success_count} leads and auto-assigned them using {assignment_method.replace('_', ' ').title()} method. {error_count} errors occurred.")
-                        else:
-                            messages.warning(request, f"Successfully imported {success_count} leads but no active counsellors found for auto-assignment. {error_count} errors occurred.")
-                    except Exception as e:
-                        messages.warning(request, f"Successfully imported {success_count} leads but auto-assignment failed: {str(e)}. {error_count} errors occurred.")
+                try:
+                    default_value = float(request.POST.get('default_value') or 0)
+                except ValueError:
+                    default_value = 0
+                job = enqueue_import(
+                    form.cleaned_data['file'],
+                    form.cleaned_data['source'],
+                    assigned_counsellor=form.cleaned_data.get('assigned_counsellor'),
+                    created_by=request.user,
+                    status=request.POST.get('default_status', 'NEW'),
+                    priority=request.POST.get('default_priority', 'MEDIUM'),
+                    default_value=default_value,
+                    skip_duplicates=bool(request.POST.get('skip_duplicates')),
+                    auto_assign=bool(request.POST.get('auto_assign')),
+                    assignment_method=request.POST.get('assignment_method', 'round_robin'),
+                )
+                claimed = None
+                if not settings.LEAD_IMPORT_BACKGROUND:
+                    # No worker configured: run the job inside this request
+                    claimed = claim_import(job.pk)
+                    if claimed is not None:
+                        run_import_job(claimed)
+                if claimed is None:
+                    messages.success(request, "Import queued. Progress is shown below.")
+                elif claimed.status == 'COMPLETED':
+                    messages.success(request, f"Import finished: {claimed.rows_created} leads created, "
+                                              f"{claimed.rows_skipped} skipped, {claimed.error_count} rows with errors.")
                 else:
-                    messages.success(request, f"Successfully imported {success_count} leads. {error_count} errors occurred.")
-                
-                return redirect(reverse('manage_leads'))
+                    messages.error(request, claimed.message)
+                return redirect(reverse('import_leads') + f'?job={job.pk}')
                 
             except Exception as e:
                 messages.error(request, f"Import failed: {str(e)}")
         else:
             messages.error(request, "Please fill the form properly!")
     
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        context['job'] = ImportJob.objects.filter(pk=job_id).first()
     return render(request, 'admin_template/import_leads.html', context)
 
 
+def import_job_status(request, job_id):
+    """AJAX endpoint polled by the import page for job progress"""
+    job = get_object_or_404(ImportJob, pk=job_id)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'finished': job.is_finished,
+        'rows_processed': job.rows_processed,
+        'rows_created': job.rows_created,
+        'rows_skipped': job.rows_skipped,
+        'error_count': job.error_count,
+        'errors': job.errors[:50],
+        'message': job.message,
+    })
+
+
 def assign_leads_to_counsellors(request):
     """Automatically assign unassigned leads to counsellors using multiple strategies"""
     if request.method == 'POST':
@@ -372,18 +314,9 @@ def assign_leads_to_counsellors(request):
                 messages.info(request, "No unassigned leads found!")
                 return redirect(reverse('manage_leads'))
             
-            assigned_count = 0
-            
-            if assignment_method == 'round_robin':
-                assigned_count = _assign_round_robin(unassigned_leads, active_counsellors)
-            elif assignment_method == 'workload_balanced':
-                assigned_count = _assign_workload_balanced(unassigned_leads, active_counsellors)
-            elif assignment_method == 'performance_based':
-                assigned_count = _assign_performance_based(unassigned_leads, active_counsellors)
-            elif assignment_method == 'specialization_based':
-                assigned_count = _assign_specialization_based(unassigned_leads, active_counsellors)
-            else:
-                assigned_count = _assign_round_robin(unassigned_leads, active_counsellors)
+            if assignment_method not in STRATEGIES:
+                assignment_method = 'round_robin'
+            assigned_count = assign_leads(unassigned_leads, active_counsellors, assignment_method)
             
             messages.success(request, f"Successfully assigned {assigned_count} leads using {assignment_method.replace('_', ' ').title()} method!")
             return redirect(reverse('assign_leads_to_counsellors'))
@@ -392,223 +325,22 @@ def assign_leads_to_counsellors(request):
             messages.error(request, f"Assignment failed: {str(e)}")
     
     # GET request - show assignment page with workload summary
-    try:
-        from datetime import datetime, timedelta
-        
-        # Get unassigned leads count
-        unassigned_count = Lead.objects.filter(assigned_counsellor__isnull=True).count()
-        active_counsellors_count = Counsellor.objects.filter(is_active=True).count()
-        
-        # Calculate average leads per counsellor
-        total_assigned_leads = Lead.objects.filter(assigned_counsellor__isnull=False).count()
-        avg_leads_per_counsellor = round(total_assigned_leads / active_counsellors_count, 1) if active_counsellors_count > 0 else 0
-        
-        # Find oldest unassigned lead
-        oldest_unassigned = Lead.objects.filter(assigned_counsellor__isnull=True).order_by('created_at').first()
-        oldest_unassigned_days = 0
-        if oldest_unassigned:
-            oldest_unassigned_days = (datetime.now().replace(tzinfo=None) - oldest_unassigned.created_at.replace(tzinfo=None)).days
-        
-        # Get counsellor workload data
-        counsellor_workload = []
-        for counsellor in Counsellor.objects.filter(is_active=True):
-            lead_count = Lead.objects.filter(assigned_counsellor=counsellor).count()
-            
-            # Determine capacity and workload status
-            if lead_count <= 10:
-                capacity = "Low (≤10 leads)"
-                workload_status = "LOW"
-            elif lead_count <= 25:
-                capacity = "Medium (11-25 leads)"
-                workload_status = "MEDIUM"
-            else:
-                capacity = "High (26+ leads)"
-                workload_status = "HIGH"
-            
-            counsellor_workload.append({
-                'admin': counsellor.admin,
-                'department': counsellor.department,
-                'lead_count': lead_count,
-                'capacity': capacity,
-                'workload_status': workload_status
-            })
-        
-        context = {
-            'page_title': 'Assign Leads to Counsellors',
-            'unassigned_count': unassigned_count,
-            'active_counsellors_count': active_counsellors_count,
-            'avg_leads_per_counsellor': avg_leads_per_counsellor,
-            'oldest_unassigned_days': oldest_unassigned_days,
-            'counsellor_workload': counsellor_workload
-        }
-        
-        return render(request, 'admin_template/assign_leads.html', context)
-        
-    except Exception as e:
-        messages.error(request, f"Error loading assignment page: {str(e)}")
-        return redirect(reverse('manage_leads'))
-
-
-def _assign_round_robin(unassigned_leads, active_counsellors):
-    """Round-robin assignment - distribute leads evenly"""
-    counsellor_list = list(active_counsellors)
-    assigned_count = 0
-    
-    for i, lead in enumerate(unassigned_leads):
-        counsellor = counsellor_list[i % len(counsellor_list)]
-        lead.assigned_counsellor = counsellor
-        lead.save()
-        assigned_count += 1
-    
-    return assigned_count
-
-
-def _assign_workload_balanced(unassigned_leads, active_counsellors):
-    """Workload-balanced assignment - assign to counsellors with fewer leads"""
-    assigned_count = 0
-    
-    # Get current workload for each counsellor
-    counsellor_workload = {}
-    for counsellor in active_counsellors:
-        lead_count = Lead.objects.filter(assigned_counsellor=counsellor).count()
-        counsellor_workload[counsellor.id] = {
-            'counsellor': counsellor,
-            'lead_count': lead_count
-        }
-    
-    # Sort counsellors by workload (ascending)
-    sorted_counsellors = sorted(counsellor_workload.values(), key=lambda x: x['lead_count'])
-    
-    for lead in unassigned_leads:
-        # Assign to counsellor with least workload
-        counsellor = sorted_counsellors[0]['counsellor']
-        lead.assigned_counsellor = counsellor
-        lead.save()
-        
-        # Update workload count
-        sorted_counsellors[0]['lead_count'] += 1
-        
-        # Re-sort to maintain balance
-        sorted_counsellors.sort(key=lambda x: x['lead_count'])
-        assigned_count += 1
-    
-    return assigned_count
-
-
-def _assign_performance_based(unassigned_leads, active_counsellors):
-    """Performance-based assignment - assign to top-performing counsellors"""
-    assigned_count = 0
-    
-    # Calculate performance metrics for each counsellor
-    counsellor_performance = {}
-    for counsellor in active_counsellors:
-        total_leads = Lead.objects.filter(assigned_counsellor=counsellor).count()
-        closed_won = Lead.objects.filter(assigned_counsellor=counsellor, status='CLOSED_WON').count()
-        try:
-            conversion_rate = (closed_won / total_leads * 100) if total_leads > 0 else 0
-        except ZeroDivisionError:
-            conversion_rate = 0
-        
-        counsellor_performance[counsellor.id] = {
-            'counsellor': counsellor,
-            'conversion_rate': conversion_rate,
-            'total_leads': total_leads
-        }
-    
-    # Sort by conversion rate (descending) and then by total leads (ascending)
-    sorted_counsellors = sorted(
-        counsellor_performance.values(),
-        key=lambda x: (-x['conversion_rate'], x['total_leads'])
-    )
-    
-    for lead in unassigned_leads:
-        # Assign to top-performing counsellor
-        counsellor = sorted_counsellors[0]['counsellor']
-        lead.assigned_counsellor = counsellor
-        lead.save()
-        
-        # Update lead count
-        sorted_counsellors[0]['total_leads'] += 1
-        
-        # Re-sort to maintain performance-based order
-        sorted_counsellors.sort(key=lambda x: (-x['conversion_rate'], x['total_leads']))
-        assigned_count += 1
-    
-    return assigned_count
+    summary = workload_summary()
+    context = {
+        'page_title': 'Assign Leads to Counsellors',
+        'unassigned_count': summary['unassigned_count'],
+        'active_counsellors_count': summary['active_counsellors_count'],
+        'avg_leads_per_counsellor': summary['avg_leads_per_counsellor'],
+        'oldest_unassigned_days': summary['oldest_unassigned_days'],
+        'capacity_buckets': summary['capacity_buckets'],
+        'counsellor_workload': summary['counsellors'],
+    }
+    return render(request, 'admin_template/assign_leads.html', context)
 
 
-def _assign_specialization_based(unassigned_leads, active_counsellors):
-    """Specialization-based assignment - assign based on counsellor expertise"""
-    assigned_count = 0
-    
-    # Get counsellor specializations (based on department and past performance)
-    counsellor_specializations = {}
-    for counsellor in active_counsellors:
-        # Get counsellor's success rate by industry/source
-        industry_success = {}
-        source_success = {}
-        
-        counsellor_leads = Lead.objects.filter(assigned_counsellor=counsellor)
-        for lead in counsellor_leads:
-            if lead.industry:
-                if lead.industry not in industry_success:
-                    industry_success[lead.industry] = {'total': 0, 'won': 0}
-                industry_success[lead.industry]['total'] += 1
-                if lead.status == 'CLOSED_WON':
-                    industry_success[lead.industry]['won'] += 1
-            
-            if lead.source:
-                if lead.source.id not in source_success:
-                    source_success[lead.source.id] = {'total': 0, 'won': 0}
-                source_success[lead.source.id]['total'] += 1
-                if lead.status == 'CLOSED_WON':
-                    source_success[lead.source.id]['won'] += 1
-        
-        counsellor_specializations[counsellor.id] = {
-            'counsellor': counsellor,
-            'industry_success': industry_success,
-            'source_success': source_success,
-            'current_workload': counsellor_leads.count()
-        }
-    
-    for lead in unassigned_leads:
-        best_counsellor = None
-        best_score = -1
-        
-        for counsellor_data in counsellor_specializations.values():
-            score = 0
-            
-            # Industry expertise bonus
-            if lead.industry and lead.industry in counsellor_data['industry_success']:
-                success_rate = counsellor_data['industry_success'][lead.industry]['won'] / counsellor_data['industry_success'][lead.industry]['total']
-                score += success_rate * 100
-            
-            # Source expertise bonus
-            if lead.source and lead.source.id in counsellor_data['source_success']:
-                success_rate = counsellor_data['source_success'][lead.source.id]['won'] / counsellor_data['source_success'][lead.source.id]['total']
-                score += success_rate * 50
-            
-            # Workload penalty (prefer counsellors with fewer leads)
-            workload_penalty = counsellor_data['current_workload'] * 2
-            score -= workload_penalty
-            
-            if score > best_score:
-                best_score = score
-                best_counsellor = counsellor_data['counsellor']
-        
-        if best_counsellor:
-            lead.assigned_counsellor = best_counsellor
-            lead.save()
-            
-            # Update workload
-            for counsellor_data in counsellor_specializations.values():
-                if counsellor_data['counsellor'] == best_counsellor:
-                    counsellor_data['current_workload'] += 1
-                    break
-            
-            assigned_count += 1
-    
-    return assigned_count
+def assignment_workload(request):
+    """AJAX endpoint: the assign-leads workload summary"""
+    return JsonResponse(workload_summary())
 
 
 def transfer_lead(request, lead_id):
@@ -715,46 +447,25 @@ def manage_businesses(request):
     return render(request, 'admin_template/manage_businesses.html', context)
 
 
+def export_businesses(request):
+    """Download the businesses, with the listing's search/status/counsellor filters, as CSV or XLSX"""
+    businesses = filter_businesses(Business.objects.all(), request.GET).order_by('-created_at', '-id')
+    return export_response(businesses, BUSINESS_COLUMNS, 'businesses', request.GET.get('format'))
+
+
 def counsellor_performance(request):
-    """View counsellor performance analytics"""
-    counsellors = Counsellor.objects.filter(is_active=True)
-    performance_data = []
-    
-    for counsellor in counsellors:
-        # Get monthly performance
-        current_month = timezone.now().replace(day=1)
-        monthly_performance = CounsellorPerformance.objects.filter(
-            counsellor=counsellor,
-            month=current_month
-        ).first()
-        
-        if not monthly_performance:
-            # Calculate performance if not exists
-            monthly_leads = counsellor.lead_set.filter(created_at__gte=current_month).count()
-            monthly_business = counsellor.business_set.filter(
-                created_at__gte=current_month, status='ACTIVE'
-            ).aggregate(total=Sum('value'))['total'] or 0
-            
-            try:
-                conversion_rate = monthly_business / monthly_leads * 100 if monthly_leads > 0 else 0
-            except ZeroDivisionError:
-                conversion_rate = 0
-                
-            monthly_performance = CounsellorPerformance.objects.create(
-                counsellor=counsellor,
-                month=current_month,
-                total_leads_assigned=monthly_leads,
-                total_business_generated=monthly_business,
-                conversion_rate=conversion_rate
-            )
-        
-        performance_data.append({
-            'counsellor': counsellor,
-            'performance': monthly_performance
-        })
-    
+    """View counsellor performance analytics from the stored monthly rollups"""
+    month = month_of()
+    rows = performance_rows(month)
+    if not rows:
+        # First visit this month: build the rollups once, later changes keep them current
+        rebuild_performance(month)
+        rows = performance_rows(month)
+    performance_data = [{'counsellor': row.counsellor, 'performance': row} for row in rows]
+
     context = {
         'performance_data': performance_data,
+        'month': month,
         'page_title': 'Counsellor Performance'
     }
     return render(request, 'admin_template/counsellor_performance.html', context)
@@ -797,34 +508,29 @@ def admin_view_notifications(request):
     return render(request, 'admin_template/admin_view_notifications.html', context)
 
 
+def ai_service_status(request):
+    """AJAX endpoint: this process's AI client metrics and circuit state, plus the response cache"""
+    return JsonResponse({'client': client_stats(), 'cache': llm_cache.stats()})
+
+
+def profiling_summary(request):
+    """Per-view latency and query counts of the requests this process served recently"""
+    profiles = list(recent_requests())
+    context = {
+        'rows': profile_summary(profiles),
+        'recent': profiles[-50:][::-1],
+        'buffered': len(profiles),
+        'profiling_enabled': getattr(settings, 'PROFILING_ENABLED', True),
+        'page_title': 'Request Profiling'
+    }
+    return render(request, 'admin_template/profiling_summary.html', context)
+
+
 def get_lead_analytics(request):
     """AJAX endpoint for lead analytics"""
     if request.method == 'GET':
         try:
-            # Lead status distribution
-            status_data = Lead.objects.values('status').annotate(
-                count=Count('id')
-            ).values('status', 'count')
-            
-            # Monthly trend
-            current_month = timezone.now().replace(day=1)
-            monthly_data = []
-            for i in range(6):
-                month_start = current_month - timedelta(days=30*i)
-                month_end = month_start + timedelta(days=30)
-                month_leads = Lead.objects.filter(
-                    created_at__gte=month_start,
-                    created_at__lt=month_end
-                ).count()
-                monthly_data.append({
-                    'month': month_start.strftime('%B'),
-                    'leads': month_leads
-                })
-            
-            return JsonResponse({
-                'status_data': list(status_data),
-                'monthly_data': monthly_data
-            })
+            return JsonResponse(get_snapshot('lead_analytics', build_lead_analytics))
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     
@@ -0,0 +1,221 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; while open every call is
+    refused at once. After `reset_after` seconds one trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("AI circuit opened after %s consecutive failures", self.failures)
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class Metrics:
+    """Call counters and latency for one client, safe to update from worker threads"""
+
+    FIELDS = ('calls', 'succeeded', 'failed', 'rejected', 'short_circuited', 'retries')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.FIELDS, 0)
+            self.latency_total = 0.0
+            self.latency_max = 0.0
+            self.timed = 0
+
+    def count(self, field, amount=1):
+        with self.lock:
+            self.counts[field] += amount
+
+    def observe(self, seconds):
+        with self.lock:
+            self.timed += 1
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+
+    def snapshot(self):
+        with self.lock:
+            data = dict(self.counts)
+            data['avg_latency_ms'] = round(self.latency_total / self.timed * 1000, 1) if self.timed else 0.0
+            data['max_latency_ms'] = round(self.latency_max * 1000, 1)
+            return data
+
+
+def _retry_delay(response, attempt, backoff):
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return backoff * (2 ** attempt) * (1 + random.random() / 2)
+
+
+class AIClient:
+    """
+    Keep-alive HTTP client for the AI API: one pooled session, a circuit
+    breaker and call metrics. Safe to share between threads.
+    """
+
+    def __init__(self, api_url=None, api_key=None, model=None, timeout=None, deadline=None,
+                 pool_size=None, failure_threshold=None, reset_after=None):
+        self.api_url = api_url or settings.AI_API_URL
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.model = model or settings.AI_MODEL
+        self.timeout = timeout or settings.AI_TIMEOUT
+        self.deadline = deadline or settings.AI_DEADLINE
+        self.breaker = CircuitBreaker(
+            failure_threshold or settings.AI_CIRCUIT_FAILURES,
+            settings.AI_CIRCUIT_RESET if reset_after is None else reset_after,
+        )
+        self.metrics = Metrics()
+        self.session = requests.Session()
+        pool_size = pool_size or settings.AI_CLIENT_POOL_SIZE
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Authorization': f'Bearer {self.api_key}'})
+
+    @property
+    def config(self):
+        return (self.api_url, self.api_key, self.model)
+
+    def complete(self, prompt, max_retries=None, backoff=1.0, deadline=None, limiter=None):
+        """
+        Send a prompt to the model and return its output text, or None.
+
+        429/5xx answers and connection errors are retried with exponential
+        backoff, but never past `deadline` seconds for the whole call. While
+        the circuit is open nothing is sent and None comes back at once, so
+        callers fall through to their heuristic.
+        """
+        max_retries = settings.AI_SCORING_MAX_RETRIES if max_retries is None else max_retries
+        give_up_at = time.monotonic() + (deadline or self.deadline)
+        body = {'model': self.model, 'input': prompt}
+        self.metrics.count('calls')
+
+        for attempt in range(max_retries + 1):
+            if limiter:
+                limiter.acquire()
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break
+            # Last before sending: in half-open state allow() claims the one trial call
+            if not self.breaker.allow():
+                self.metrics.count('short_circuited')
+                return None
+            if attempt:
+                self.metrics.count('retries')
+            response = None
+            started = time.monotonic()
+            try:
+                response = self.session.post(self.api_url, json=body, timeout=min(self.timeout, remaining))
+                self.metrics.observe(time.monotonic() - started)
+                if response.status_code == 200:
+                    text = (response.json().get('output_text') or '').strip()
+                    self.breaker.record_success()
+                    self.metrics.count('succeeded')
+                    return text
+                if response.status_code not in RETRY_STATUS:
+                    # The API is up but refuses this call (bad key, bad request)
+                    self.breaker.record_success()
+                    self.metrics.count('rejected')
+                    logger.warning("AI request rejected with HTTP %s", response.status_code)
+                    return None
+            except (requests.RequestException, ValueError) as e:
+                self.metrics.observe(time.monotonic() - started)
+                logger.warning("AI request failed: %s", e)
+            self.breaker.record_failure()
+            if attempt < max_retries:
+                delay = _retry_delay(response, attempt, backoff)
+                if time.monotonic() + delay >= give_up_at:
+                    break
+                time.sleep(delay)
+        self.metrics.count('failed')
+        logger.warning("AI request gave up after %s attempts", attempt + 1)
+        return None
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client; rebuilt when the API settings change"""
+    global _client
+    with _client_lock:
+        config = (settings.AI_API_URL, settings.OPENAI_API_KEY, settings.AI_MODEL)
+        if _client is None or _client.config != config:
+            _client = AIClient()
+        return _client
+
+
+def reset_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def client_stats():
+    client = get_client()
+    return dict(client.metrics.snapshot(), circuit=client.breaker.state)
@@ -0,0 +1,266 @@
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, QuerySet
+from django.utils import timezone
+
+from .counters import WON_STATUS, adjust_counters
+from .models import Counsellor, Lead
+from .performance import schedule_refresh
+from .snapshots import invalidate_snapshots
+
+
+def _batch_size():
+    return getattr(settings, 'LEAD_ASSIGNMENT_BATCH_SIZE', 900)
+
+
+def lead_rows(leads, *fields):
+    """(id, *fields) tuples for a lead queryset or a list of Lead objects"""
+    if isinstance(leads, QuerySet):
+        return list(leads.order_by('id').values_list('id', *fields))
+    return [(lead.id, *(getattr(lead, field) for field in fields)) for lead in leads]
+
+
+def current_workload(counsellors):
+    """Assigned lead count per counsellor, read from the maintained counters (no query)"""
+    return {counsellor.id: counsellor.total_leads_assigned for counsellor in counsellors}
+
+
+def overall_success(counsellors):
+    """{cid: [assigned, won]} from the counters, shaped like success_matrix()['overall']"""
+    return {counsellor.id: [counsellor.total_leads_assigned, counsellor.total_leads_won]
+            for counsellor in counsellors}
+
+
+def success_matrix(counsellor_ids):
+    """
+    Lead totals and CLOSED_WON counts per counsellor, per industry and per source.
+
+    Built from one grouped aggregate over (counsellor, industry, source):
+    {'overall': {cid: [total, won]}, 'industry': {(cid, industry): [total, won]},
+    'source': {(cid, source_id): [total, won]}}
+    """
+    matrix = {
+        'overall': {cid: [0, 0] for cid in counsellor_ids},
+        'industry': defaultdict(lambda: [0, 0]),
+        'source': defaultdict(lambda: [0, 0]),
+    }
+    rows = Lead.objects.filter(assigned_counsellor__in=counsellor_ids).values(
+        'assigned_counsellor', 'industry', 'source'
+    ).annotate(
+        total=Count('id'),
+        won=Count('id', filter=Q(status='CLOSED_WON')),
+    ).order_by()
+    for row in rows:
+        cid = row['assigned_counsellor']
+        for bucket in (matrix['overall'][cid], matrix['source'][(cid, row['source'])]):
+            bucket[0] += row['total']
+            bucket[1] += row['won']
+        if row['industry']:
+            bucket = matrix['industry'][(cid, row['industry'])]
+            bucket[0] += row['total']
+            bucket[1] += row['won']
+    return matrix
+
+
+def _rate(bucket):
+    return bucket[1] / bucket[0] if bucket and bucket[0] else 0
+
+
+def plan_round_robin(lead_ids, counsellor_ids):
+    """Deal leads out to counsellors in turn"""
+    plan = defaultdict(list)
+    for i, lead_id in enumerate(lead_ids):
+        plan[counsellor_ids[i % len(counsellor_ids)]].append(lead_id)
+    return plan
+
+
+def plan_workload_balanced(lead_ids, counsellor_ids, workload):
+    """Give each lead to the counsellor with the lowest current load (min-heap)"""
+    heap = [(workload.get(cid, 0), position, cid) for position, cid in enumerate(counsellor_ids)]
+    heapq.heapify(heap)
+    plan = defaultdict(list)
+    for lead_id in lead_ids:
+        load, position, cid = heapq.heappop(heap)
+        plan[cid].append(lead_id)
+        heapq.heappush(heap, (load + 1, position, cid))
+    return plan
+
+
+def plan_performance_based(lead_ids, counsellor_ids, matrix):
+    """
+    Give each lead to the counsellor with the best conversion rate, breaking
+    ties on the fewest leads held.
+    """
+    heap = []
+    for position, cid in enumerate(counsellor_ids):
+        total, won = matrix['overall'][cid]
+        heap.append((-_rate([total, won]), total, position, cid))
+    heapq.heapify(heap)
+    plan = defaultdict(list)
+    for lead_id in lead_ids:
+        rate, total, position, cid = heapq.heappop(heap)
+        plan[cid].append(lead_id)
+        heapq.heappush(heap, (rate, total + 1, position, cid))
+    return plan
+
+
+def specialization_bonus(matrix, cid, industry, source_id):
+    """Expertise score of a counsellor for one (industry, source) pair"""
+    bonus = 0
+    if industry:
+        bonus += _rate(matrix['industry'].get((cid, industry))) * 100
+    bonus += _rate(matrix['source'].get((cid, source_id))) * 50
+    return bonus
+
+
+def plan_specialization_based(leads, counsellor_ids, matrix):
+    """
+    Give each (lead_id, industry, source_id) to the counsellor maximising
+    industry success * 100 + source success * 50 - current workload * 2.
+
+    Leads sharing an (industry, source) pair share a max-heap of counsellors.
+    Assigning a lead only ever lowers that counsellor's score, so entries are
+    refreshed lazily when they reach the top instead of rescoring every
+    counsellor for every lead.
+    """
+    workload = {cid: matrix['overall'][cid][0] for cid in counsellor_ids}
+    heaps = {}
+    plan = defaultdict(list)
+    for lead_id, industry, source_id in leads:
+        key = (industry, source_id)
+        heap = heaps.get(key)
+        if heap is None:
+            bonus = {cid: specialization_bonus(matrix, cid, industry, source_id) for cid in counsellor_ids}
+            heap = heaps[key] = (bonus, [
+                (-(bonus[cid] - workload[cid] * 2), position, cid, workload[cid])
+                for position, cid in enumerate(counsellor_ids)
+            ])
+            heapq.heapify(heap[1])
+        bonus, entries = heap
+        while True:
+            score, position, cid, seen_workload = entries[0]
+            if seen_workload == workload[cid]:
+                break
+            heapq.heapreplace(entries, (-(bonus[cid] - workload[cid] * 2), position, cid, workload[cid]))
+        plan[cid].append(lead_id)
+        workload[cid] += 1
+    return plan
+
+
+def apply_plan(plan, batch_size=None):
+    """
+    Persist a {counsellor_id: [lead ids]} plan.
+
+    Issues one UPDATE ... WHERE id IN (...) per counsellor and batch instead of
+    a save() per lead. Only still-unassigned leads are touched, so a lead
+    assigned concurrently keeps its counsellor. The won leads among them are
+    looked up first (one query per batch) so the won counters move too.
+    Returns the number assigned.
+    """
+    batch_size = batch_size or _batch_size()
+    now = timezone.now()
+    assigned = 0
+    all_ids = [lead_id for lead_ids in plan.values() for lead_id in lead_ids]
+    with transaction.atomic():
+        won_ids = set()
+        for i in range(0, len(all_ids), batch_size):
+            won_ids.update(Lead.objects.filter(
+                id__in=all_ids[i:i + batch_size], assigned_counsellor__isnull=True, status=WON_STATUS
+            ).values_list('id', flat=True))
+        for counsellor_id, lead_ids in plan.items():
+            counsellor_assigned = 0
+            for i in range(0, len(lead_ids), batch_size):
+                counsellor_assigned += Lead.objects.filter(
+                    id__in=lead_ids[i:i + batch_size], assigned_counsellor__isnull=True
+                ).update(assigned_counsellor_id=counsellor_id, updated_at=now)
+            adjust_counters(counsellor_id, leads=counsellor_assigned, won=len(won_ids.intersection(lead_ids)))
+            assigned += counsellor_assigned
+    # update() skips post_save, so drop the affected dashboard snapshots and rollups here
+    invalidate_snapshots(plan.keys())
+    schedule_refresh(lead_ids=all_ids)
+    return assigned
+
+
+def assign_round_robin(leads, counsellors):
+    counsellor_ids = [counsellor.id for counsellor in counsellors]
+    lead_ids = [row[0] for row in lead_rows(leads)]
+    return apply_plan(plan_round_robin(lead_ids, counsellor_ids))
+
+
+def assign_workload_balanced(leads, counsellors):
+    counsellor_ids = [counsellor.id for counsellor in counsellors]
+    lead_ids = [row[0] for row in lead_rows(leads)]
+    workload = current_workload(counsellors)
+    return apply_plan(plan_workload_balanced(lead_ids, counsellor_ids, workload))
+
+
+def assign_performance_based(leads, counsellors):
+    counsellor_ids = [counsellor.id for counsellor in counsellors]
+    lead_ids = [row[0] for row in lead_rows(leads)]
+    matrix = {'overall': overall_success(counsellors)}
+    return apply_plan(plan_performance_based(lead_ids, counsellor_ids, matrix))
+
+
+def assign_specialization_based(leads, counsellors):
+    counsellor_ids = [counsellor.id for counsellor in counsellors]
+    rows = lead_rows(leads, 'industry', 'source_id')
+    matrix = success_matrix(counsellor_ids)
+    return apply_plan(plan_specialization_based(rows, counsellor_ids, matrix))
+
+
+STRATEGIES = {
+    'round_robin': assign_round_robin,
+    'workload_balanced': assign_workload_balanced,
+    'performance_based': assign_performance_based,
+    'specialization_based': assign_specialization_based,
+}
+
+
+def assign_leads(leads, counsellors, method='round_robin'):
+    """Assign `leads` among `counsellors` with the named strategy (round robin if unknown)"""
+    counsellors = list(counsellors)
+    if not counsellors:
+        return 0
+    return STRATEGIES.get(method, assign_round_robin)(leads, counsellors)
+
+
+
+class ImportAssigner:
+    """
+    Auto-assign an import's leads chunk by chunk as they are created (pass as
+    import_leads_file's on_chunk), so the import never holds more than one
+    chunk. Counsellors are reloaded per chunk so workload-based strategies
+    see the earlier chunks, and round robin picks up where the last chunk
+    stopped.
+    """
+
+    def __init__(self, method='round_robin'):
+        self.method = method if method in STRATEGIES else 'round_robin'
+        self.assigned = 0
+        self.error = None
+        self.no_counsellors = False
+
+    def __call__(self, leads):
+        if self.error is not None:
+            return
+        counsellors = list(Counsellor.objects.filter(is_active=True).order_by('id'))
+        if not counsellors:
+            self.no_counsellors = True
+            return
+        offset = self.assigned % len(counsellors)
+        unassigned = [lead for lead in leads if not lead.assigned_counsellor_id]
+        try:
+            with transaction.atomic():  # A failed assignment must not abort the chunk's transaction
+                self.assigned += assign_leads(unassigned, counsellors[offset:] + counsellors[:offset], self.method)
+        except Exception as e:
+            self.error = e
+
+    def message(self):
+        if self.error is not None:
+            return f"Auto-assignment failed: {self.error}"
+        if self.no_counsellors and not self.assigned:
+            return "No active counsellors found for auto-assignment."
+        return f"Auto-assigned them using {self.method.replace('_', ' ').title()} method."
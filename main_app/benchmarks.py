@@ -0,0 +1,270 @@
+import json
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .assignment import STRATEGIES, assign_leads
+from .dashboard import build_admin_dashboard, build_counsellor_dashboard, build_lead_analytics
+from .lead_import import import_leads_file
+from .models import Business, Counsellor, CustomUser, Lead, LeadActivity, LeadSource
+from .performance import month_of, rebuild_performance
+from .profiling import QueryRecorder
+from .scoring import rescore_leads
+from .search import ranked_lead_ids
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+class BenchmarkContext:
+    """Logged-in clients and sample rows shared by the benchmarks"""
+
+    def __init__(self, import_rows=2000, assign_count=1000):
+        self.import_rows = import_rows
+        self.assign_count = assign_count
+        self.admin_user = CustomUser.objects.filter(user_type='1').order_by('id').first() or \
+            CustomUser.objects.create_user(email='benchmark-admin@example.com', password=None, user_type='1')
+        self.counsellor = Counsellor.objects.filter(is_active=True).select_related('admin') \
+            .order_by('-total_leads_assigned', 'id').first()
+        self.source = LeadSource.objects.order_by('id').first()
+        self.search_term = Lead.objects.order_by('id').values_list('last_name', flat=True).first() or 'lead'
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin_user)
+        self.counsellor_client = Client()
+        if self.counsellor:
+            self.counsellor_client.force_login(self.counsellor.admin)
+
+    def get(self, client, name, params=None):
+        response = client.get(reverse(name), params or {})
+        if response.status_code != 200:
+            raise AssertionError(f'{name} returned {response.status_code}')
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def import_file(self):
+        header = 'first_name,last_name,email,phone,company,expected_value\n'
+        rows = ''.join(f'Bench,Lead{i},bench{i}@example.com,0800{i:07d},Bench Co,{i % 1000}\n'
+                       for i in range(self.import_rows))
+        return SimpleUploadedFile('benchmark.csv', (header + rows).encode(), content_type='text/csv')
+
+
+@benchmark('view.admin_home')
+def _admin_home(ctx):
+    ctx.get(ctx.admin_client, 'admin_home')
+
+
+@benchmark('view.manage_leads_data')
+def _manage_leads_data(ctx):
+    ctx.get(ctx.admin_client, 'manage_leads_data', {'length': 25})
+
+
+@benchmark('view.manage_leads_data.filtered')
+def _manage_leads_filtered(ctx):
+    ctx.get(ctx.admin_client, 'manage_leads_data', {'length': 25, 'status': 'QUALIFIED', 'priority': 'HIGH'})
+
+
+@benchmark('view.manage_leads_data.search')
+def _manage_leads_search(ctx):
+    ctx.get(ctx.admin_client, 'manage_leads_data', {'length': 25, 'search[value]': ctx.search_term})
+
+
+@benchmark('view.search_leads')
+def _search_leads(ctx):
+    ctx.get(ctx.admin_client, 'search_leads', {'q': ctx.search_term})
+
+
+@benchmark('view.manage_businesses')
+def _manage_businesses(ctx):
+    ctx.get(ctx.admin_client, 'manage_businesses')
+
+
+@benchmark('view.assign_leads')
+def _assign_page(ctx):
+    ctx.get(ctx.admin_client, 'assign_leads_to_counsellors')
+
+
+@benchmark('view.counsellor_performance')
+def _counsellor_performance(ctx):
+    ctx.get(ctx.admin_client, 'counsellor_performance')
+
+
+@benchmark('view.lead_analytics')
+def _lead_analytics(ctx):
+    ctx.get(ctx.admin_client, 'get_lead_analytics')
+
+
+@benchmark('view.export_leads.won')
+def _export_won(ctx):
+    ctx.get(ctx.admin_client, 'export_leads', {'status': 'CLOSED_WON'})
+
+
+@benchmark('view.counsellor_home')
+def _counsellor_home(ctx):
+    ctx.get(ctx.counsellor_client, 'counsellor_home')
+
+
+@benchmark('view.my_leads_data')
+def _my_leads_data(ctx):
+    ctx.get(ctx.counsellor_client, 'my_leads_data', {'length': 25})
+
+
+@benchmark('view.my_analytics')
+def _my_analytics(ctx):
+    ctx.get(ctx.counsellor_client, 'get_my_analytics')
+
+
+@benchmark('helper.build_admin_dashboard')
+def _build_admin_dashboard(ctx):
+    build_admin_dashboard()
+
+
+@benchmark('helper.build_lead_analytics')
+def _build_lead_analytics(ctx):
+    build_lead_analytics()
+
+
+@benchmark('helper.build_counsellor_dashboard')
+def _build_counsellor_dashboard(ctx):
+    build_counsellor_dashboard(ctx.counsellor)
+
+
+@benchmark('helper.ranked_search')
+def _ranked_search(ctx):
+    ranked_lead_ids(ctx.search_term)
+
+
+def rolled_back(func):
+    """Run a write benchmark in a transaction that is rolled back, so repeats see the same data"""
+    def run(ctx):
+        with transaction.atomic():
+            func(ctx)
+            transaction.set_rollback(True)
+    return run
+
+
+@benchmark('write.import_leads')
+@rolled_back
+def _import_leads(ctx):
+    import_leads_file(ctx.import_file(), ctx.source)
+
+
+@benchmark('write.rescore_leads')
+@rolled_back
+def _rescore_leads(ctx):
+    rescore_leads(Lead.objects.all())
+
+
+@benchmark('write.rebuild_performance')
+@rolled_back
+def _rebuild_performance(ctx):
+    rebuild_performance(month_of())
+
+
+def _assign_benchmark(method):
+    @rolled_back
+    def run(ctx):
+        lead_ids = list(Lead.objects.filter(assigned_counsellor__isnull=True)
+                        .order_by('id').values_list('id', flat=True)[:ctx.assign_count])
+        assign_leads(Lead.objects.filter(id__in=lead_ids), Counsellor.objects.filter(is_active=True), method)
+    return run
+
+
+for _method in STRATEGIES:
+    benchmark(f'write.assign.{_method}')(_assign_benchmark(_method))
+
+
+def data_size():
+    return {
+        'leads': Lead.objects.count(),
+        'counsellors': Counsellor.objects.count(),
+        'activities': LeadActivity.objects.count(),
+        'businesses': Business.objects.count(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, repeat=3, warm=False, import_rows=2000, assign_count=1000, on_result=None):
+    """
+    Time each benchmark `repeat` times, counting its queries. Caches are
+    cleared before every run unless warm=True, so snapshot-backed views are
+    measured doing their real work. Returns the JSON-ready report.
+    """
+    names = names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise KeyError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+    # The profiling middleware would time itself; the runner does its own measuring
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], PROFILING_ENABLED=False):
+        ctx = BenchmarkContext(import_rows=import_rows, assign_count=assign_count)
+        results = {}
+        for name in names:
+            timings, queries = [], []
+            try:
+                for _ in range(repeat):
+                    if not warm:
+                        cache.clear()
+                    recorder = QueryRecorder()
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(recorder):
+                        BENCHMARKS[name](ctx)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    queries.append(recorder.count)
+                result = {
+                    'runs': repeat,
+                    'min_ms': round(min(timings), 2),
+                    'median_ms': round(statistics.median(timings), 2),
+                    'max_ms': round(max(timings), 2),
+                    'queries': max(queries),
+                }
+            except Exception as e:
+                result = {'error': f'{type(e).__name__}: {e}'}
+            results[name] = result
+            if on_result:
+                on_result(name, result)
+    return {
+        'commit': git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'repeat': repeat,
+        'warm': warm,
+        'data': data_size(),
+        'results': results,
+    }
+
+
+def write_report(report, path):
+    Path(path).write_text(json.dumps(report, indent=2, sort_keys=True))
+
+
+def compare_reports(report, baseline):
+    """[(name, baseline median, current median, ratio)] for benchmarks present in both"""
+    rows = []
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name, {})
+        if 'median_ms' in result and before.get('median_ms'):
+            rows.append((name, before['median_ms'], result['median_ms'], result['median_ms'] / before['median_ms']))
+    return rows
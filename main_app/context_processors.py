@@ -1,10 +1,7 @@
-from .models import NotificationCounsellor, NotificationAdmin
+from .notifications import unread_count
 
 def notification_count(request):
     count = 0
     if request.user.is_authenticated:
-        if hasattr(request.user, 'counsellor'):
-            count = NotificationCounsellor.objects.filter(counsellor=request.user.counsellor, is_read=False).count()
-        elif hasattr(request.user, 'admin'):
-            count = NotificationAdmin.objects.filter(is_read=False).count()
+        count = unread_count(request.user)
     return {'notification_count': count}
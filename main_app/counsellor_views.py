@@ -1,5 +1,6 @@
 import json
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,
@@ -9,36 +10,25 @@ from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
 
+from .dashboard import build_counsellor_analytics, build_counsellor_dashboard
+from .exports import ACTIVITY_COLUMNS, export_response
 from .forms import *
+from .jobs import claim_workflow, enqueue_workflow, run_workflow_job
+from .lead_listing import lead_page
 from .models import *
-import os
-import requests
-import re
+from .notifications import forget_counsellor_unread_count
+from .scoring import score_lead
+from .snapshots import get_snapshot
 
 
 def counsellor_home(request):
     """Counsellor Dashboard"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
-    
-    # My Leads Statistics
-    my_leads = Lead.objects.filter(assigned_counsellor=counsellor)
-    total_leads = my_leads.count()
-    new_leads = my_leads.filter(status='NEW').count()
-    contacted_leads = my_leads.filter(status='CONTACTED').count()
-    qualified_leads = my_leads.filter(status='QUALIFIED').count()
-    closed_won = my_leads.filter(status='CLOSED_WON').count()
-    
-    # My Business Statistics
-    my_businesses = Business.objects.filter(counsellor=counsellor)
-    total_business_value = my_businesses.filter(status='ACTIVE').aggregate(
-        total=Sum('value'))['total'] or 0
-    pending_businesses = my_businesses.filter(status='PENDING').count()
-    active_businesses = my_businesses.filter(status='ACTIVE').count()
-    
-    # Recent Activities
-    recent_activities = LeadActivity.objects.filter(
-        counsellor=counsellor
-    ).select_related('lead').order_by('-completed_date')[:10]
+    counsellor = request.counsellor
+    
+    # Lead, business and activity statistics (cached per counsellor)
+    snapshot = get_snapshot(
+        'counsellor_home', lambda: build_counsellor_dashboard(counsellor), counsellor.id
+    )
     
     # Upcoming Follow-ups
     upcoming_followups = Lead.objects.filter(
@@ -47,67 +37,45 @@ def counsellor_home(request):
         next_follow_up__gte=timezone.now()
     ).order_by('next_follow_up')[:5]
     
-    # Lead Status Distribution for Charts
-    lead_status_data = {
-        'NEW': new_leads,
-        'CONTACTED': contacted_leads,
-        'QUALIFIED': qualified_leads,
-        'CLOSED_WON': closed_won,
-    }
-    
-    # Monthly Performance
-    current_month = timezone.now().replace(day=1)
-    monthly_leads = my_leads.filter(created_at__gte=current_month).count()
-    monthly_business = my_businesses.filter(
-        created_at__gte=current_month, status='ACTIVE'
-    ).aggregate(total=Sum('value'))['total'] or 0
-    
     context = {
         'page_title': "Counsellor Dashboard",
         'counsellor': counsellor,
-        'total_leads': total_leads,
-        'new_leads': new_leads,
-        'contacted_leads': contacted_leads,
-        'qualified_leads': qualified_leads,
-        'closed_won': closed_won,
-        'total_business_value': total_business_value,
-        'pending_businesses': pending_businesses,
-        'active_businesses': active_businesses,
-        'recent_activities': recent_activities,
         'upcoming_followups': upcoming_followups,
-        'lead_status_data': lead_status_data,
-        'monthly_leads': monthly_leads,
-        'monthly_business': monthly_business,
+        **snapshot,
     }
     return render(request, 'counsellor_template/home_content.html', context)
 
 
 def my_leads(request):
-    """View assigned leads"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
-    leads = Lead.objects.filter(assigned_counsellor=counsellor).select_related('source')
-    
+    """View assigned leads (rows are loaded page by page from my_leads_data)"""
     # Filter by status if provided
-    status_filter = request.GET.get('status')
-    if status_filter:
-        leads = leads.filter(status=status_filter)
+    status_filter = request.GET.get('status', '')
     
     context = {
-        'leads': leads,
+        'status_filter': status_filter if status_filter in dict(Lead.LEAD_STATUS) else '',
         'page_title': 'My Leads'
     }
     return render(request, 'counsellor_template/my_leads.html', context)
 
 
+def my_leads_data(request):
+    """Server-side DataTables endpoint for the counsellor's leads"""
+    counsellor = request.counsellor
+    leads = Lead.objects.filter(assigned_counsellor=counsellor)
+    return JsonResponse(lead_page(leads, request.GET, leads.count(), admin=False))
+
+
 def lead_detail(request, lead_id):
     """View lead details and activities"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     activities = LeadActivity.objects.filter(lead=lead, counsellor=counsellor).order_by('-completed_date')
+    workflow_job = lead.workflow_jobs.order_by('-created_at').first()
     
     context = {
         'lead': lead,
         'activities': activities,
+        'workflow_job': workflow_job,
         'page_title': f'Lead: {lead.first_name} {lead.last_name}'
     }
     return render(request, 'counsellor_template/lead_detail.html', context)
@@ -115,7 +83,7 @@ def lead_detail(request, lead_id):
 
 def add_lead_activity(request, lead_id):
     """Add activity for a lead"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     form = LeadActivityForm(request.POST or None)
     
@@ -149,7 +117,7 @@ def add_lead_activity(request, lead_id):
 
 def update_lead_status(request, lead_id):
     """Update lead status"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     
     if request.method == 'POST':
@@ -166,7 +134,7 @@ def update_lead_status(request, lead_id):
 
 def create_business(request, lead_id):
     """Create business from lead"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     form = BusinessForm(request.POST or None)
     
@@ -201,7 +169,7 @@ def create_business(request, lead_id):
 
 def my_businesses(request):
     """View my businesses"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     businesses = Business.objects.filter(counsellor=counsellor).select_related('lead')
     
     # Filter by status if provided
@@ -218,7 +186,7 @@ def my_businesses(request):
 
 def business_detail(request, business_id):
     """View business details"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     business = get_object_or_404(Business, id=business_id, counsellor=counsellor)
     
     context = {
@@ -230,7 +198,7 @@ def business_detail(request, business_id):
 
 def update_business_status(request, business_id):
     """Update business status"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     business = get_object_or_404(Business, id=business_id, counsellor=counsellor)
     
     if request.method == 'POST':
@@ -247,7 +215,7 @@ def update_business_status(request, business_id):
 
 def request_lead_transfer(request, lead_id):
     """Request lead transfer to another counsellor"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     form = LeadTransferForm(request.POST or None)
     
@@ -277,7 +245,7 @@ def request_lead_transfer(request, lead_id):
 
 def my_activities(request):
     """View my activities"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     activities = LeadActivity.objects.filter(counsellor=counsellor).select_related('lead').order_by('-completed_date')
     
     # Filter by activity type if provided
@@ -292,18 +260,24 @@ def my_activities(request):
     return render(request, 'counsellor_template/my_activities.html', context)
 
 
+def export_my_activities(request):
+    """Download my activities, honoring the activity type filter, as CSV or XLSX"""
+    counsellor = request.counsellor
+    activities = LeadActivity.objects.filter(counsellor=counsellor).order_by('-completed_date', '-id')
+    activity_type = request.GET.get('activity_type')
+    if activity_type:
+        activities = activities.filter(activity_type=activity_type)
+    return export_response(activities, ACTIVITY_COLUMNS, 'activities', request.GET.get('format'))
+
+
 def counsellor_view_profile(request):
     """Counsellor profile view"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     
-    # Performance statistics
-    total_leads = counsellor.lead_set.count()
-    total_business = counsellor.business_set.filter(status='ACTIVE').aggregate(
-        total=Sum('value'))['total'] or 0
-    try:
-        conversion_rate = (counsellor.business_set.count() / total_leads * 100) if total_leads > 0 else 0
-    except ZeroDivisionError:
-        conversion_rate = 0
+    # Performance statistics, from the counters kept on the counsellor
+    total_leads = counsellor.total_leads_assigned
+    total_business = counsellor.total_business_generated
+    conversion_rate = counsellor.total_leads_won / total_leads * 100 if total_leads > 0 else 0
     
     context = {
         'counsellor': counsellor,
@@ -317,12 +291,13 @@ def counsellor_view_profile(request):
 
 def counsellor_view_notifications(request):
     """View counsellor notifications"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     notifications = NotificationCounsellor.objects.filter(counsellor=counsellor).order_by('-created_at')
     
     # Mark notifications as read
     if request.method == 'POST':
         notifications.update(is_read=True)
+        forget_counsellor_unread_count(counsellor)
         messages.success(request, "All notifications marked as read!")
     
     context = {
@@ -347,32 +322,10 @@ def get_my_analytics(request):
     """AJAX endpoint for counsellor analytics"""
     if request.method == 'GET':
         try:
-            counsellor = get_object_or_404(Counsellor, admin=request.user)
-            
-            # Lead status distribution
-            status_data = counsellor.lead_set.values('status').annotate(
-                count=Count('id')
-            ).values('status', 'count')
-            
-            # Monthly activity trend
-            current_month = timezone.now().replace(day=1)
-            monthly_activities = []
-            for i in range(6):
-                month_start = current_month - timedelta(days=30*i)
-                month_end = month_start + timedelta(days=30)
-                month_activities = counsellor.leadactivity_set.filter(
-                    completed_date__gte=month_start,
-                    completed_date__lt=month_end
-                ).count()
-                monthly_activities.append({
-                    'month': month_start.strftime('%B'),
-                    'activities': month_activities
-                })
-            
-            return JsonResponse({
-                'status_data': list(status_data),
-                'monthly_activities': monthly_activities
-            })
+            counsellor = request.counsellor
+            return JsonResponse(get_snapshot(
+                'my_analytics', lambda: build_counsellor_analytics(counsellor), counsellor.id
+            ))
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     
@@ -381,7 +334,7 @@ def get_my_analytics(request):
 
 def schedule_follow_up(request, lead_id):
     """Schedule follow-up for a lead"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     
     if request.method == 'POST':
@@ -401,205 +354,57 @@ def schedule_follow_up(request, lead_id):
 
 def evaluate_conversion_score(request, lead_id):
     """Call AI API to assign a conversion score (0-100) based on lead description/notes."""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
 
-    # Build input text for the model
-    description_parts = [
-        f"Name: {lead.first_name} {lead.last_name}",
-        f"Company: {lead.company or '-'}",
-        f"Position: {lead.position or '-'}",
-        f"Industry: {lead.industry or '-'}",
-        f"Status: {lead.status}",
-        f"Priority: {lead.priority}",
-        f"Expected Value: {lead.expected_value}",
-        f"Notes: {lead.notes or '-'}",
-    ]
-    prompt = "\n".join(description_parts) + "\n\nReturn ONLY an integer from 0 to 100 representing the conversion probability."
-
-    score = None
-    error_message = None
-
     try:
-        openai_key = os.environ.get('OPENAI_API_KEY')
-        if openai_key:
-            # Simple call to OpenAI's responses API (fallback to a basic prompt-completion style)
-            headers = {
-                'Authorization': f'Bearer {openai_key}',
-                'Content-Type': 'application/json'
-            }
-            body = {
-                'model': 'gpt-4o-mini',
-                'input': f"You are a scoring function. Read the lead details and output ONLY an integer 0-100.\n\n{prompt}"
-            }
-            resp = requests.post('https://api.openai.com/v1/responses', headers=headers, json=body, timeout=20)
-            if resp.status_code == 200:
-                data = resp.json()
-                text = (data.get('output_text') or '').strip()
-                # Extract first integer 0-100
-                import re
-                m = re.search(r"\b(100|\d{1,2})\b", text)
-                if m:
-                    score = int(m.group(1))
-        
-        # Fallback heuristic if no key or failed to parse
-        if score is None:
-            # Simple heuristic: base on priority and status
-            base = {
-                'NEW': 30,
-                'CONTACTED': 45,
-                'QUALIFIED': 60,
-                'PROPOSAL_SENT': 70,
-                'NEGOTIATION': 80,
-                'CLOSED_WON': 95,
-                'CLOSED_LOST': 5,
-                'TRANSFERRED': 40,
-            }.get(lead.status, 40)
-            priority_bonus = {
-                'LOW': -5,
-                'MEDIUM': 0,
-                'HIGH': 5,
-                'URGENT': 10,
-            }.get(lead.priority, 0)
-            score = max(0, min(100, base + priority_bonus))
+        # ?refresh=1 asks the model again instead of reusing a cached answer
+        score = score_lead(lead, bypass_cache=bool(request.GET.get('refresh')))
     except Exception as e:
-        error_message = str(e)
-
-    if score is not None:
+        messages.error(request, f"Could not evaluate score: {str(e)}")
+    else:
         lead.conversion_score = score
-        lead.save()
+        lead.save(update_fields=['conversion_score'])
         messages.success(request, f"Conversion score updated: {score}")
-    else:
-        messages.error(request, f"Could not evaluate score: {error_message or 'Unknown error'}")
 
     return redirect(reverse('lead_detail', kwargs={'lead_id': lead_id}))
 
 
 def run_agentic_workflow(request, lead_id):
-    """Agentic AI workflow: enrich → score → route (with reasoning)."""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    """Queue the agentic AI workflow (enrich → score → route) for a lead"""
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
 
-    openai_key = os.environ.get('OPENAI_API_KEY')
-    headers = {'Authorization': f'Bearer {openai_key}', 'Content-Type': 'application/json'} if openai_key else None
-
-    # Agent 1: Enrich lead info (mock LinkedIn title via AI based on notes/company/position)
-    try:
-        enrichment_prompt = (
-            "You are a data enricher. Given lead data, infer a likely LinkedIn-style job title.\n"
-            "Return JSON with keys: job_title, notes. Keep it brief.\n\n"
-            f"Company: {lead.company or '-'}\n"
-            f"Existing Position: {lead.position or '-'}\n"
-            f"Industry: {lead.industry or '-'}\n"
-            f"Notes: {lead.notes or '-'}\n"
-        )
-        job_title = None
-        enrichment_notes = None
-        if headers:
-            body = {'model': 'gpt-4o-mini', 'input': enrichment_prompt}
-            r = requests.post('https://api.openai.com/v1/responses', headers=headers, json=body, timeout=20)
-            if r.status_code == 200:
-                txt = (r.json().get('output_text') or '').strip()
-                m = re.search(r'job_title\s*[:\"]\s*([^\n\"]+)', txt, re.I)
-                n = re.search(r'notes\s*[:\"]\s*([^\n]+)', txt, re.I)
-                if m:
-                    job_title = m.group(1).strip()[:150]
-                if n:
-                    enrichment_notes = n.group(1).strip()
-        if not job_title:
-            # Heuristic fallback
-            job_title = lead.position or ('Head of ' + lead.industry if lead.industry else 'Decision Maker')
-        if not enrichment_notes:
-            enrichment_notes = 'Enriched via heuristic based on existing fields.'
-        lead.enriched_job_title = job_title
-        lead.enrichment_notes = enrichment_notes
-        lead.save()
-    except Exception as e:
-        messages.warning(request, f"Enrichment failed; using fallback. {str(e)}")
-
-    # Agent 2: Score lead (reuse evaluate logic)
-    try:
-        description_parts = [
-            f"Company: {lead.company or '-'}",
-            f"Position: {lead.position or '-'} | Enriched: {lead.enriched_job_title or '-'}",
-            f"Industry: {lead.industry or '-'}",
-            f"Status: {lead.status}",
-            f"Priority: {lead.priority}",
-            f"Expected Value: {lead.expected_value}",
-            f"Notes: {lead.notes or '-'}",
-        ]
-        prompt = "\n".join(description_parts) + "\n\nReturn ONLY an integer 0-100 for conversion likelihood."
-        score = None
-        if headers:
-            body = {'model': 'gpt-4o-mini', 'input': f"{prompt}"}
-            r = requests.post('https://api.openai.com/v1/responses', headers=headers, json=body, timeout=20)
-            if r.status_code == 200:
-                txt = (r.json().get('output_text') or '').strip()
-                m = re.search(r"\b(100|\d{1,2})\b", txt)
-                if m:
-                    score = int(m.group(1))
-        if score is None:
-            base = {
-                'NEW': 30, 'CONTACTED': 45, 'QUALIFIED': 60,
-                'PROPOSAL_SENT': 70, 'NEGOTIATION': 80,
-                'CLOSED_WON': 95, 'CLOSED_LOST': 5, 'TRANSFERRED': 40,
-            }.get(lead.status, 40)
-            priority_bonus = {'LOW': -5, 'MEDIUM': 0, 'HIGH': 5, 'URGENT': 10}.get(lead.priority, 0)
-            score = max(0, min(100, base + priority_bonus))
-        lead.conversion_score = score
-        lead.save()
-    except Exception as e:
-        messages.warning(request, f"Scoring failed; used fallback. {str(e)}")
+    job = enqueue_workflow(lead, requested_by=request.user)
+    if not settings.AI_WORKFLOW_BACKGROUND:
+        # No worker configured: run the workflow inside this request
+        claimed = claim_workflow(job.pk)
+        if claimed is not None:
+            job = run_workflow_job(claimed)
+    if job.status == 'COMPLETED':
+        messages.success(request, job.message)
+    elif job.status == 'FAILED':
+        messages.error(request, job.message)
+    else:
+        messages.info(request, "AI workflow started. Results will appear on this page.")
+    return redirect(reverse('lead_detail', kwargs={'lead_id': lead_id}))
 
-    # Agent 3: Route lead with reasoning
-    try:
-        route_prompt = (
-            "You are a sales router. Decide assignment path and explain briefly.\n"
-            "Options: junior_sales, mid_sales, senior_sales, enterprise_team.\n"
-            "Respond as: route=<option>\nreason=<one line>.\n\n"
-            f"Score: {lead.conversion_score}\n"
-            f"Expected Value: {lead.expected_value}\n"
-            f"Job Title: {lead.enriched_job_title or lead.position or '-'}\n"
-            f"Industry: {lead.industry or '-'}\n"
-        )
-        routed_to = None
-        routing_reason = None
-        if headers:
-            body = {'model': 'gpt-4o-mini', 'input': route_prompt}
-            r = requests.post('https://api.openai.com/v1/responses', headers=headers, json=body, timeout=20)
-            if r.status_code == 200:
-                txt = (r.json().get('output_text') or '').lower()
-                m = re.search(r'route\s*=\s*(junior_sales|mid_sales|senior_sales|enterprise_team)', txt)
-                n = re.search(r'reason\s*=\s*(.+)', txt)
-                if m:
-                    routed_to = m.group(1)
-                if n:
-                    routing_reason = n.group(1).strip()
-        if not routed_to:
-            # Heuristic: high value or score → senior/enterprise
-            value = float(lead.expected_value or 0)
-            score = lead.conversion_score or 0
-            if value >= 500000 or score >= 80:
-                routed_to = 'senior_sales'
-            elif value >= 200000 or score >= 60:
-                routed_to = 'mid_sales'
-            else:
-                routed_to = 'junior_sales'
-        if not routing_reason:
-            routing_reason = f"Assigned to {routed_to.replace('_', ' ')} based on score {lead.conversion_score} and value {lead.expected_value}."
-        lead.routed_to = routed_to
-        lead.routing_reason = routing_reason[:1000]
-        lead.save()
-        messages.success(request, f"Workflow complete. Routed to {routed_to.replace('_',' ')}.")
-    except Exception as e:
-        messages.error(request, f"Routing failed: {str(e)}")
 
-    return redirect(reverse('lead_detail', kwargs={'lead_id': lead_id}))
+def workflow_job_status(request, job_id):
+    """AJAX endpoint polled by the lead page while a workflow runs"""
+    counsellor = request.counsellor
+    job = get_object_or_404(WorkflowJob, pk=job_id, lead__assigned_counsellor=counsellor)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'finished': job.is_finished,
+        'message': job.message,
+    })
 
 
 def mark_lead_lost(request, lead_id):
     """Mark lead as lost"""
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor
     lead = get_object_or_404(Lead, id=lead_id, assigned_counsellor=counsellor)
     
     if request.method == 'POST':
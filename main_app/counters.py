@@ -0,0 +1,115 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan
+
+from .models import Business, Counsellor, Lead
+
+WON_STATUS = 'CLOSED_WON'
+COUNTED_BUSINESS_STATUS = 'ACTIVE'
+# performance_rating: the share of assigned leads that were won, on a 0-5 scale
+RATING_SCALE = 5
+
+
+def rating(assigned, won):
+    return (Decimal(RATING_SCALE * won) / assigned).quantize(Decimal('0.01')) if assigned else Decimal('0.00')
+
+
+def rating_expression(assigned, won):
+    """rating() as SQL over counter expressions, for use inside the same UPDATE"""
+    return Case(
+        When(GreaterThan(assigned, 0), then=Round(
+            Cast(won, FloatField()) * RATING_SCALE / Cast(assigned, FloatField()), 2,
+        )),
+        default=Value(0),
+        output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def adjust_counters(counsellor_id, leads=0, won=0, business=0):
+    """
+    Shift one counsellor's counters by the given deltas in a single UPDATE.
+    F() keeps concurrent adjustments from overwriting each other, and the
+    rating is recomputed from the new totals in the same statement.
+    """
+    if counsellor_id is None or not (leads or won or business):
+        return
+    assigned = F('total_leads_assigned') + leads
+    won_total = F('total_leads_won') + won
+    Counsellor.objects.filter(pk=counsellor_id).update(
+        total_leads_assigned=assigned,
+        total_leads_won=won_total,
+        total_business_generated=F('total_business_generated') + business,
+        performance_rating=rating_expression(assigned, won_total),
+    )
+
+
+def lead_changed(old, new):
+    """Counter updates for a lead moving from old to new (counsellor_id, status); None for no lead"""
+    deltas = defaultdict(lambda: [0, 0])
+    for state, sign in ((old, -1), (new, 1)):
+        if state and state[0] is not None:
+            deltas[state[0]][0] += sign
+            deltas[state[0]][1] += sign if state[1] == WON_STATUS else 0
+    for counsellor_id, (leads, won) in deltas.items():
+        adjust_counters(counsellor_id, leads=leads, won=won)
+
+
+def business_value(status, value):
+    return Decimal(value or 0) if status == COUNTED_BUSINESS_STATUS else Decimal(0)
+
+
+def business_changed(old, new):
+    """Counter updates for a business moving from old to new (counsellor_id, status, value)"""
+    deltas = defaultdict(Decimal)
+    for state, sign in ((old, -1), (new, 1)):
+        if state and state[0] is not None:
+            deltas[state[0]] += sign * business_value(state[1], state[2])
+    for counsellor_id, business in deltas.items():
+        adjust_counters(counsellor_id, business=business)
+
+
+def reconcile_counters(counsellor_ids=None, fix=True):
+    """
+    Recount every counter from Lead and Business with two grouped queries and
+    (with fix=True) save the counsellors whose stored values drifted.
+    Returns [(counsellor, {field: (stored, actual)})] for the drifted ones.
+    """
+    counsellors = Counsellor.objects.select_related('admin')
+    leads = Lead.objects.filter(assigned_counsellor__isnull=False)
+    businesses = Business.objects.filter(status=COUNTED_BUSINESS_STATUS)
+    if counsellor_ids is not None:
+        counsellors = counsellors.filter(id__in=counsellor_ids)
+        leads = leads.filter(assigned_counsellor__in=counsellor_ids)
+        businesses = businesses.filter(counsellor__in=counsellor_ids)
+
+    lead_counts = {
+        row['assigned_counsellor']: row for row in leads.values('assigned_counsellor').annotate(
+            total=Count('id'), won=Count('id', filter=Q(status=WON_STATUS))
+        ).order_by()
+    }
+    business_totals = dict(businesses.values('counsellor').annotate(total=Sum('value'))
+                           .order_by().values_list('counsellor', 'total'))
+
+    drifted = []
+    for counsellor in counsellors:
+        counts = lead_counts.get(counsellor.id, {'total': 0, 'won': 0})
+        actual = {
+            'total_leads_assigned': counts['total'],
+            'total_leads_won': counts['won'],
+            'total_business_generated': business_totals.get(counsellor.id) or Decimal('0.00'),
+            'performance_rating': rating(counts['total'], counts['won']),
+        }
+        diff = {
+            field: (getattr(counsellor, field), value)
+            for field, value in actual.items() if getattr(counsellor, field) != value
+        }
+        if diff:
+            for field, value in actual.items():
+                setattr(counsellor, field, value)
+            drifted.append((counsellor, diff))
+    if fix and drifted:
+        Counsellor.objects.bulk_update([counsellor for counsellor, _ in drifted], Counsellor.COUNTER_FIELDS, batch_size=500)
+    return drifted
@@ -0,0 +1,216 @@
+from django.db.models import Case, Count, DecimalField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import Business, Counsellor, Lead, LeadActivity, LeadSource
+
+
+def month_start(value=None):
+    """First instant of the (local) month containing value"""
+    value = timezone.localtime(value or timezone.now())
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    """Shift a month-start datetime by a number of calendar months"""
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def trend_months(count=6, now=None):
+    """Month start datetimes for the last `count` months, newest first"""
+    current_month = month_start(now)
+    return [add_months(current_month, -i) for i in range(count)]
+
+
+def get_lead_stats(leads=None, months=6, now=None):
+    """Status counts, current month total and monthly trend for a lead queryset in one query"""
+    leads = Lead.objects.all() if leads is None else leads
+    month_starts = trend_months(months, now)
+
+    aggregates = {'total': Count('id')}
+    for status, _ in Lead.LEAD_STATUS:
+        aggregates[f'status_{status}'] = Count('id', filter=Q(status=status))
+    for i, start in enumerate(month_starts):
+        aggregates[f'month_{i}'] = Count('id', filter=Q(
+            created_at__gte=start, created_at__lt=add_months(start, 1)
+        ))
+    row = leads.aggregate(**aggregates)
+
+    return {
+        'total': row['total'],
+        'status_counts': {status: row[f'status_{status}'] for status, _ in Lead.LEAD_STATUS},
+        'monthly': row['month_0'],
+        'trend': [
+            {'month': start, 'count': row[f'month_{i}']}
+            for i, start in enumerate(month_starts)
+        ],
+    }
+
+
+def get_business_stats(businesses=None, months=6, now=None):
+    """Active business value totals for the current month and monthly trend in one query"""
+    businesses = Business.objects.all() if businesses is None else businesses
+    month_starts = trend_months(months, now)
+
+    active = Q(status='ACTIVE')
+    aggregates = {
+        'total': Sum('value', filter=active),
+        'active_count': Count('id', filter=active),
+        'pending_count': Count('id', filter=Q(status='PENDING')),
+    }
+    for i, start in enumerate(month_starts):
+        aggregates[f'month_{i}'] = Sum('value', filter=active & Q(
+            created_at__gte=start, created_at__lt=add_months(start, 1)
+        ))
+    row = businesses.aggregate(**aggregates)
+
+    return {
+        'total': row['total'] or 0,
+        'active_count': row['active_count'],
+        'pending_count': row['pending_count'],
+        'monthly': row['month_0'] or 0,
+        'trend': [
+            {'month': start, 'value': row[f'month_{i}'] or 0}
+            for i, start in enumerate(month_starts)
+        ],
+    }
+
+
+def get_dashboard_stats(months=6, now=None):
+    """Lead and business statistics for the admin dashboard (two queries)"""
+    lead_stats = get_lead_stats(months=months, now=now)
+    business_stats = get_business_stats(months=months, now=now)
+
+    monthly_trend = [
+        {
+            'month': lead_month['month'].strftime('%B %Y'),
+            'leads': lead_month['count'],
+            'business': float(business_month['value']),
+        }
+        for lead_month, business_month in zip(lead_stats['trend'], business_stats['trend'])
+    ]
+
+    return {
+        'leads': lead_stats,
+        'business': business_stats,
+        'monthly_trend': monthly_trend,
+    }
+
+
+def get_activity_trend(activities, months=6, now=None):
+    """Activity counts per month for an activity queryset in one query"""
+    month_starts = trend_months(months, now)
+    row = activities.aggregate(**{
+        f'month_{i}': Count('id', filter=Q(
+            completed_date__gte=start, completed_date__lt=add_months(start, 1)
+        ))
+        for i, start in enumerate(month_starts)
+    })
+    return [
+        {'month': start, 'count': row[f'month_{i}']}
+        for i, start in enumerate(month_starts)
+    ]
+
+
+def build_admin_dashboard():
+    """Everything admin_home renders, as a cacheable snapshot"""
+    stats = get_dashboard_stats()
+    lead_counts = stats['leads']['status_counts']
+
+    lead_sources = LeadSource.objects.annotate(
+        lead_count=Count('lead')
+    ).values('name', 'lead_count')
+
+    counsellor_performance = Counsellor.objects.filter(is_active=True).annotate(
+        total_leads=Count('lead'),
+        total_business=Sum('business__value'),
+        conversion_rate=Case(
+            When(total_leads=0, then=Value(0.0)),
+            default=Count('business') * 100.0 / Count('lead'),
+            output_field=DecimalField()
+        )
+    ).values('admin__first_name', 'admin__last_name', 'total_leads', 'total_business', 'conversion_rate')
+
+    recent_activities = LeadActivity.objects.select_related(
+        'lead', 'counsellor__admin'
+    ).order_by('-completed_date')[:10]
+
+    return {
+        'total_counsellors': Counsellor.objects.filter(is_active=True).count(),
+        'total_leads': stats['leads']['total'],
+        'total_business': stats['business']['total'],
+        'new_leads': lead_counts['NEW'],
+        'contacted_leads': lead_counts['CONTACTED'],
+        'qualified_leads': lead_counts['QUALIFIED'],
+        'closed_won': lead_counts['CLOSED_WON'],
+        'closed_lost': lead_counts['CLOSED_LOST'],
+        'monthly_leads': stats['leads']['monthly'],
+        'monthly_business': stats['business']['monthly'],
+        'lead_sources': list(lead_sources),
+        'counsellor_performance': list(counsellor_performance),
+        'recent_activities': list(recent_activities),
+        'lead_status_data': {
+            status: lead_counts[status]
+            for status in ('NEW', 'CONTACTED', 'QUALIFIED', 'CLOSED_WON', 'CLOSED_LOST')
+        },
+        'monthly_trend': stats['monthly_trend'],
+    }
+
+
+def build_lead_analytics():
+    """Payload of the admin lead analytics endpoint"""
+    lead_stats = get_lead_stats()
+    return {
+        'status_data': [
+            {'status': status, 'count': count}
+            for status, count in lead_stats['status_counts'].items() if count
+        ],
+        'monthly_data': [
+            {'month': month['month'].strftime('%B'), 'leads': month['count']}
+            for month in lead_stats['trend']
+        ],
+    }
+
+
+def build_counsellor_dashboard(counsellor):
+    """Everything counsellor_home renders (except time-sensitive follow-ups)"""
+    lead_stats = get_lead_stats(Lead.objects.filter(assigned_counsellor=counsellor), months=1)
+    business_stats = get_business_stats(Business.objects.filter(counsellor=counsellor), months=1)
+    lead_counts = lead_stats['status_counts']
+
+    recent_activities = LeadActivity.objects.filter(
+        counsellor=counsellor
+    ).select_related('lead').order_by('-completed_date')[:10]
+
+    return {
+        'total_leads': lead_stats['total'],
+        'new_leads': lead_counts['NEW'],
+        'contacted_leads': lead_counts['CONTACTED'],
+        'qualified_leads': lead_counts['QUALIFIED'],
+        'closed_won': lead_counts['CLOSED_WON'],
+        'total_business_value': business_stats['total'],
+        'pending_businesses': business_stats['pending_count'],
+        'active_businesses': business_stats['active_count'],
+        'recent_activities': list(recent_activities),
+        'lead_status_data': {
+            status: lead_counts[status]
+            for status in ('NEW', 'CONTACTED', 'QUALIFIED', 'CLOSED_WON')
+        },
+        'monthly_leads': lead_stats['monthly'],
+        'monthly_business': business_stats['monthly'],
+    }
+
+
+def build_counsellor_analytics(counsellor):
+    """Payload of the counsellor analytics endpoint"""
+    status_data = Lead.objects.filter(assigned_counsellor=counsellor).values('status').annotate(
+        count=Count('id')
+    ).values('status', 'count')
+    activity_trend = get_activity_trend(LeadActivity.objects.filter(counsellor=counsellor))
+    return {
+        'status_data': list(status_data),
+        'monthly_activities': [
+            {'month': month['month'].strftime('%B'), 'activities': month['count']}
+            for month in activity_trend
+        ],
+    }
@@ -0,0 +1,185 @@
+import csv
+import re
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Coalesce, Concat, Trim
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Business
+
+# Excel stops at 1,048,576 rows per sheet, header included
+XLSX_MAX_ROWS = 1048575
+# Leading characters spreadsheet apps read as a formula when opening a CSV;
+# openpyxl itself only treats '=' as one
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+XLSX_FORMULA_PREFIXES = ('=',)
+# '+'/'-' values that are just a number or phone number ('+234 803 555 0101',
+# '-12.5') are left as they are
+PLAIN_NUMBER = re.compile(r'[+-]?[\d\s().-]+')
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _xlsx_max_rows():
+    return min(getattr(settings, 'XLSX_EXPORT_MAX_ROWS', 100000), XLSX_MAX_ROWS)
+
+
+def full_name(prefix):
+    """'first last' of a related user as a SQL expression, blank when unset"""
+    return Trim(Concat(
+        Coalesce(f'{prefix}first_name', Value('')), Value(' '), Coalesce(f'{prefix}last_name', Value('')),
+        output_field=CharField(),
+    ))
+
+
+LEAD_COLUMNS = (
+    ('Lead ID', 'lead_id'),
+    ('First Name', 'first_name'),
+    ('Last Name', 'last_name'),
+    ('Email', 'email'),
+    ('Phone', 'phone'),
+    ('Company', 'company'),
+    ('Position', 'position'),
+    ('Industry', 'industry'),
+    ('Source', 'source__name'),
+    ('Status', 'status'),
+    ('Priority', 'priority'),
+    ('Counsellor', full_name('assigned_counsellor__admin__')),
+    ('Expected Value', 'expected_value'),
+    ('Conversion Score', 'conversion_score'),
+    ('City', 'city'),
+    ('Country', 'country'),
+    ('Created At', 'created_at'),
+    ('Last Contact', 'last_contact_date'),
+    ('Next Follow Up', 'next_follow_up'),
+)
+
+BUSINESS_COLUMNS = (
+    ('Business ID', 'business_id'),
+    ('Title', 'title'),
+    ('Lead ID', 'lead__lead_id'),
+    ('Lead', Trim(Concat('lead__first_name', Value(' '), 'lead__last_name', output_field=CharField()))),
+    ('Counsellor', full_name('counsellor__admin__')),
+    ('Value', 'value'),
+    ('Status', 'status'),
+    ('Start Date', 'start_date'),
+    ('End Date', 'end_date'),
+    ('Created At', 'created_at'),
+)
+
+ACTIVITY_COLUMNS = (
+    ('Completed', 'completed_date'),
+    ('Scheduled', 'scheduled_date'),
+    ('Lead ID', 'lead__lead_id'),
+    ('Lead', Trim(Concat('lead__first_name', Value(' '), 'lead__last_name', output_field=CharField()))),
+    ('Activity Type', 'activity_type'),
+    ('Subject', 'subject'),
+    ('Outcome', 'outcome'),
+    ('Next Action', 'next_action'),
+    ('Duration (min)', 'duration'),
+    ('Completed?', 'is_completed'),
+)
+
+
+def filter_businesses(businesses, params):
+    """Apply the search box and the status/counsellor filters of the business listing"""
+    search = (params.get('q') or '').strip()
+    if search:
+        businesses = businesses.filter(
+            Q(title__icontains=search) | Q(business_id__icontains=search) |
+            Q(lead__first_name__icontains=search) | Q(lead__last_name__icontains=search)
+        )
+    status = params.get('status')
+    if status in dict(Business.BUSINESS_STATUS):
+        businesses = businesses.filter(status=status)
+    counsellor = params.get('counsellor')
+    if counsellor and counsellor.isdigit():
+        businesses = businesses.filter(counsellor_id=int(counsellor))
+    return businesses
+
+
+def export_rows(queryset, columns, chunk_size=None):
+    """
+    Row tuples for the given columns, fetched with values_list() through a
+    server-side iterator so only one chunk of rows is held at a time.
+    """
+    fields = [field for _, field in columns]
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size or _chunk_size())
+
+
+def cell(value, formula_prefixes=FORMULA_PREFIXES):
+    """A value as written to a sheet: local naive datetimes, formula-safe text"""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.replace(tzinfo=None, microsecond=0)
+    if isinstance(value, str) and value.startswith(formula_prefixes):
+        if value.startswith(('+', '-')) and PLAIN_NUMBER.fullmatch(value):
+            return value
+        return "'" + value
+    return value
+
+
+class Echo:
+    """A file-like object whose write() hands back the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(['' if value is None else cell(value) for value in row])
+
+
+def csv_response(filename, headers, rows):
+    response = StreamingHttpResponse(csv_lines(headers, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(filename, headers, rows):
+    """
+    Write the rows with an openpyxl write-only workbook, which flushes each
+    row to disk as it is appended, then stream the saved file back in blocks.
+    Sheets are capped at XLSX_EXPORT_MAX_ROWS; export_response sends larger
+    exports as CSV.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(filename[:31])
+    sheet.append(headers)
+    max_rows = _xlsx_max_rows()
+    for count, row in enumerate(rows):
+        if count >= max_rows:
+            break
+        sheet.append([cell(value, XLSX_FORMULA_PREFIXES) for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_response(queryset, columns, filename, file_format='csv'):
+    """
+    Stream a queryset as a CSV (default) or XLSX download. The workbook is
+    built before the response starts, so XLSX is only used up to
+    XLSX_EXPORT_MAX_ROWS rows (checked with a bounded COUNT); larger
+    exports are streamed as CSV instead of outrunning the request timeout.
+    """
+    headers = [header for header, _ in columns]
+    rows = export_rows(queryset, columns)
+    if file_format == 'xlsx' and queryset[:_xlsx_max_rows() + 1].count() <= _xlsx_max_rows():
+        return xlsx_response(filename, headers, rows)
+    return csv_response(filename, headers, rows)
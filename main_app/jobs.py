@@ -0,0 +1,193 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .assignment import ImportAssigner
+from .lead_import import import_leads_file
+from .models import ImportJob, WorkflowJob
+from .workflow import run_workflow
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_import(file, source, assigned_counsellor=None, created_by=None, **options):
+    """Store the upload and queue it for the background worker"""
+    return ImportJob.objects.create(
+        file=file,
+        source=source,
+        assigned_counsellor=assigned_counsellor,
+        created_by=created_by,
+        options=options,
+    )
+
+
+def claim_job(model, job_id):
+    """
+    Atomically move a pending job to RUNNING; returns False if someone else got it.
+
+    The conditional UPDATE makes the claim safe with several workers on any
+    database, without needing SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    return bool(model.objects.filter(id=job_id, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now()
+    ))
+
+
+def claim_import(job_id):
+    """Claim a specific import job; returns None if it was already taken"""
+    if claim_job(ImportJob, job_id):
+        return ImportJob.objects.select_related('source', 'assigned_counsellor').get(id=job_id)
+    return None
+
+
+def claim_workflow(job_id):
+    """Claim a specific workflow job; returns None if it was already taken"""
+    if claim_job(WorkflowJob, job_id):
+        return WorkflowJob.objects.select_related('lead').get(id=job_id)
+    return None
+
+
+def stale_before(timeout_setting, default):
+    """Cutoff for RUNNING jobs: one started earlier has outlived its timeout, so its worker died"""
+    return timezone.now() - timedelta(seconds=getattr(settings, timeout_setting, default))
+
+
+def requeue_stale_workflows(lead=None):
+    """
+    Put workflow jobs left RUNNING by a worker that was killed (deploy, OOM)
+    back in the queue; returns how many were requeued. A workflow only
+    writes the lead once, at the end, so running it again is safe.
+    """
+    jobs = WorkflowJob.objects.filter(status='RUNNING', started_at__lt=stale_before('WORKFLOW_JOB_TIMEOUT', 15 * 60))
+    if lead is not None:
+        jobs = jobs.filter(lead=lead)
+    return jobs.update(status='PENDING', started_at=None)
+
+
+def fail_stale_imports():
+    """
+    Mark imports left RUNNING by a killed worker (past IMPORT_JOB_TIMEOUT) as
+    failed so their progress page stops polling. They aren't rerun: the
+    chunks committed before the worker died would be imported twice, so
+    their uploads are deleted too.
+    """
+    stale = ImportJob.objects.filter(status='RUNNING', started_at__lt=stale_before('IMPORT_JOB_TIMEOUT', 2 * 60 * 60))
+    for job in stale.exclude(file=''):
+        job.file.delete(save=False)
+    return stale.update(
+        status='FAILED', finished_at=timezone.now(), file='',
+        message='Import stopped: the worker running it exited. The rows counted above were imported; '
+                're-upload the file with "skip duplicates" to import the rest.',
+    )
+
+
+def _claim_next(model, claim):
+    for job_id in model.objects.filter(status='PENDING').order_by('created_at').values_list('id', flat=True)[:5]:
+        job = claim(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def claim_next_import():
+    """Claim the oldest pending import job"""
+    return _claim_next(ImportJob, claim_import)
+
+
+def claim_next_workflow():
+    """Claim the oldest pending workflow job"""
+    return _claim_next(WorkflowJob, claim_workflow)
+
+
+def _save_progress(job, report):
+    job.rows_processed = report['processed']
+    job.rows_created = report['created']
+    job.rows_skipped = report['skipped']
+    job.error_count = len(report['errors'])
+    job.errors = report['errors'][:ImportJob.MAX_STORED_ERRORS]
+    job.save(update_fields=['rows_processed', 'rows_created', 'rows_skipped', 'error_count', 'errors'])
+
+
+def run_import_job(job):
+    """Run one claimed import job to completion, recording progress as it goes"""
+    options = job.options or {}
+    assigner = None
+    if options.get('auto_assign') and not job.assigned_counsellor:
+        assigner = ImportAssigner(options.get('assignment_method', 'round_robin'))
+    try:
+        with job.file.open('rb') as file:
+            report = import_leads_file(
+                file, job.source,
+                assigned_counsellor=job.assigned_counsellor,
+                status=options.get('status', 'NEW'),
+                priority=options.get('priority', 'MEDIUM'),
+                default_value=options.get('default_value', 0),
+                skip_duplicates=options.get('skip_duplicates', False),
+                atomic=False,
+                on_progress=lambda report: _save_progress(job, report),
+                on_chunk=assigner,
+            )
+        _save_progress(job, report)
+
+        message = f"Imported {report['created']} leads. {len(report['errors'])} rows had errors."
+        if assigner and report['created']:
+            message += ' ' + assigner.message()
+        job.status = 'COMPLETED'
+        job.message = message
+    except Exception as e:
+        logger.exception("Import job %s failed", job.pk)
+        job.status = 'FAILED'
+        job.message = f"Import failed: {e}"
+        job.errors = job.errors or [{'row': None, 'errors': [traceback.format_exc(limit=1)]}]
+    finally:
+        # The upload is read once; drop it so finished imports don't pile up in MEDIA_ROOT
+        job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'message', 'errors', 'finished_at', 'file'])
+    return job
+
+
+def enqueue_workflow(lead, requested_by=None):
+    """Queue the AI workflow for a lead, reusing a run that is already queued or running"""
+    requeue_stale_workflows(lead)
+    job = WorkflowJob.objects.filter(lead=lead, status__in=('PENDING', 'RUNNING')).first()
+    return job or WorkflowJob.objects.create(lead=lead, requested_by=requested_by)
+
+
+def run_workflow_job(job):
+    """Run one claimed workflow job"""
+    try:
+        results = run_workflow(job.lead)
+        job.result = results
+        job.status = 'COMPLETED'
+        job.message = f"Workflow complete. Routed to {results['route']['routed_to'].replace('_', ' ')}."
+    except Exception as e:
+        logger.exception("Workflow job %s failed", job.pk)
+        job.status = 'FAILED'
+        job.message = f"Workflow failed: {e}"
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'message', 'finished_at'])
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Process queued jobs (imports first) until none are left (or `limit` have run)"""
+    fail_stale_imports()
+    requeue_stale_workflows()
+    processed = 0
+    while limit is None or processed < limit:
+        close_old_connections()
+        job = claim_next_import()
+        if job is not None:
+            run_import_job(job)
+        else:
+            job = claim_next_workflow()
+            if job is None:
+                break
+            run_workflow_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,206 @@
+from contextlib import nullcontext
+from decimal import Decimal
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .counters import WON_STATUS, adjust_counters
+from .models import Lead
+from .performance import month_of, schedule_refresh
+from .search import index_leads
+from .snapshots import invalidate_snapshots
+
+IMPORT_COLUMNS = [
+    'first_name', 'last_name', 'email', 'phone', 'company', 'position', 'industry',
+    'expected_value', 'notes', 'address', 'city', 'state', 'country', 'postal_code',
+    'website', 'linkedin',
+]
+REQUIRED_COLUMNS = ['first_name', 'last_name', 'email', 'phone']
+TEXT_COLUMNS = [column for column in IMPORT_COLUMNS if column != 'expected_value']
+
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+MAX_EXPECTED_VALUE = 10 ** 10  # max_digits=12, decimal_places=2
+
+# Spreadsheet row of the first data row (row 1 is the header)
+FIRST_DATA_ROW = 2
+
+
+def _chunk_size():
+    return getattr(settings, 'LEAD_IMPORT_CHUNK_SIZE', 5000)
+
+
+def _batch_size():
+    return getattr(settings, 'LEAD_IMPORT_BATCH_SIZE', 1000)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Excel stores phone numbers and postal codes as floats
+        return str(int(value))
+    return str(value)
+
+
+def iter_csv_chunks(file, chunk_size):
+    reader = pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    for chunk in reader:
+        yield chunk
+
+
+def iter_excel_chunks(file, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_cell_text(value) for value in next(rows, ())]
+        width = len(header)
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            row = list(row[:width]) + [None] * (width - len(row))
+            buffer.append([_cell_text(value) for value in row])
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_chunks(file, chunk_size=None):
+    """Yield the uploaded file as DataFrames of at most chunk_size rows"""
+    chunk_size = chunk_size or _chunk_size()
+    name = getattr(file, 'name', '') or ''
+    if name.lower().endswith('.csv'):
+        return iter_csv_chunks(file, chunk_size)
+    return iter_excel_chunks(file, chunk_size)
+
+
+def normalise_chunk(df, first_row, default_value=0):
+    """
+    Validate and normalise one chunk with column-wise operations.
+
+    Returns (clean DataFrame of valid rows, list of per-row errors). Row
+    numbers in the errors are spreadsheet rows, counting the header as row 1.
+    """
+    df = df.rename(columns=lambda column: str(column).strip().lower())
+    df = df.loc[:, ~df.columns.duplicated()]
+    df = df.reindex(columns=IMPORT_COLUMNS, fill_value='')
+    df[TEXT_COLUMNS] = df[TEXT_COLUMNS].fillna('').astype(str).apply(lambda column: column.str.strip())
+    df['email'] = df['email'].str.lower()
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+
+    problems = {}
+    for column in REQUIRED_COLUMNS:
+        problems[f'{column} is required'] = df[column] == ''
+    problems['email is not a valid address'] = (df['email'] != '') & ~df['email'].str.match(EMAIL_PATTERN)
+    for column in TEXT_COLUMNS:
+        max_length = Lead._meta.get_field(column).max_length
+        if max_length:
+            problems[f'{column} is longer than {max_length} characters'] = df[column].str.len() > max_length
+
+    raw_value = df['expected_value'].fillna('').astype(str).str.replace(',', '').str.strip()
+    value = pd.to_numeric(raw_value, errors='coerce')
+    problems['expected_value is not a number'] = (raw_value != '') & value.isna()
+    problems['expected_value is out of range'] = value.abs() >= MAX_EXPECTED_VALUE
+    df['expected_value'] = value.fillna(default_value).round(2)
+
+    invalid = pd.Series(False, index=df.index)
+    for mask in problems.values():
+        invalid |= mask
+
+    errors = []
+    if invalid.any():
+        for row_number in df.index[invalid]:
+            errors.append({
+                'row': int(row_number),
+                'errors': [message for message, mask in problems.items() if mask[row_number]],
+            })
+    return df[~invalid], errors
+
+
+def existing_emails(emails, batch_size=900):
+    """Emails among `emails` that already belong to a lead"""
+    emails = list(emails)
+    found = set()
+    for i in range(0, len(emails), batch_size):
+        found.update(Lead.objects.filter(
+            email__in=emails[i:i + batch_size]
+        ).values_list('email', flat=True))
+    return {email.lower() for email in found}
+
+
+def _record_created(count, assigned_counsellor, status):
+    invalidate_snapshots([assigned_counsellor.id] if assigned_counsellor else [])
+    if assigned_counsellor and count:
+        schedule_refresh([(assigned_counsellor.id, month_of())])
+        adjust_counters(assigned_counsellor.id, leads=count, won=count if status == WON_STATUS else 0)
+
+
+def import_leads_file(file, source, assigned_counsellor=None, status='NEW', priority='MEDIUM',
+                      default_value=0, skip_duplicates=False, chunk_size=None, batch_size=None,
+                      atomic=True, on_progress=None, on_chunk=None):
+    """
+    Stream an uploaded CSV/XLSX file into Lead rows with bulk_create.
+
+    With atomic=True all inserts happen in one transaction; otherwise each
+    chunk commits on its own so progress is visible to other connections
+    (background jobs). Rows that fail validation are skipped and reported
+    with their spreadsheet row number. on_chunk(leads) runs with each chunk's
+    new leads inside its transaction (auto-assignment); on_progress(report)
+    runs after every chunk. Only counts are kept, so memory stays bounded by
+    the chunk size however large the file is.
+    """
+    batch_size = batch_size or _batch_size()
+    status = status if status in dict(Lead.LEAD_STATUS) else 'NEW'
+    priority = priority if priority in dict(Lead.PRIORITY) else 'MEDIUM'
+    default_value = default_value or 0
+
+    report = {'processed': 0, 'created': 0, 'skipped': 0, 'errors': []}
+    seen_emails = set()
+    next_row = FIRST_DATA_ROW
+
+    with transaction.atomic() if atomic else nullcontext():
+        for chunk in iter_chunks(file, chunk_size):
+            clean, errors = normalise_chunk(chunk, next_row, default_value)
+            next_row += len(chunk)
+            report['processed'] += len(chunk)
+            report['errors'].extend(errors)
+
+            if skip_duplicates and len(clean):
+                duplicate = clean['email'].duplicated() | clean['email'].isin(seen_emails)
+                duplicate |= clean['email'].isin(existing_emails(set(clean['email']) - seen_emails))
+                seen_emails.update(clean['email'])
+                report['skipped'] += int(duplicate.sum())
+                clean = clean[~duplicate]
+
+            leads = [
+                Lead(
+                    source=source,
+                    assigned_counsellor=assigned_counsellor,
+                    status=status,
+                    priority=priority,
+                    expected_value=Decimal(str(row['expected_value'])),
+                    **{column: row[column] for column in TEXT_COLUMNS}
+                )
+                for row in clean.to_dict('records')
+            ]
+            with transaction.atomic():
+                created = Lead.objects.bulk_create(leads, batch_size=batch_size)
+                # bulk_create skips post_save, so index the new leads and update counters,
+                # snapshots and rollups here, with the chunk: if a later chunk fails, the
+                # committed ones are already accounted for
+                index_leads(lead.id for lead in created)
+                _record_created(len(created), assigned_counsellor, status)
+                if on_chunk and created:
+                    on_chunk(created)
+            report['created'] += len(leads)
+
+            if on_progress:
+                on_progress(report)
+    return report
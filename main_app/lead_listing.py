@@ -0,0 +1,187 @@
+from django.core import signing
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Lead
+from .search import search_filter
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+# DataTables column name -> model field used for ordering. Columns backed by
+# non-null fields can be paged with a seek cursor; the rest fall back to OFFSET.
+SORT_COLUMNS = {
+    'id': 'id',
+    'lead_id': 'lead_id',
+    'name': 'first_name',
+    'email': 'email',
+    'phone': 'phone',
+    'company': 'company',
+    'source': 'source__name',
+    'status': 'status',
+    'priority': 'priority',
+    'counsellor': 'assigned_counsellor__admin__first_name',
+    'expected_value': 'expected_value',
+    'created_at': 'created_at',
+    'last_contact_date': 'last_contact_date',
+    'next_follow_up': 'next_follow_up',
+}
+SEEKABLE_FIELDS = {
+    'id', 'lead_id', 'first_name', 'email', 'phone', 'company',
+    'status', 'priority', 'expected_value', 'created_at',
+}
+
+ROW_FIELDS = (
+    'id', 'lead_id', 'first_name', 'last_name', 'email', 'phone', 'company',
+    'source__name', 'status', 'priority', 'expected_value', 'created_at',
+    'last_contact_date', 'next_follow_up',
+    'assigned_counsellor__admin__first_name', 'assigned_counsellor__admin__last_name',
+)
+
+CURSOR_SALT = 'main_app.lead_listing'
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def filter_leads(leads, params):
+    """Apply the search box (full-text index) and the status/priority/source/counsellor filters"""
+    leads = search_filter(leads, params.get('search[value]') or params.get('q'))
+
+    status = params.get('status')
+    if status in dict(Lead.LEAD_STATUS):
+        leads = leads.filter(status=status)
+    priority = params.get('priority')
+    if priority in dict(Lead.PRIORITY):
+        leads = leads.filter(priority=priority)
+    source = _int(params.get('source'), None)
+    if source is not None:
+        leads = leads.filter(source_id=source)
+    counsellor = params.get('counsellor')
+    if counsellor == 'unassigned':
+        leads = leads.filter(assigned_counsellor__isnull=True)
+    elif _int(counsellor, None) is not None:
+        leads = leads.filter(assigned_counsellor_id=int(counsellor))
+    return leads
+
+
+def is_filtered(params):
+    keys = ('search[value]', 'q', 'status', 'priority', 'source', 'counsellor')
+    return any((params.get(key) or '').strip() for key in keys)
+
+
+def get_ordering(params):
+    """(field, descending) from the DataTables order parameters"""
+    column_index = params.get('order[0][column]')
+    column = params.get(f'columns[{column_index}][data]') if column_index is not None else None
+    column = column or params.get('sort')
+    field = SORT_COLUMNS.get(column, 'created_at')
+    descending = (params.get('order[0][dir]') or params.get('dir') or 'desc') == 'desc'
+    return field, descending
+
+
+def make_cursor(field, descending, row):
+    value = row[field]
+    return signing.dumps(
+        {'f': field, 'd': descending, 'v': str(value), 'id': row['id']},
+        salt=CURSOR_SALT
+    )
+
+
+def read_cursor(cursor, field, descending):
+    """Decode a cursor, ignoring it if it was issued for another ordering"""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get('f') != field or data.get('d') != descending:
+        return None
+    return data
+
+
+def seek(leads, field, descending, cursor):
+    """Rows strictly after (value, id) in the current ordering"""
+    op = 'lt' if descending else 'gt'
+    if field == 'id':
+        return leads.filter(**{f'id__{op}': cursor['id']})
+    return leads.filter(
+        Q(**{f'{field}__{op}': cursor['v']}) |
+        Q(**{field: cursor['v'], f'id__{op}': cursor['id']})
+    )
+
+
+def serialize_lead(row, admin=True):
+    counsellor = ' '.join(filter(None, [
+        row['assigned_counsellor__admin__first_name'],
+        row['assigned_counsellor__admin__last_name'],
+    ]))
+    data = {
+        'id': row['id'],
+        'lead_id': row['lead_id'],
+        'name': f"{row['first_name']} {row['last_name']}",
+        'email': row['email'],
+        'phone': row['phone'],
+        'company': row['company'],
+        'source': row['source__name'],
+        'status': row['status'],
+        'status_display': dict(Lead.LEAD_STATUS).get(row['status'], row['status']),
+        'priority': row['priority'],
+        'priority_display': dict(Lead.PRIORITY).get(row['priority'], row['priority']),
+        'counsellor': counsellor,
+        'expected_value': str(row['expected_value']),
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+        'last_contact_date': row['last_contact_date'].isoformat() if row['last_contact_date'] else None,
+        'next_follow_up': row['next_follow_up'].isoformat() if row['next_follow_up'] else None,
+    }
+    if admin:
+        data['edit_url'] = reverse('edit_lead', args=[row['id']])
+        data['delete_url'] = reverse('delete_lead', args=[row['id']])
+        data['transfer_url'] = reverse('transfer_lead', args=[row['id']])
+    else:
+        data['detail_url'] = reverse('lead_detail', args=[row['id']])
+        data['activity_url'] = reverse('add_lead_activity', args=[row['id']])
+    return data
+
+
+def lead_page(leads, params, total, admin=True):
+    """
+    One DataTables page of leads.
+
+    `total` is the unfiltered row count. When the client sends the `cursor` returned with the previous
+    page and the ordering column is seekable, the page is fetched with a
+    keyset predicate instead of OFFSET, so deep pages cost the same as the first.
+    """
+    length = min(max(_int(params.get('length'), DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    start = max(_int(params.get('start'), 0), 0)
+    field, descending = get_ordering(params)
+
+    filtered = filter_leads(leads, params)
+    records_filtered = filtered.count() if is_filtered(params) else total
+
+    prefix = '-' if descending else ''
+    page = filtered.order_by(f'{prefix}{field}', f'{prefix}id')
+
+    offset = start
+    cursor = read_cursor(params.get('cursor'), field, descending) if params.get('cursor') else None
+    if cursor and field in SEEKABLE_FIELDS:
+        page = seek(page, field, descending, cursor)
+        offset = 0
+
+    row_fields = ROW_FIELDS if field in ROW_FIELDS else ROW_FIELDS + (field,)
+    rows = list(page.values(*row_fields)[offset:offset + length])
+
+    next_cursor = None
+    if len(rows) == length and field in SEEKABLE_FIELDS:
+        next_cursor = make_cursor(field, descending, rows[-1])
+
+    return {
+        'draw': _int(params.get('draw'), 0),
+        'recordsTotal': total,
+        'recordsFiltered': records_filtered,
+        'data': [serialize_lead(row, admin) for row in rows],
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,145 @@
+import hashlib
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import LLMResponse
+
+STATS_KEYS = {'hits': 'llm_cache:hits', 'misses': 'llm_cache:misses'}
+LOOKUP_BATCH_SIZE = 500
+
+
+def is_enabled():
+    return getattr(settings, 'AI_CACHE_ENABLED', True)
+
+
+def _ttl():
+    return getattr(settings, 'AI_CACHE_TTL', 30 * 24 * 60 * 60)
+
+
+def _max_entries():
+    return getattr(settings, 'AI_CACHE_MAX_ENTRIES', 50000)
+
+
+def _prune_every():
+    return getattr(settings, 'AI_CACHE_PRUNE_EVERY', 100)
+
+
+def counts_are_shared():
+    """Hit/miss counts live in the default cache; a local-memory one keeps them per process"""
+    return settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def prompt_key(model, prompt):
+    return hashlib.sha256(f'{model}\0{prompt}'.encode()).hexdigest()
+
+
+def _count(name, amount):
+    if not amount:
+        return
+    key = STATS_KEYS[name]
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, None)
+
+
+def lookup(model, prompts):
+    """
+    {prompt: response} for the prompts with a live cache entry.
+
+    One SELECT (per LOOKUP_BATCH_SIZE prompts) plus one UPDATE that bumps
+    last_used_at and the hit count of the entries found.
+    """
+    keys = {prompt_key(model, prompt): prompt for prompt in set(prompts)}
+    if not keys or not is_enabled():
+        return {}
+    now = timezone.now()
+    found = {}
+    key_list = list(keys)
+    for i in range(0, len(key_list), LOOKUP_BATCH_SIZE):
+        rows = LLMResponse.objects.filter(
+            key__in=key_list[i:i + LOOKUP_BATCH_SIZE], expires_at__gt=now
+        ).values_list('key', 'response')
+        found.update(rows)
+    if found:
+        LLMResponse.objects.filter(key__in=list(found)).update(last_used_at=now, hits=F('hits') + 1)
+    _count('hits', len(found))
+    _count('misses', len(keys) - len(found))
+    return {keys[key]: response for key, response in found.items()}
+
+
+def store(model, responses):
+    """
+    Save {prompt: response}, replacing older entries for the same prompts.
+
+    The table is only counted on about one stored row in AI_CACHE_PRUNE_EVERY
+    (every call storing that many or more), so it can overshoot
+    AI_CACHE_MAX_ENTRIES slightly before a store prunes it; run_worker also
+    prunes it on its schedule.
+    """
+    responses = {prompt: text for prompt, text in responses.items() if text is not None}
+    if not responses or not is_enabled():
+        return
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=_ttl())
+    LLMResponse.objects.bulk_create([
+        LLMResponse(key=prompt_key(model, prompt), model=model, response=text,
+                    last_used_at=now, expires_at=expires_at)
+        for prompt, text in responses.items()
+    ], update_conflicts=True, unique_fields=['key'],
+        update_fields=['response', 'last_used_at', 'expires_at'], batch_size=LOOKUP_BATCH_SIZE)
+    if random.random() * _prune_every() < len(responses) and LLMResponse.objects.count() > _max_entries():
+        prune()
+
+
+def prune(max_entries=None):
+    """
+    Drop expired entries, then the least recently used ones beyond
+    max_entries. Trims to 90% of the limit so the next few inserts don't
+    trigger another pass. Returns the number of rows deleted.
+    """
+    max_entries = _max_entries() if max_entries is None else max_entries
+    deleted, _ = LLMResponse.objects.filter(expires_at__lte=timezone.now()).delete()
+    keep = int(max_entries * 0.9)
+    overflow = list(LLMResponse.objects.order_by('-last_used_at', '-id').values_list('id', flat=True)[keep:])
+    for i in range(0, len(overflow), LOOKUP_BATCH_SIZE):
+        deleted += LLMResponse.objects.filter(id__in=overflow[i:i + LOOKUP_BATCH_SIZE]).delete()[0]
+    return deleted
+
+
+def cached_completion(model, prompt, complete, bypass=False, accept=None):
+    """
+    Cached `complete(prompt)`. Only answers passing `accept(text)` are
+    stored. With bypass=True the cache is not read, but a fresh answer still
+    replaces the stored one.
+    """
+    if not bypass:
+        cached = lookup(model, [prompt])
+        if prompt in cached:
+            return cached[prompt]
+    text = complete(prompt)
+    if text is not None and (accept is None or accept(text)):
+        store(model, {prompt: text})
+    return text
+
+
+def stats():
+    """Entry counts from the database; hits/misses are counted in the default cache (see counts_are_shared)"""
+    totals = LLMResponse.objects.aggregate(hits=Sum('hits'))
+    return {
+        'entries': LLMResponse.objects.count(),
+        'entry_hits': totals['hits'] or 0,
+        'hits': cache.get(STATS_KEYS['hits'], 0),
+        'misses': cache.get(STATS_KEYS['misses'], 0),
+    }
+
+
+def clear():
+    cache.delete_many(list(STATS_KEYS.values()))
+    return LLMResponse.objects.all().delete()[0]
@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.urls import reverse
+from django.utils import timezone
+
+from .benchmarks import git_commit
+
+# Counsellor pages each virtual user opens after logging in: (step, url name, query)
+DEFAULT_PAGES = [
+    ('counsellor_home', 'counsellor_home', None),
+    ('my_leads_data', 'my_leads_data', {'length': 25}),
+    ('my_activities', 'my_activities', None),
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class VirtualUser:
+    """One browser: logs in with its own session, then opens the pages; every request is recorded"""
+
+    def __init__(self, base_url, email, password, pages, record, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.pages = pages
+        self.record = record
+        self.timeout = timeout
+
+    def request(self, session, step, method, path, check=None, **kwargs):
+        """Time one request; returns the response, or None when it failed (the error is recorded)"""
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.record(step, (time.perf_counter() - started) * 1000, None, False, str(e))
+            return None
+        ms = (time.perf_counter() - started) * 1000
+        error = f'HTTP {response.status_code}' if response.status_code >= 400 else check(response) if check else None
+        # The profiling middleware marks requests that had to open a database connection
+        new_connection = 'conn;desc="new"' in response.headers.get('Server-Timing', '')
+        self.record(step, ms, response.status_code, new_connection, error)
+        return None if error else response
+
+    def logged_in(self, response):
+        # doLogin redirects to the user's home page on success and back to the login page otherwise
+        location = response.headers.get('Location', '')
+        if response.status_code != 302 or location.rstrip('/') in ('', self.base_url):
+            return f'login rejected for {self.email}'
+        return None
+
+    def run(self):
+        with requests.Session() as session:
+            login_page = self.request(session, 'login_page', 'GET', reverse('login_page'))
+            if login_page is None:
+                return
+            response = self.request(session, 'login', 'POST', reverse('user_login'), check=self.logged_in,
+                                    allow_redirects=False, data={
+                                        'email': self.email, 'password': self.password,
+                                        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+                                    }, headers={'Referer': self.base_url + reverse('login_page')})
+            if response is None:
+                return
+            for step, name, params in self.pages:
+                self.request(session, step, 'GET', reverse(name), params=params)
+
+
+def summarize(samples):
+    durations = [sample['ms'] for sample in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample['error']),
+        'new_connections': sum(sample['new_connection'] for sample in samples),
+        'p50_ms': round(percentile(durations, 0.50), 1),
+        'p95_ms': round(percentile(durations, 0.95), 1),
+        'p99_ms': round(percentile(durations, 0.99), 1),
+        'max_ms': round(max(durations), 1),
+    }
+
+
+def run_load_test(base_url, credentials, users=20, rounds=5, pages=None, timeout=30):
+    """
+    Log `users` browsers in concurrently, `rounds` times each (a fresh
+    session per round), opening the counsellor pages after each login.
+    Requests that fail, answer 4xx/5xx or (logins) don't reach a home page
+    count as errors. Returns the JSON-ready report.
+    """
+    samples = []
+    lock = threading.Lock()
+
+    def record(step, ms, status, new_connection, error):
+        with lock:
+            samples.append({'step': step, 'ms': ms, 'status': status, 'new_connection': new_connection,
+                            'error': error})
+
+    def browse(index):
+        email, password = credentials[index % len(credentials)]
+        for _ in range(rounds):
+            VirtualUser(base_url, email, password, pages or DEFAULT_PAGES, record, timeout).run()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(browse, range(users)))
+    elapsed = time.perf_counter() - started
+
+    steps = {}
+    for sample in samples:
+        steps.setdefault(sample['step'], []).append(sample)
+    return {
+        'commit': git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'url': base_url,
+        'users': users,
+        'rounds': rounds,
+        'duration_s': round(elapsed, 2),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'total': summarize(samples) if samples else None,
+        'steps': {step: summarize(items) for step, items in steps.items()},
+        'errors': sorted({sample['error'] for sample in samples if sample['error']})[:10],
+    }
+
+
+def compare_load_reports(report, baseline):
+    """[(step, baseline p99, current p99, baseline new connections, current new connections)]"""
+    rows = []
+    current = dict(report['steps'], total=report['total'])
+    before = dict(baseline.get('steps', {}), total=baseline.get('total'))
+    for step, result in current.items():
+        if result and before.get(step):
+            rows.append((step, before[step]['p99_ms'], result['p99_ms'],
+                         before[step]['new_connections'], result['new_connections']))
+    return rows
@@ -0,0 +1,100 @@
+import random
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from main_app.assignment import (_rate, plan_performance_based, plan_specialization_based,
+                                 specialization_bonus)
+
+
+def synthetic_matrix(counsellor_ids, industries, source_ids, rng):
+    """A success matrix shaped like success_matrix() output, with random history"""
+    matrix = {
+        'overall': {cid: [0, 0] for cid in counsellor_ids},
+        'industry': defaultdict(lambda: [0, 0]),
+        'source': defaultdict(lambda: [0, 0]),
+    }
+    for cid in counsellor_ids:
+        for industry in industries:
+            for source_id in source_ids:
+                if rng.random() < 0.3:
+                    total = rng.randint(1, 20)
+                    won = rng.randint(0, total)
+                    for bucket in (matrix['overall'][cid], matrix['industry'][(cid, industry)],
+                                   matrix['source'][(cid, source_id)]):
+                        bucket[0] += total
+                        bucket[1] += won
+    return matrix
+
+
+def legacy_performance_plan(lead_ids, counsellor_ids, matrix):
+    """The previous algorithm: re-sort every counsellor after each lead"""
+    counsellors = [
+        {'id': cid, 'rate': _rate(matrix['overall'][cid]), 'total': matrix['overall'][cid][0]}
+        for cid in counsellor_ids
+    ]
+    counsellors.sort(key=lambda c: (-c['rate'], c['total']))
+    plan = defaultdict(list)
+    for lead_id in lead_ids:
+        plan[counsellors[0]['id']].append(lead_id)
+        counsellors[0]['total'] += 1
+        counsellors.sort(key=lambda c: (-c['rate'], c['total']))
+    return plan
+
+
+def legacy_specialization_plan(leads, counsellor_ids, matrix):
+    """The previous algorithm: score every counsellor for every lead"""
+    workload = {cid: matrix['overall'][cid][0] for cid in counsellor_ids}
+    plan = defaultdict(list)
+    for lead_id, industry, source_id in leads:
+        best, best_score = None, float('-inf')
+        for cid in counsellor_ids:
+            score = specialization_bonus(matrix, cid, industry, source_id) - workload[cid] * 2
+            if score > best_score:
+                best, best_score = cid, score
+        plan[best].append(lead_id)
+        workload[best] += 1
+    return plan
+
+
+class Command(BaseCommand):
+    help = 'Compare the assignment planners against the previous per-lead algorithms on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counsellors', type=int, default=100)
+        parser.add_argument('--leads', type=int, default=100000)
+        parser.add_argument('--industries', type=int, default=20)
+        parser.add_argument('--sources', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        counsellor_ids = list(range(1, options['counsellors'] + 1))
+        industries = [f'Industry {i}' for i in range(options['industries'])]
+        source_ids = list(range(1, options['sources'] + 1))
+        matrix = synthetic_matrix(counsellor_ids, industries, source_ids, rng)
+        leads = [
+            (lead_id, rng.choice(industries + ['']), rng.choice(source_ids))
+            for lead_id in range(options['leads'])
+        ]
+        lead_ids = [lead[0] for lead in leads]
+
+        self.stdout.write(f"{len(counsellor_ids)} counsellors, {len(leads)} leads")
+        for name, legacy, planner, args in (
+            ('performance_based', legacy_performance_plan, plan_performance_based, lead_ids),
+            ('specialization_based', legacy_specialization_plan, plan_specialization_based, leads),
+        ):
+            started = time.perf_counter()
+            expected = legacy(args, counsellor_ids, matrix)
+            legacy_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            plan = planner(args, counsellor_ids, matrix)
+            seconds = time.perf_counter() - started
+            if dict(plan) != dict(expected):
+                self.stdout.write(self.style.ERROR(f'{name}: plans differ'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: previous {legacy_seconds:.3f}s, now {seconds:.3f}s '
+                f'({legacy_seconds / max(seconds, 1e-9):.1f}x), same plan'
+            ))
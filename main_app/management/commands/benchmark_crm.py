@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.benchmarks import BENCHMARKS, compare_reports, run_benchmarks, write_report
+
+
+class Command(BaseCommand):
+    help = 'Time the key views and helpers against the current database and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='A previous JSON report to compare medians against')
+        parser.add_argument('--only', action='append', help='Run only this benchmark (repeatable); see --list')
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark')
+        parser.add_argument('--warm', action='store_true', help="Keep the cache between runs (default: cold)")
+        parser.add_argument('--import-rows', type=int, default=2000, help='Rows in the import benchmark file')
+        parser.add_argument('--assign', type=int, default=1000, help='Unassigned leads per assignment benchmark')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.stdout.write('\n'.join(BENCHMARKS))
+            return
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        def show(name, result):
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f'{name:40} {result["error"]}'))
+            else:
+                self.stdout.write(f'{name:40} {result["median_ms"]:>10.1f} ms  {result["queries"]:>4} queries')
+
+        try:
+            report = run_benchmarks(
+                options['only'], repeat=options['repeat'], warm=options['warm'],
+                import_rows=options['import_rows'], assign_count=options['assign'], on_result=show,
+            )
+        except KeyError as e:
+            raise CommandError(e.args[0])
+        self.stdout.write(f"{report['data']['leads']} leads on {report['database']}, commit {report['commit']}")
+
+        if baseline:
+            self.stdout.write(f"\nCompared with commit {baseline.get('commit')}:")
+            for name, before, after, ratio in compare_reports(report, baseline):
+                style = self.style.ERROR if ratio > 1.2 else self.style.SUCCESS if ratio < 0.8 else str
+                self.stdout.write(style(f'{name:40} {before:>10.1f} -> {after:>10.1f} ms  ({ratio:.2f}x)'))
+        if options['output']:
+            write_report(report, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from main_app import llm_cache
+
+
+class Command(BaseCommand):
+    help = 'Show, prune or clear the cached AI model responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Drop expired and least recently used entries')
+        parser.add_argument('--clear', action='store_true', help='Drop every cached response')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(self.style.SUCCESS(f'Cleared {llm_cache.clear()} cached responses'))
+        elif options['prune']:
+            self.stdout.write(self.style.SUCCESS(f'Pruned {llm_cache.prune()} cached responses'))
+        stats = llm_cache.stats()
+        summary = f"{stats['entries']} entries, {stats['entry_hits']} hits on stored entries"
+        if llm_cache.counts_are_shared():
+            summary += f"; lookups: {stats['hits']} hits / {stats['misses']} misses"
+        else:
+            summary += ('; lookup hit/miss counts are kept per process with the local-memory cache '
+                        '(set DJANGO_CACHE_BACKEND to a shared cache to collect them)')
+        self.stdout.write(summary)
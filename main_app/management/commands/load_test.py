@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.benchmarks import write_report
+from main_app.load_test import compare_load_reports, run_load_test
+from main_app.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Log counsellors in concurrently against a running server and report latency percentiles '
+            'and how many requests had to open a database connection')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+        parser.add_argument('--rounds', type=int, default=5, help='Logins (fresh sessions) per user')
+        parser.add_argument('--email', action='append',
+                            help='Counsellor login (repeatable); default: the counsellors seed_crm created')
+        parser.add_argument('--password', default='counsellor123', help='Password for every login')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds per request')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='A previous JSON report (e.g. with DATABASE_CONN_MAX_AGE=0) to compare against')
+
+    def handle(self, *args, **options):
+        emails = options['email'] or list(
+            CustomUser.objects.filter(user_type='2', is_active=True, email__endswith='@seed.example.com')
+            .order_by('id').values_list('email', flat=True)[:options['users']]
+        )
+        if not emails:
+            raise CommandError('No counsellor logins: pass --email or run seed_crm first')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        report = run_load_test(options['url'], [(email, options['password']) for email in emails],
+                               users=options['users'], rounds=options['rounds'], timeout=options['timeout'])
+        if not report['total']:
+            raise CommandError(f'No requests completed against {options["url"]}')
+        for step, result in [*report['steps'].items(), ('total', report['total'])]:
+            style = self.style.ERROR if result['errors'] else str
+            self.stdout.write(style(
+                f"{step:20} {result['requests']:>6} req  p50 {result['p50_ms']:>8.1f}  p95 {result['p95_ms']:>8.1f}  "
+                f"p99 {result['p99_ms']:>8.1f} ms  {result['new_connections']:>5} new conns  {result['errors']} errors"
+            ))
+        self.stdout.write(f"{report['throughput_rps']} req/s over {report['duration_s']} s, "
+                          f"{report['users']} users x {report['rounds']} logins")
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(error))
+
+        if baseline:
+            self.stdout.write(f"\nCompared with {baseline.get('url')} at commit {baseline.get('commit')}:")
+            for step, before, after, conns_before, conns_after in compare_load_reports(report, baseline):
+                ratio = after / before if before else 1
+                style = self.style.ERROR if ratio > 1.2 else self.style.SUCCESS if ratio < 0.8 else str
+                self.stdout.write(style(f'{step:20} p99 {before:>8.1f} -> {after:>8.1f} ms ({ratio:.2f}x)  '
+                                        f'new conns {conns_before} -> {conns_after}'))
+        if options['output']:
+            write_report(report, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main_app.sessions import prune_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions from the database in batches (run_worker also does this periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows per DELETE (default SESSION_PRUNE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        deleted = prune_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired session(s)'))
@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Min
+
+from main_app.models import CounsellorPerformance, Lead
+from main_app.performance import month_of, month_partitions, month_rollup_values, save_rollups
+
+
+def _parse_month(value):
+    for fmt in ('%Y-%m', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).date().replace(day=1)
+        except ValueError:
+            pass
+    raise CommandError(f'Invalid month "{value}", use YYYY-MM')
+
+
+def _init_worker():
+    # Needed with the spawn start method; a forked worker is already set up
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild CounsellorPerformance rollups for a range of months (safe to rerun)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First month, YYYY-MM (default: month of the oldest lead)')
+        parser.add_argument('--end', help='Last month, YYYY-MM (default: current month)')
+        parser.add_argument('--counsellor', type=int, action='append', help='Only this counsellor id (repeatable)')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Worker processes computing months in parallel (1 = in this process)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        end = _parse_month(options['end']) if options['end'] else month_of()
+        if options['start']:
+            start = _parse_month(options['start'])
+        else:
+            oldest = Lead.objects.aggregate(oldest=Min('created_at'))['oldest']
+            start = month_of(oldest) if oldest else end
+        if start > end:
+            raise CommandError('--start is after --end')
+
+        months = month_partitions(start, end)
+        counsellor_ids = options['counsellor']
+        workers = max(1, min(options['workers'], len(months)))
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Worker processes can't see an in-memory database
+            workers = 1
+
+        written = 0
+        if workers == 1:
+            for month in months:
+                written += self.save(month, month_rollup_values(month, counsellor_ids))
+        else:
+            # Workers only read; rows are written here so the upserts never race.
+            # Close connections first so forked workers don't share sockets.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(month_rollup_values, month, counsellor_ids): month for month in months}
+                for future in as_completed(futures):
+                    written += self.save(futures[future], future.result())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} rollups for {len(months)} month(s) with {workers} worker(s)'
+        ))
+
+    def save(self, month, values):
+        count = save_rollups(CounsellorPerformance(**row) for row in values)
+        if self.verbosity > 1:
+            self.stdout.write(f'{month:%Y-%m}: {count} rollups')
+        return count
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main_app.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the SQLite FTS5 lead search table from the lead table'
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend != 'fts5':
+            self.stdout.write(f'Nothing to rebuild: search backend is {backend or "substring fallback"}')
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} lead(s)'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main_app.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the counsellors' lead and business counters and fix any that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counsellor', type=int, action='append', help='Only this counsellor id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without saving')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters(options['counsellor'], fix=not options['dry_run'])
+        for counsellor, diff in drifted:
+            changes = ', '.join(f'{field} {stored} -> {actual}' for field, (stored, actual) in diff.items())
+            self.stdout.write(f'{counsellor}: {changes}')
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drifted)} counsellor(s) with drifted counters'))
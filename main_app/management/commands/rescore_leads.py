@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.models import Lead
+from main_app.scoring import RESCORE_BATCH_SIZE, rescore_leads
+
+
+class Command(BaseCommand):
+    help = 'Recompute the heuristic conversion score for leads in SQL (no AI calls)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unscored', action='store_true', help='Only leads without a conversion score')
+        parser.add_argument('--status', action='append', choices=[s for s, _ in Lead.LEAD_STATUS],
+                            help='Only leads with this status (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=RESCORE_BATCH_SIZE,
+                            help='Lead ids covered by each UPDATE')
+
+    def handle(self, *args, **options):
+        leads = Lead.objects.all()
+        if options['unscored']:
+            leads = leads.filter(conversion_score__isnull=True)
+        if options['status']:
+            leads = leads.filter(status__in=options['status'])
+
+        started = time.monotonic()
+        updated = rescore_leads(leads, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rescored {updated} leads in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main_app import llm_cache
+from main_app.jobs import run_pending_jobs
+from main_app.sessions import prune_sessions
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (lead imports, AI workflows) and prune expired sessions and AI cache entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the current queue and exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Worker started'))
+        prune_interval = settings.SESSION_PRUNE_INTERVAL
+        next_prune = time.monotonic()
+        cache_prune_interval = settings.AI_CACHE_PRUNE_INTERVAL
+        next_cache_prune = time.monotonic()
+        while True:
+            processed = run_pending_jobs()
+            if processed:
+                self.stdout.write(f'Processed {processed} job(s)')
+            if prune_interval and time.monotonic() >= next_prune:
+                pruned = prune_sessions()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} expired session(s)')
+                next_prune = time.monotonic() + prune_interval
+            if cache_prune_interval and time.monotonic() >= next_cache_prune:
+                pruned = llm_cache.prune()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} cached AI response(s)')
+                next_cache_prune = time.monotonic() + cache_prune_interval
+            if options['once']:
+                break
+            try:
+                time.sleep(options['sleep'])
+            except KeyboardInterrupt:
+                break
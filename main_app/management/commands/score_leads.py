@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from main_app.models import Lead
+from main_app.scoring import score_leads
+
+
+class Command(BaseCommand):
+    help = 'Score leads in bulk (AI with heuristic fallback) and save conversion_score'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unscored', action='store_true', help='Only leads without a conversion score')
+        parser.add_argument('--status', action='append', choices=[s for s, _ in Lead.LEAD_STATUS],
+                            help='Only leads with this status (repeatable)')
+        parser.add_argument('--no-ai', action='store_true', help='Use the status/priority heuristic only')
+        parser.add_argument('--no-cache', action='store_true', help='Ask the model again instead of reusing cached answers')
+        parser.add_argument('--concurrency', type=int, help='Parallel model calls')
+        parser.add_argument('--rate', type=float, help='Max model calls per second (0 = unlimited)')
+        parser.add_argument('--batch-size', type=int, help='Leads loaded and saved per batch')
+
+    def handle(self, *args, **options):
+        leads = Lead.objects.all()
+        if options['unscored']:
+            leads = leads.filter(conversion_score__isnull=True)
+        if options['status']:
+            leads = leads.filter(status__in=options['status'])
+
+        report = score_leads(
+            leads,
+            use_ai=False if options['no_ai'] else None,
+            concurrency=options['concurrency'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            bypass_cache=options['no_cache'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {report['scored']} leads ({report['ai']} by AI, {report['cached']} from cache, "
+            f"{report['fallback']} by heuristic)"
+        ))
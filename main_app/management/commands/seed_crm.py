@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.seeding import CRMSeeder
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic counsellors, sources, leads, activities, businesses and notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leads', type=int, default=10000, help='Leads to create (10k to 5M is typical)')
+        parser.add_argument('--counsellors', type=int, help='Counsellors to create (default: one per 1000 leads, 5-500)')
+        parser.add_argument('--months', type=int, default=12, help='Spread lead creation dates over this many months')
+        parser.add_argument('--activities-per-lead', type=int, default=2, help='Average activities per contacted lead')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Leads generated and inserted per batch')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+
+    def handle(self, *args, **options):
+        if options['leads'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--leads and --batch-size must be positive')
+        started = time.perf_counter()
+
+        def progress(counts):
+            if options['verbosity'] > 1 or counts['leads'] % (options['batch_size'] * 20) == 0:
+                self.stdout.write(f"  {counts['leads']}/{options['leads']} leads "
+                                  f"({time.perf_counter() - started:.0f}s)")
+
+        counts = CRMSeeder(
+            leads=options['leads'], counsellors=options['counsellors'], months=options['months'],
+            activities_per_lead=options['activities_per_lead'], batch_size=options['batch_size'],
+            seed=options['seed'], on_progress=progress,
+        ).run()
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {time.perf_counter() - started:.1f}s'))
@@ -1,23 +1,102 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from django.urls import reverse
 from django.shortcuts import redirect
 
+from .profiling import (QueryBudgetExceeded, QueryRecorder, log_profile, query_budget, recent_requests,
+                        server_timing, view_name)
+from .roles import attach_profile, session_role
+
 
 class LoginCheckMiddleWare(MiddlewareMixin):
+    """
+    Route users by role. The role comes from the session (see roles.py), so the
+    routing decision itself needs no user query; for main_app views the
+    profile and user are then loaded together in one query and attached as
+    request.profile / request.counsellor / request.user.
+    """
+
     def process_view(self, request, view_func, view_args, view_kwargs):
         modulename = view_func.__module__
-        user = request.user # Who is the current user ?
-        if user.is_authenticated:
-            if user.user_type == '1': # Is it the Admin
+        role = session_role(request) # Who is the current user ?
+        if role is not None:
+            user_type, profile_id = role
+            if user_type == '1': # Is it the Admin
                 if modulename == 'main_app.counsellor_views':
                     return redirect(reverse('admin_home'))
-            elif user.user_type == '2': # Counsellor
+            elif user_type == '2': # Counsellor
                 if modulename == 'main_app.admin_views':
                     return redirect(reverse('counsellor_home'))
             else: # None of the aforementioned ? Please take the user to login page
                 return redirect(reverse('login_page'))
+            if modulename.startswith('main_app.'):
+                profile = attach_profile(request, user_type, profile_id)
+                if not request.user.is_authenticated: # The session no longer validates
+                    return redirect(reverse('login_page'))
+                if request.user.user_type != user_type: # Role changed since it was cached; route again
+                    return redirect(reverse('login_page'))
+                if profile is None and modulename == 'main_app.counsellor_views':
+                    raise Http404('No counsellor profile for this user')
         else:
             if request.path == reverse('login_page') or modulename == 'django.contrib.auth.views' or request.path == reverse('user_login'): # If the path is login or has anything to do with authentication, pass
                 pass
             else:
                 return redirect(reverse('login_page'))
+
+
+class ProfilingMiddleware:
+    """
+    Time every request and count its SQL through connection.execute_wrapper().
+
+    Each profile is logged (main_app.profiling), reported in a Server-Timing
+    header and kept in a ring buffer for the admin profiling page. A view whose
+    query count exceeds QUERY_BUDGETS[view name] (or QUERY_BUDGET_DEFAULT) is
+    logged as a warning, and fails the request with QUERY_BUDGET_STRICT.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        connected = connection.connection is not None
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = view_name(request)
+        budget = query_budget(view)
+        profile = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'queries': recorder.count,
+            'duplicates': recorder.duplicates,
+            'db_ms': round(recorder.duration * 1000, 1),
+            # The request had to connect: CONN_MAX_AGE expired or the connection failed its health check
+            'new_connection': not connected and connection.connection is not None,
+            'budget': budget,
+            'over_budget': budget is not None and recorder.count > budget,
+            'at': timezone.now(),
+        }
+        recent_requests().append(profile)
+        log_profile(profile, recorder)
+        response['Server-Timing'] = server_timing(profile)
+
+        if profile['over_budget'] and getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(
+                f'{view} ran {recorder.count} queries, budget is {budget}: '
+                + '; '.join(f'{count}x {sql}' for sql, count in recorder.repeated())
+            )
+        return response
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.9 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_importjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['status'], name='lead_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_at'], name='lead_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['next_follow_up'], name='lead_next_follow_up_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['assigned_counsellor', 'status'], name='lead_counsellor_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['assigned_counsellor', 'next_follow_up'], name='lead_counsellor_followup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(condition=models.Q(('assigned_counsellor__isnull', True)), fields=['created_at'], name='lead_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leadactivity',
+            index=models.Index(fields=['counsellor', 'completed_date'], name='activity_counsellor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationadmin',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['created_at'], name='notif_admin_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationcounsellor',
+            index=models.Index(fields=['counsellor', 'is_read'], name='notif_counsellor_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationcounsellor',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['counsellor'], name='notif_counsellor_unread_idx'),
+        ),
+    ]
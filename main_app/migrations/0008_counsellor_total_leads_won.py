@@ -0,0 +1,48 @@
+# Generated by Django 4.2.9 on 2026-10-18 20:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_counters(apps, schema_editor):
+    # The counters were never maintained before; count them once from the data
+    Counsellor = apps.get_model('main_app', 'Counsellor')
+    Lead = apps.get_model('main_app', 'Lead')
+    Business = apps.get_model('main_app', 'Business')
+    leads = {
+        row['assigned_counsellor']: row for row in Lead.objects.filter(assigned_counsellor__isnull=False)
+        .values('assigned_counsellor').annotate(total=Count('id'), won=Count('id', filter=Q(status='CLOSED_WON')))
+        .order_by()
+    }
+    business = dict(Business.objects.filter(status='ACTIVE').values('counsellor')
+                    .annotate(total=Sum('value')).order_by().values_list('counsellor', 'total'))
+    counsellors = list(Counsellor.objects.all())
+    for counsellor in counsellors:
+        counts = leads.get(counsellor.id, {'total': 0, 'won': 0})
+        counsellor.total_leads_assigned = counts['total']
+        counsellor.total_leads_won = counts['won']
+        counsellor.total_business_generated = business.get(counsellor.id) or Decimal('0.00')
+        counsellor.performance_rating = (
+            (Decimal(5 * counts['won']) / counts['total']).quantize(Decimal('0.01')) if counts['total'] else 0
+        )
+    Counsellor.objects.bulk_update(counsellors, [
+        'total_leads_assigned', 'total_leads_won', 'total_business_generated', 'performance_rating',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_llmresponse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counsellor',
+            name='total_leads_won',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
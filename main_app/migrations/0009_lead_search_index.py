@@ -0,0 +1,65 @@
+# Generated by Django 4.2.9 on 2026-10-18 21:00
+
+from django.db import migrations
+
+# Kept in step with main_app/search.py: queries only use the PostgreSQL
+# indexes when they repeat these expressions exactly.
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || "
+    "coalesce(email, '') || ' ' || coalesce(phone, '') || ' ' || coalesce(company, '') || ' ' || "
+    "coalesce(notes, ''))"
+)
+PG_TRIGRAM_TEXT = (
+    "(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' || "
+    "coalesce(phone, '') || ' ' || coalesce(company, ''))"
+)
+COLUMNS = 'first_name, last_name, email, phone, company, notes'
+
+
+def sqlite_has_fts5(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cursor.fetchone()[0]:
+        return True
+    # Builds that load FTS5 as a module don't report the compile option
+    try:
+        cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+        cursor.execute('DROP TABLE temp.fts5_probe')
+        return True
+    except Exception:
+        return False
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(f'CREATE INDEX lead_search_document_idx ON main_app_lead USING gin ({PG_DOCUMENT})')
+            cursor.execute(f'CREATE INDEX lead_search_trigram_idx ON main_app_lead USING gin ({PG_TRIGRAM_TEXT} gin_trgm_ops)')
+        elif vendor == 'sqlite' and sqlite_has_fts5(cursor):
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE main_app_lead_search USING fts5({COLUMNS}, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(f'INSERT INTO main_app_lead_search (rowid, {COLUMNS}) SELECT id, {COLUMNS} FROM main_app_lead')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS lead_search_document_idx')
+            cursor.execute('DROP INDEX IF EXISTS lead_search_trigram_idx')
+        elif vendor == 'sqlite':
+            cursor.execute('DROP TABLE IF EXISTS main_app_lead_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_counsellor_total_leads_won'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -4,6 +4,7 @@ from django.dispatch import receiver
 from django.db.models.signals import post_save
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from datetime import datetime, timedelta
 import uuid
 
@@ -66,12 +67,26 @@ class Counsellor(models.Model):
     joining_date = models.DateField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     performance_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    # Counters kept current by main_app/counters.py; `reconcile_counters` recounts them
     total_leads_assigned = models.IntegerField(default=0)
+    total_leads_won = models.IntegerField(default=0)
     total_business_generated = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
 
+    COUNTER_FIELDS = ('performance_rating', 'total_leads_assigned', 'total_leads_won', 'total_business_generated')
+
     def __str__(self):
         return f"{self.admin.first_name} {self.admin.last_name} ({self.employee_id})"
 
+    def save(self, *args, **kwargs):
+        # Counters only change through F() updates; saving a stale instance
+        # (e.g. from the user post_save hook) must not write old values back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class LeadSource(models.Model):
     name = models.CharField(max_length=100)
@@ -137,6 +152,18 @@ class Lead(models.Model):
     routed_to = models.CharField(max_length=100, blank=True)
     routing_reason = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='lead_status_idx'),
+            models.Index(fields=['created_at'], name='lead_created_at_idx'),
+            models.Index(fields=['next_follow_up'], name='lead_next_follow_up_idx'),
+            models.Index(fields=['assigned_counsellor', 'status'], name='lead_counsellor_status_idx'),
+            models.Index(fields=['assigned_counsellor', 'next_follow_up'], name='lead_counsellor_followup_idx'),
+            # Assignment page: count and age of the unassigned backlog
+            models.Index(fields=['created_at'], name='lead_unassigned_idx',
+                         condition=models.Q(assigned_counsellor__isnull=True)),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.company}"
 
@@ -169,6 +196,11 @@ class LeadActivity(models.Model):
     duration = models.IntegerField(default=0)  # in minutes
     is_completed = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['counsellor', 'completed_date'], name='activity_counsellor_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.lead.first_name} - {self.activity_type} - {self.subject}"
 
@@ -211,6 +243,14 @@ class NotificationCounsellor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['counsellor', 'is_read'], name='notif_counsellor_read_idx'),
+            # Unread badge count in the notification_count context processor
+            models.Index(fields=['counsellor'], name='notif_counsellor_unread_idx',
+                         condition=models.Q(is_read=False)),
+        ]
+
     def __str__(self):
         return f"{self.counsellor.admin.first_name} - {self.message[:50]}"
 
@@ -221,6 +261,12 @@ class NotificationAdmin(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='notif_admin_unread_idx',
+                         condition=models.Q(is_read=False)),
+        ]
+
     def __str__(self):
         return f"Admin - {self.message[:50]}"
 
@@ -257,6 +303,73 @@ class CounsellorPerformance(models.Model):
         return f"{self.counsellor.admin.first_name} - {self.month.strftime('%B %Y')}"
 
 
+class ImportJob(models.Model):
+    JOB_STATUS = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed')
+    )
+
+    file = models.FileField(upload_to='imports/')
+    source = models.ForeignKey(LeadSource, on_delete=models.CASCADE)
+    assigned_counsellor = models.ForeignKey(Counsellor, on_delete=models.SET_NULL, null=True, blank=True)
+    options = models.JSONField(default=dict, blank=True)  # defaults, duplicates, auto-assignment
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='PENDING')
+    rows_processed = models.IntegerField(default=0)
+    rows_created = models.IntegerField(default=0)
+    rows_skipped = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # first MAX_STORED_ERRORS row errors
+    message = models.TextField(blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    MAX_STORED_ERRORS = 500
+
+    def __str__(self):
+        return f"Import #{self.pk} - {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('COMPLETED', 'FAILED')
+
+
+
+class WorkflowJob(models.Model):
+    """Background run of the enrich -> score -> route workflow for one lead"""
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='workflow_jobs')
+    status = models.CharField(max_length=20, choices=ImportJob.JOB_STATUS, default='PENDING')
+    result = models.JSONField(default=dict, blank=True)  # per-step results
+    message = models.TextField(blank=True)
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Workflow #{self.pk} - {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('COMPLETED', 'FAILED')
+
+
+class LLMResponse(models.Model):
+    """Cached model output for a prompt (see main_app/llm_cache.py)"""
+    key = models.CharField(max_length=64, unique=True)  # sha256 of model + prompt
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.model} - {self.key[:12]}"
+
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
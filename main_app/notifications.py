@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Counsellor, NotificationAdmin, NotificationCounsellor
+
+# Counts are dropped by signals whenever a notification changes; the timeout
+# (NOTIFICATION_COUNT_TIMEOUT) bounds staleness in other workers' caches and
+# after writes that bypass signals.
+ADMIN_KEY = 'notifications:unread:admin'
+
+
+def counsellor_key(user_id):
+    return f'notifications:unread:user:{user_id}'
+
+
+def unread_count(user):
+    """Unread notification count for the navbar badge; no queries on a cache hit"""
+    if user.user_type == '1':
+        key = ADMIN_KEY
+        unread = NotificationAdmin.objects.filter(is_read=False)
+    elif user.user_type == '2':
+        key = counsellor_key(user.id)
+        unread = NotificationCounsellor.objects.filter(counsellor__admin_id=user.id, is_read=False)
+    else:
+        return 0
+    count = cache.get(key)
+    if count is None:
+        count = unread.count()
+        cache.set(key, count, getattr(settings, 'NOTIFICATION_COUNT_TIMEOUT', 60 * 60))
+    return count
+
+
+def forget_admin_unread_count():
+    cache.delete(ADMIN_KEY)
+
+
+def forget_counsellor_unread_count(counsellor):
+    """Drop a counsellor's cached count; accepts a Counsellor or its id"""
+    if isinstance(counsellor, Counsellor):
+        user_id = counsellor.admin_id
+    else:
+        user_id = Counsellor.objects.filter(pk=counsellor).values_list('admin_id', flat=True).first()
+    if user_id is not None:
+        cache.delete(counsellor_key(user_id))
@@ -0,0 +1,159 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .dashboard import add_months, month_start
+from .models import Business, Counsellor, CounsellorPerformance, Lead, LeadActivity
+
+QUALIFIED_STATUSES = ('QUALIFIED', 'PROPOSAL_SENT', 'NEGOTIATION', 'CLOSED_WON')
+ROLLUP_FIELDS = [
+    'total_leads_assigned', 'total_leads_contacted', 'total_leads_qualified',
+    'total_business_generated', 'conversion_rate', 'average_response_time',
+]
+LEAD_ID_BATCH_SIZE = 900
+
+
+def month_of(value=None):
+    """The month (first day, as a date) containing a datetime, in local time"""
+    return month_start(value).date()
+
+
+def _month_datetime(month):
+    return timezone.make_aware(datetime(month.year, month.month, 1))
+
+
+def _months(first_month, last_month):
+    month = first_month
+    while month <= last_month:
+        yield month
+        month = add_months(month, 1)
+
+
+def build_rollups(first_month, last_month=None, counsellor_ids=None):
+    """
+    {(counsellor_id, month): CounsellorPerformance} for every month from
+    first_month to last_month (dates, first of the month), from one grouped
+    query over leads and one over businesses.
+
+    Leads and businesses count towards the month they were created in.
+    Active counsellors in scope get a zero row for months without data.
+    """
+    last_month = last_month or first_month
+    start, end = _month_datetime(first_month), add_months(_month_datetime(last_month), 1)
+    leads = Lead.objects.filter(created_at__gte=start, created_at__lt=end, assigned_counsellor__isnull=False)
+    businesses = Business.objects.filter(created_at__gte=start, created_at__lt=end, status='ACTIVE')
+    counsellors = Counsellor.objects.filter(is_active=True)
+    if counsellor_ids is not None:
+        counsellor_ids = list(counsellor_ids)
+        leads = leads.filter(assigned_counsellor_id__in=counsellor_ids)
+        businesses = businesses.filter(counsellor_id__in=counsellor_ids)
+        counsellors = counsellors.filter(id__in=counsellor_ids)
+
+    rollups = {
+        (counsellor_id, month): CounsellorPerformance(counsellor_id=counsellor_id, month=month)
+        for counsellor_id in counsellors.values_list('id', flat=True)
+        for month in _months(first_month, last_month)
+    }
+
+    def rollup(counsellor_id, month):
+        key = (counsellor_id, month.date() if isinstance(month, datetime) else month)
+        if key not in rollups:
+            rollups[key] = CounsellorPerformance(counsellor_id=counsellor_id, month=key[1])
+        return rollups[key]
+
+    first_contact = LeadActivity.objects.filter(lead=OuterRef('pk')).order_by('completed_date').values('completed_date')[:1]
+    lead_rows = leads.values('assigned_counsellor', month=TruncMonth('created_at')).annotate(
+        assigned=Count('id'),
+        contacted=Count('id', filter=~Q(status='NEW')),
+        qualified=Count('id', filter=Q(status__in=QUALIFIED_STATUSES)),
+        won=Count('id', filter=Q(status='CLOSED_WON')),
+        response=Avg(ExpressionWrapper(Subquery(first_contact) - F('created_at'), output_field=DurationField())),
+    ).order_by()
+    for row in lead_rows:
+        performance = rollup(row['assigned_counsellor'], row['month'])
+        performance.total_leads_assigned = row['assigned']
+        performance.total_leads_contacted = row['contacted']
+        performance.total_leads_qualified = row['qualified']
+        # Share of the month's leads that were won
+        performance.conversion_rate = round(row['won'] * 100 / row['assigned'], 2)
+        if row['response'] is not None:
+            performance.average_response_time = round(row['response'].total_seconds() / 3600)
+
+    business_rows = businesses.values('counsellor', month=TruncMonth('created_at')).annotate(
+        total=Sum('value'),
+    ).order_by()
+    for row in business_rows:
+        rollup(row['counsellor'], row['month']).total_business_generated = row['total']
+    return rollups
+
+
+def save_rollups(rollups):
+    """Upsert CounsellorPerformance instances on (counsellor, month)"""
+    rollups = list(rollups)
+    with transaction.atomic():
+        CounsellorPerformance.objects.bulk_create(
+            rollups, update_conflicts=True, unique_fields=['counsellor', 'month'],
+            update_fields=ROLLUP_FIELDS, batch_size=500,
+        )
+    return len(rollups)
+
+
+def rebuild_performance(first_month, last_month=None, counsellor_ids=None):
+    """
+    Recompute the stored rollups for a month range (optionally only some
+    counsellors) and upsert them; rows in scope that no longer have data are
+    reset by the zero rows. Returns the number of rows written.
+    """
+    return save_rollups(build_rollups(first_month, last_month, counsellor_ids).values())
+
+
+def month_rollup_values(month, counsellor_ids=None):
+    """One month's rollups as plain dicts, so a worker process can send them back"""
+    return [
+        dict({field: getattr(performance, field) for field in ROLLUP_FIELDS},
+             counsellor_id=performance.counsellor_id, month=performance.month)
+        for performance in build_rollups(month, counsellor_ids=counsellor_ids).values()
+    ]
+
+
+def month_partitions(first_month, last_month):
+    """First-of-month dates from first_month to last_month inclusive"""
+    return list(_months(first_month, last_month))
+
+
+def refresh_cells(cells):
+    """Rebuild the given (counsellor_id, month) rollups, one rebuild per month"""
+    by_month = {}
+    for counsellor_id, month in cells:
+        if counsellor_id is not None:
+            by_month.setdefault(month, set()).add(counsellor_id)
+    for month, counsellor_ids in sorted(by_month.items()):
+        rebuild_performance(month, counsellor_ids=counsellor_ids)
+
+
+def lead_cells(lead_ids):
+    """The (counsellor_id, month) rollups the given leads count towards"""
+    lead_ids = list(lead_ids)
+    cells = set()
+    for i in range(0, len(lead_ids), LEAD_ID_BATCH_SIZE):
+        rows = Lead.objects.filter(id__in=lead_ids[i:i + LEAD_ID_BATCH_SIZE], assigned_counsellor__isnull=False) \
+            .values_list('assigned_counsellor', TruncMonth('created_at')).distinct()
+        cells.update((counsellor_id, month.date()) for counsellor_id, month in rows)
+    return cells
+
+
+def schedule_refresh(cells=(), lead_ids=()):
+    """Refresh rollups once the current transaction commits"""
+    cells, lead_ids = set(cells), set(lead_ids)
+    if cells or lead_ids:
+        transaction.on_commit(lambda: refresh_cells(cells | lead_cells(lead_ids)))
+
+
+def performance_rows(month=None):
+    """Stored rollups of active counsellors for a month, in one query"""
+    return list(CounsellorPerformance.objects.filter(
+        month=month or month_of(), counsellor__is_active=True,
+    ).select_related('counsellor__admin').order_by('counsellor__admin__first_name', 'counsellor_id'))
@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+logger = logging.getLogger('main_app.profiling')
+
+_buffer_lock = threading.Lock()
+_buffer = None
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its budget (raised only with QUERY_BUDGET_STRICT)"""
+
+
+class QueryRecorder:
+    """connection.execute_wrapper() hook counting queries, repeats and time spent in the database"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """Statements that repeated an earlier SQL text (parameters aside): the N+1 signature"""
+        return self.count - len(self.statements)
+
+    def repeated(self, limit=3):
+        return [(sql, count) for sql, count in self.statements.most_common(limit) if count > 1]
+
+
+def recent_requests():
+    """The in-process ring buffer of recent request profiles, oldest first"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = deque(maxlen=getattr(settings, 'PROFILING_BUFFER_SIZE', 500))
+        return _buffer
+
+
+def clear_requests():
+    recent_requests().clear()
+
+
+def query_budget(view):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else None) or request.path
+
+
+def server_timing(profile):
+    timing = (f'app;dur={profile["duration_ms"]:.1f}, '
+              f'db;dur={profile["db_ms"]:.1f};desc="{profile["queries"]} queries"')
+    if profile['new_connection']:
+        timing += ', conn;desc="new"'
+    return timing
+
+
+def log_profile(profile, recorder):
+    line = ' '.join(f'{key}={profile[key]}' for key in (
+        'view', 'method', 'status', 'duration_ms', 'queries', 'duplicates', 'db_ms'))
+    slow = profile['duration_ms'] >= getattr(settings, 'PROFILING_SLOW_MS', 500)
+    if profile['new_connection']:
+        line += ' conn=new'
+    if profile['over_budget']:
+        line += f' budget={profile["budget"]}'
+    if profile['duplicates']:
+        line += ' repeated=' + ' | '.join(f'{count}x {sql[:120]}' for sql, count in recorder.repeated())
+    level = logging.WARNING if slow or profile['over_budget'] else logging.INFO
+    logger.log(level, line, extra={'profile': profile})
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def profile_summary(profiles=None):
+    """Per-view aggregates of the buffered profiles, slowest (p95) first"""
+    profiles = list(recent_requests() if profiles is None else profiles)
+    by_view = {}
+    for profile in profiles:
+        by_view.setdefault(profile['view'], []).append(profile)
+    rows = []
+    for view, items in by_view.items():
+        durations = [item['duration_ms'] for item in items]
+        queries = [item['queries'] for item in items]
+        rows.append({
+            'view': view,
+            'requests': len(items),
+            'avg_ms': round(sum(durations) / len(items), 1),
+            'p95_ms': _percentile(durations, 0.95),
+            'max_ms': max(durations),
+            'avg_queries': round(sum(queries) / len(items), 1),
+            'max_queries': max(queries),
+            'duplicates': max(item['duplicates'] for item in items),
+            'avg_db_ms': round(sum(item['db_ms'] for item in items) / len(items), 1),
+            'new_connections': sum(item['new_connection'] for item in items),
+            'budget': items[-1]['budget'],
+            'over_budget': sum(item['over_budget'] for item in items),
+        })
+    rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return rows
@@ -0,0 +1,77 @@
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, get_user
+from django.utils.crypto import constant_time_compare
+
+from .models import Admin, Counsellor
+
+# [user id, user_type, Admin/Counsellor id] of the logged-in user
+ROLE_SESSION_KEY = '_crm_role'
+PROFILE_MODELS = {'1': Admin, '2': Counsellor}
+
+
+def _store_role(request, user, profile_id):
+    request.session[ROLE_SESSION_KEY] = [str(user.pk), user.user_type, profile_id]
+    return user.user_type, profile_id
+
+
+def remember_role(request, user):
+    """Store the user's role and profile id in the session (one query for the profile id)"""
+    model = PROFILE_MODELS.get(user.user_type)
+    profile_id = model.objects.filter(admin_id=user.pk).values_list('id', flat=True).first() if model else None
+    return _store_role(request, user, profile_id)
+
+
+def session_role(request):
+    """
+    (user_type, profile_id) of the logged-in user, or None when logged out.
+
+    Read from the session, so routing a request costs no user or profile
+    query; the first request of a session without the entry resolves it once.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    cached = request.session.get(ROLE_SESSION_KEY)
+    if cached and cached[0] == str(user_id):
+        return cached[1], cached[2]
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    return remember_role(request, user)
+
+
+def _session_matches(request, user):
+    # The checks django.contrib.auth.get_user() makes, against an already loaded user
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    return (user.is_active and str(user.pk) == str(request.session.get(SESSION_KEY))
+            and session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()))
+
+
+def attach_profile(request, user_type, profile_id):
+    """
+    Load the Admin/Counsellor profile and its user in one query and set
+    request.profile, request.counsellor and request.user from it.
+
+    A stale entry (profile deleted, role changed) is dropped and resolved
+    again; a session the loaded user no longer validates (password changed,
+    deactivated) falls back to Django's get_user(), which logs it out.
+    Returns the profile, or None.
+    """
+    model = PROFILE_MODELS.get(user_type)
+    profile = None
+    if model and profile_id is not None:
+        profile = model.objects.select_related('admin').filter(pk=profile_id).first()
+    if profile is not None and _session_matches(request, profile.admin):
+        request.user = profile.admin
+    else:
+        request.session.pop(ROLE_SESSION_KEY, None)
+        request.user = get_user(request)
+        profile = None
+        if request.user.is_authenticated:
+            model = PROFILE_MODELS.get(request.user.user_type)
+            profile = model.objects.filter(admin_id=request.user.pk).first() if model else None
+            if profile is not None:
+                profile.admin = request.user
+            _store_role(request, request.user, profile.id if profile else None)
+    request.profile = profile
+    request.counsellor = profile if isinstance(profile, Counsellor) else None
+    return profile
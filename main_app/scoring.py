@@ -0,0 +1,244 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Max, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from . import llm_cache
+from .ai_client import AIClient, get_client
+from .models import Lead, LeadActivity
+
+STATUS_BASE_SCORE = {
+    'NEW': 30,
+    'CONTACTED': 45,
+    'QUALIFIED': 60,
+    'PROPOSAL_SENT': 70,
+    'NEGOTIATION': 80,
+    'CLOSED_WON': 95,
+    'CLOSED_LOST': 5,
+    'TRANSFERRED': 40,
+}
+DEFAULT_BASE_SCORE = 40
+PRIORITY_BONUS = {
+    'LOW': -5,
+    'MEDIUM': 0,
+    'HIGH': 5,
+    'URGENT': 10,
+}
+# Closed leads keep their status + priority score; open leads also get the
+# feature bonuses below. Tiers are (threshold, bonus), first match wins.
+CLOSED_STATUSES = ('CLOSED_WON', 'CLOSED_LOST')
+ACTIVITY_BONUS = ((6, 6), (3, 4), (1, 2))
+VALUE_BONUS = ((500000, 5), (100000, 3))
+RECENT_CONTACT_BONUS = ((7, 5), (30, 2))  # contacted within N days
+STALE_CONTACT_DAYS = 90
+STALE_CONTACT_PENALTY = -5
+RESCORE_BATCH_SIZE = 50000
+
+# Fields the prompt needs; bulk scoring loads nothing else
+SCORING_FIELDS = (
+    'id', 'first_name', 'last_name', 'company', 'position', 'industry',
+    'status', 'priority', 'expected_value', 'notes',
+)
+
+SCORE_PATTERN = re.compile(r"\b(100|\d{1,2})\b")
+
+
+def heuristic_expression(now=None):
+    """
+    The fallback score as one SQL expression over a Lead row: status and
+    priority, plus activity count, contact recency and expected value for
+    open leads, clamped to 0-100.
+    """
+    now = now or timezone.now()
+    activities = Coalesce(Subquery(
+        LeadActivity.objects.filter(lead=OuterRef('pk')).order_by()
+        .values('lead').annotate(n=Count('pk')).values('n')
+    ), 0)
+    base = Case(*[When(status=status, then=Value(score)) for status, score in STATUS_BASE_SCORE.items()],
+                default=Value(DEFAULT_BASE_SCORE))
+    priority = Case(*[When(priority=priority, then=Value(bonus)) for priority, bonus in PRIORITY_BONUS.items()],
+                    default=Value(0))
+    activity = Case(*[When(GreaterThanOrEqual(activities, count), then=Value(bonus))
+                      for count, bonus in ACTIVITY_BONUS], default=Value(0))
+    value = Case(*[When(expected_value__gte=amount, then=Value(bonus)) for amount, bonus in VALUE_BONUS],
+                 default=Value(0))
+    recency = Case(
+        *[When(last_contact_date__gte=now - timedelta(days=days), then=Value(bonus))
+          for days, bonus in RECENT_CONTACT_BONUS],
+        When(last_contact_date__lt=now - timedelta(days=STALE_CONTACT_DAYS), then=Value(STALE_CONTACT_PENALTY)),
+        default=Value(0),
+    )
+    return Greatest(Value(0), Least(Value(100), Case(
+        When(status__in=CLOSED_STATUSES, then=base + priority),
+        default=base + priority + activity + value + recency,
+    )), output_field=IntegerField())
+
+
+def lead_heuristic(lead):
+    """Fallback score for one saved lead (one query)"""
+    return Lead.objects.filter(pk=lead.pk).annotate(score=heuristic_expression()).values_list('score', flat=True).first()
+
+
+def rescore_leads(leads, batch_size=None):
+    """
+    Write the heuristic score to every lead in `leads` (a queryset) with one
+    UPDATE per `batch_size` id range; no rows are loaded into Python.
+    Returns the number of leads updated.
+    """
+    batch_size = batch_size or RESCORE_BATCH_SIZE
+    leads = leads.order_by()
+    bounds = leads.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    expression = heuristic_expression()
+    updated = 0
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        updated += leads.filter(pk__gte=start, pk__lt=start + batch_size).update(conversion_score=expression)
+    return updated
+
+
+def score_prompt(lead):
+    description_parts = [
+        f"Name: {lead.first_name} {lead.last_name}",
+        f"Company: {lead.company or '-'}",
+        f"Position: {lead.position or '-'}",
+        f"Industry: {lead.industry or '-'}",
+        f"Status: {lead.status}",
+        f"Priority: {lead.priority}",
+        f"Expected Value: {lead.expected_value}",
+        f"Notes: {lead.notes or '-'}",
+    ]
+    prompt = "\n".join(description_parts) + "\n\nReturn ONLY an integer from 0 to 100 representing the conversion probability."
+    return f"You are a scoring function. Read the lead details and output ONLY an integer 0-100.\n\n{prompt}"
+
+
+def parse_score(text):
+    """First integer 0-100 in the model output, or None"""
+    match = SCORE_PATTERN.search((text or '').strip())
+    return int(match.group(1)) if match else None
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads: at most `rate` calls per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def request_score(prompt, client=None, **kwargs):
+    """Model score for a prompt, or None (see AIClient.complete for the options)"""
+    return parse_score((client or get_client()).complete(prompt, **kwargs))
+
+
+def score_lead(lead, use_ai=None, bypass_cache=False):
+    """
+    Score one lead: a cached answer, else a single model call without
+    retries on the shared client, else the heuristic.
+    """
+    score = None
+    if settings.OPENAI_API_KEY and use_ai is not False:
+        client = get_client()
+        text = llm_cache.cached_completion(
+            client.model, score_prompt(lead),
+            lambda prompt: client.complete(prompt, max_retries=0),
+            bypass=bypass_cache, accept=lambda text: parse_score(text) is not None,
+        )
+        score = parse_score(text)
+    if score is None:
+        score = lead_heuristic(lead)
+    return score
+
+
+def score_leads(leads, use_ai=None, concurrency=None, rate=None, batch_size=None,
+                api_url=None, api_key=None, backoff=1.0, bypass_cache=False):
+    """
+    Score `leads` (a queryset) and save conversion_score with bulk_update.
+
+    Leads are processed in batches. Each batch's prompts are looked up in the
+    LLM response cache with one query; the remaining distinct prompts go to
+    the model, up to `concurrency` calls at once and throttled to `rate`
+    calls per second overall. Any lead without a usable answer gets the
+    heuristic, including every lead left once the client's circuit opens;
+    without AI the whole set is rescored in SQL by rescore_leads.
+    Returns {'scored', 'ai', 'cached', 'fallback'}.
+
+    The shared client is used unless `api_url`/`api_key` point elsewhere.
+    """
+    api_key = api_key or settings.OPENAI_API_KEY
+    use_ai = bool(api_key) if use_ai is None else use_ai and bool(api_key)
+    if not use_ai:
+        scored = rescore_leads(leads)
+        return {'scored': scored, 'ai': 0, 'cached': 0, 'fallback': scored}
+    concurrency = concurrency or settings.AI_SCORING_CONCURRENCY
+    rate = settings.AI_SCORING_RATE_LIMIT if rate is None else rate
+    batch_size = batch_size or settings.AI_SCORING_BATCH_SIZE
+    own_client = bool(api_url) or api_key != settings.OPENAI_API_KEY
+    client = AIClient(api_url, api_key, pool_size=concurrency) if own_client else get_client()
+    model = client.model
+
+    report = {'scored': 0, 'ai': 0, 'cached': 0, 'fallback': 0}
+    limiter = RateLimiter(rate)
+
+    def complete(prompt):
+        # Runs on the pool threads: HTTP only, no database access
+        return client.complete(prompt, backoff=backoff, limiter=limiter)
+
+    leads = leads.only(*SCORING_FIELDS).annotate(heuristic=heuristic_expression()).order_by('id')
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            # Keyset batches: rows saved in a previous batch never shift the next one
+            batch = list(leads.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            prompts = {lead.id: score_prompt(lead) for lead in batch}
+            cached = {} if bypass_cache else llm_cache.lookup(model, prompts.values())
+            missing = list(dict.fromkeys(prompt for prompt in prompts.values() if prompt not in cached))
+            fresh = dict(zip(missing, executor.map(complete, missing)))
+            llm_cache.store(model, {
+                prompt: text for prompt, text in fresh.items() if parse_score(text) is not None
+            })
+
+            for lead in batch:
+                prompt = prompts.get(lead.id)
+                score = parse_score(cached[prompt]) if prompt in cached else parse_score(fresh.get(prompt))
+                if score is None:
+                    score = lead.heuristic
+                    report['fallback'] += 1
+                elif prompt in cached:
+                    report['cached'] += 1
+                else:
+                    report['ai'] += 1
+                lead.conversion_score = score
+            Lead.objects.bulk_update(batch, ['conversion_score'], batch_size=batch_size)
+            report['scored'] += len(batch)
+    if own_client:
+        client.close()
+    return report
@@ -0,0 +1,152 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Lead
+
+# Columns covered by the full-text index; the name/contact columns weigh more than notes
+INDEXED_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'company', 'notes')
+FTS_TABLE = 'main_app_lead_search'
+FTS_WEIGHTS = (10, 10, 8, 8, 4, 1)
+# Substring search used when the database has no full-text index
+FALLBACK_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'company', 'lead_id')
+LEAD_ID_BATCH_SIZE = 900
+
+# PostgreSQL: one tsvector expression index plus a trigram index for typos and
+# partial phone numbers. Queries must use these exact expressions to hit the indexes.
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || "
+    "coalesce(email, '') || ' ' || coalesce(phone, '') || ' ' || coalesce(company, '') || ' ' || "
+    "coalesce(notes, ''))"
+)
+PG_TRIGRAM_TEXT = (
+    "(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' || "
+    "coalesce(phone, '') || ' ' || coalesce(company, ''))"
+)
+
+_fts_available = {}
+
+
+def search_backend():
+    """'postgresql', 'fts5' or None (substring fallback) for the current database"""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        name = connection.settings_dict['NAME']
+        if name not in _fts_available:
+            _fts_available[name] = FTS_TABLE in connection.introspection.table_names()
+        if _fts_available[name]:
+            return 'fts5'
+    return None
+
+
+def search_terms(text):
+    """Lower-cased word tokens of a search string (punctuation splits words, as in the index)"""
+    return re.findall(r'[^\W_]+', (text or '').lower())
+
+
+def fts_query(terms):
+    # Every term must match, each as a prefix so 'ada' finds 'adaeze'
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def pg_tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _matching_ids(text):
+    """A SQL subquery of the ids of leads matching `text`, or None to fall back to substring search"""
+    terms = search_terms(text)
+    backend = search_backend()
+    if not terms or backend is None:
+        return None
+    if backend == 'fts5':
+        return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts_query(terms)])
+    return RawSQL(
+        f"SELECT id FROM main_app_lead WHERE {PG_DOCUMENT} @@ to_tsquery('simple', %s) "
+        f"OR %s <%% {PG_TRIGRAM_TEXT}",
+        [pg_tsquery(terms), text],
+    )
+
+
+def search_filter(leads, text):
+    """Restrict a lead queryset to those matching a search string"""
+    text = (text or '').strip()
+    if not text:
+        return leads
+    ids = _matching_ids(text)
+    if ids is not None:
+        # lead_id is a generated code, not worth indexing; match it exactly
+        return leads.filter(Q(id__in=ids) | Q(lead_id=text))
+    condition = Q()
+    for field in FALLBACK_FIELDS:
+        condition |= Q(**{f'{field}__icontains': text})
+    return leads.filter(condition)
+
+
+def ranked_lead_ids(text, offset=0, limit=25):
+    """
+    Ids of the leads best matching `text`, best first, for one page.
+
+    FTS5 ranks by bm25 with name/contact columns weighted over notes; PostgreSQL
+    by ts_rank plus trigram word similarity. Without an index, newest first.
+    """
+    terms = search_terms(text)
+    backend = search_backend()
+    if not terms:
+        return []
+    if backend == 'fts5':
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+               f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC LIMIT %s OFFSET %s')
+        params = [fts_query(terms), limit, offset]
+    elif backend == 'postgresql':
+        sql = (f"SELECT id FROM main_app_lead, to_tsquery('simple', %s) query "
+               f"WHERE {PG_DOCUMENT} @@ query OR %s <%% {PG_TRIGRAM_TEXT} "
+               f"ORDER BY ts_rank({PG_DOCUMENT}, query) + word_similarity(%s, {PG_TRIGRAM_TEXT}) DESC, id DESC "
+               f"LIMIT %s OFFSET %s")
+        params = [pg_tsquery(terms), text, text, limit, offset]
+    else:
+        return list(search_filter(Lead.objects.all(), text).order_by('-created_at', '-id')
+                    .values_list('id', flat=True)[offset:offset + limit])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fts_sync(lead_ids):
+    lead_ids = list(lead_ids)
+    columns = ', '.join(INDEXED_FIELDS)
+    with connection.cursor() as cursor:
+        for i in range(0, len(lead_ids), LEAD_ID_BATCH_SIZE):
+            batch = lead_ids[i:i + LEAD_ID_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+                f'SELECT id, {columns} FROM main_app_lead WHERE id IN ({placeholders})', batch,
+            )
+
+
+def index_leads(lead_ids):
+    """
+    Bring the FTS5 rows of the given leads in line with the lead table (deleted
+    leads drop out). The PostgreSQL indexes are maintained by the database itself.
+    """
+    if search_backend() == 'fts5':
+        _fts_sync(lead_ids)
+
+
+def rebuild_index():
+    """Repopulate the whole FTS5 table from the lead table; returns the rows indexed"""
+    if search_backend() != 'fts5':
+        return 0
+    columns = ', '.join(INDEXED_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM main_app_lead')
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
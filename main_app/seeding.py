@@ -0,0 +1,260 @@
+import random
+import secrets
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import reconcile_counters
+from .models import (Business, Counsellor, CustomUser, Lead, LeadActivity, LeadSource, NotificationAdmin,
+                     NotificationCounsellor)
+from .performance import month_of, rebuild_performance
+from .search import rebuild_index
+from .snapshots import invalidate_snapshots
+
+FIRST_NAMES = [
+    'Adaeze', 'Tunde', 'Chidi', 'Ngozi', 'Bola', 'Emeka', 'Funmi', 'Ifeoma', 'Kunle', 'Amaka',
+    'Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Rahul', 'Sneha',
+    'James', 'Mary', 'David', 'Sarah', 'Michael', 'Grace', 'Daniel', 'Ruth', 'Samuel', 'Esther',
+]
+LAST_NAMES = [
+    'Okafor', 'Adeyemi', 'Eze', 'Balogun', 'Okonkwo', 'Nwosu', 'Bello', 'Ogunleye', 'Ibrahim', 'Afolabi',
+    'Sharma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Nair', 'Mehta', 'Rao', 'Singh', 'Kapoor',
+    'Smith', 'Johnson', 'Brown', 'Williams', 'Taylor', 'Davies', 'Evans', 'Thomas', 'Roberts', 'Walker',
+]
+COMPANY_WORDS = ['Apex', 'Summit', 'Blue', 'Nova', 'Crest', 'Orbit', 'Prime', 'Vertex', 'Harbor', 'Lumen']
+COMPANY_SUFFIXES = ['Ltd', 'Holdings', 'Group', 'Technologies', 'Ventures', 'Partners']
+INDUSTRIES = ['Education', 'Technology', 'Healthcare', 'Finance', 'Retail', 'Manufacturing',
+              'Real Estate', 'Logistics', 'Hospitality', 'Energy', '']
+POSITIONS = ['Student', 'Parent', 'Manager', 'Director', 'Engineer', 'Analyst', 'Founder', '']
+CITIES = [('Lagos', 'Nigeria'), ('Abuja', 'Nigeria'), ('Ibadan', 'Nigeria'), ('Mumbai', 'India'),
+          ('Bengaluru', 'India'), ('Delhi', 'India'), ('London', 'United Kingdom'), ('Nairobi', 'Kenya')]
+SOURCES = ['Website', 'Referral', 'Social Media', 'Walk-in', 'Email Campaign', 'Education Fair', 'Partner Agent']
+DEPARTMENTS = ['Admissions', 'Undergraduate', 'Postgraduate', 'International', 'Online Programs']
+
+STATUS_WEIGHTS = {
+    'NEW': 30, 'CONTACTED': 20, 'QUALIFIED': 14, 'PROPOSAL_SENT': 10,
+    'NEGOTIATION': 8, 'CLOSED_WON': 9, 'CLOSED_LOST': 8, 'TRANSFERRED': 1,
+}
+PRIORITY_WEIGHTS = {'LOW': 25, 'MEDIUM': 45, 'HIGH': 22, 'URGENT': 8}
+ACTIVITY_WEIGHTS = {'CALL': 40, 'EMAIL': 25, 'MEETING': 12, 'FOLLOW_UP': 15, 'PROPOSAL': 4, 'NOTE': 4}
+OUTCOMES = ['Interested', 'Call back later', 'Not reachable', 'Requested brochure', 'Scheduled visit', '']
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def default_counsellors(leads):
+    """About one counsellor per 1000 leads, between 5 and 500"""
+    return max(5, min(500, leads // 1000))
+
+
+@contextmanager
+def historic_timestamps():
+    """
+    Let bulk_create write the generated created/updated/completed dates:
+    auto_now and auto_now_add would otherwise stamp every row with now().
+    """
+    fields = [
+        model._meta.get_field(name)
+        for model, names in ((Lead, ('created_at', 'updated_at')), (LeadActivity, ('completed_date',)),
+                             (Business, ('created_at', 'updated_at')),
+                             (NotificationCounsellor, ('created_at', 'updated_at')),
+                             (NotificationAdmin, ('created_at', 'updated_at')))
+        for name in names
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class CRMSeeder:
+    """
+    Generates a realistic CRM dataset with bulk_create, `batch_size` leads
+    (and their activities and businesses) at a time, so memory stays flat
+    from 10k to millions of leads. The same seed yields the same data;
+    ids, emails and employee numbers come from an unseeded generator, so
+    seeding again (to scale up) never collides with an earlier run.
+    """
+
+    def __init__(self, leads=10000, counsellors=None, months=12, activities_per_lead=2,
+                 batch_size=5000, seed=42, now=None, on_progress=None):
+        self.leads = leads
+        self.counsellors = counsellors or default_counsellors(leads)
+        self.months = months
+        self.activities_per_lead = activities_per_lead
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.id_rng = random.Random(secrets.randbits(64))
+        self.now = now or timezone.now()
+        self.on_progress = on_progress
+        self.counts = {name: 0 for name in (
+            'counsellors', 'sources', 'leads', 'activities', 'businesses', 'notifications')}
+
+    def token(self, bits=56):
+        return f'{self.id_rng.getrandbits(bits):0{bits // 4}X}'
+
+    def random_time(self, start, end=None):
+        end = end or self.now
+        span = max((end - start).total_seconds(), 0)
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def seed_counsellors(self):
+        run = self.token(24)
+        password = make_password('counsellor123')
+        users = []
+        for i in range(self.counsellors):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            users.append(CustomUser(
+                email=f'{first}.{last}.{run}{i}@seed.example.com'.lower(), password=password,
+                first_name=first, last_name=last, user_type='2', gender=self.rng.choice('MF'),
+                address=self.rng.choice(CITIES)[0],
+            ))
+        users = CustomUser.objects.bulk_create(users, batch_size=1000)
+        users = CustomUser.objects.filter(email__in=[user.email for user in users]).order_by('id')
+        counsellors = Counsellor.objects.bulk_create([
+            Counsellor(admin=user, employee_id=f'S{run}{i:05d}', department=self.rng.choice(DEPARTMENTS))
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+        self.counts['counsellors'] = len(counsellors)
+        return list(Counsellor.objects.filter(admin__in=users).values_list('id', flat=True))
+
+    def seed_sources(self):
+        sources = []
+        for name in SOURCES:
+            source, created = LeadSource.objects.get_or_create(name=name)
+            self.counts['sources'] += created
+            sources.append(source.id)
+        return sources
+
+    def make_lead(self, counsellor_ids, source_ids, start):
+        first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+        status = _weighted(self.rng, STATUS_WEIGHTS)
+        created = self.random_time(start)
+        # Most new leads still wait for assignment; everything past NEW has a counsellor
+        assigned = None if status == 'NEW' and self.rng.random() < 0.4 else self.rng.choice(counsellor_ids)
+        contacted = None if status == 'NEW' else self.random_time(created)
+        city, country = self.rng.choice(CITIES)
+        expected = Decimal(self.rng.randrange(500, 500000, 500))
+        company = f'{self.rng.choice(COMPANY_WORDS)} {self.rng.choice(COMPANY_SUFFIXES)}' \
+            if self.rng.random() < 0.7 else ''
+        open_lead = status not in ('CLOSED_WON', 'CLOSED_LOST')
+        return Lead(
+            lead_id=f'LEAD-{self.token()}', first_name=first, last_name=last,
+            email=f'{first}.{last}{self.rng.randrange(10 ** 6)}@example.com'.lower(),
+            phone=f'0{self.rng.choice("789")}0{self.rng.randrange(10 ** 8):08d}',
+            company=company, position=self.rng.choice(POSITIONS), industry=self.rng.choice(INDUSTRIES),
+            source_id=self.rng.choice(source_ids), status=status, priority=_weighted(self.rng, PRIORITY_WEIGHTS),
+            assigned_counsellor_id=assigned, expected_value=expected,
+            actual_value=expected if status == 'CLOSED_WON' else Decimal('0.00'),
+            city=city, country=country,
+            notes=self.rng.choice(['', '', 'Asked about scholarships', 'Prefers evening calls',
+                                   'Comparing with other colleges', 'Needs visa guidance']),
+            created_at=created, updated_at=contacted or created, last_contact_date=contacted,
+            next_follow_up=self.now + timedelta(days=self.rng.randint(-5, 21)) if open_lead and contacted else None,
+        )
+
+    def make_activities(self, lead):
+        if lead.assigned_counsellor_id is None or lead.last_contact_date is None:
+            return []
+        activities = []
+        for _ in range(self.rng.randint(1, max(1, self.activities_per_lead * 2 - 1))):
+            activity_type = _weighted(self.rng, ACTIVITY_WEIGHTS)
+            completed = self.random_time(lead.created_at, lead.last_contact_date)
+            activities.append(LeadActivity(
+                lead_id=lead.id, counsellor_id=lead.assigned_counsellor_id, activity_type=activity_type,
+                subject=f'{dict(LeadActivity.ACTIVITY_TYPE)[activity_type]} with {lead.first_name}',
+                description='Generated activity', outcome=self.rng.choice(OUTCOMES),
+                scheduled_date=completed, completed_date=completed, duration=self.rng.choice([0, 5, 10, 15, 30, 60]),
+            ))
+        return activities
+
+    def make_business(self, lead):
+        if lead.assigned_counsellor_id is None:
+            return None
+        if lead.status == 'CLOSED_WON':
+            status = 'COMPLETED' if self.rng.random() < 0.3 else 'ACTIVE'
+        elif lead.status == 'NEGOTIATION' and self.rng.random() < 0.3:
+            status = 'PENDING'
+        else:
+            return None
+        created = self.random_time(lead.last_contact_date or lead.created_at)
+        return Business(
+            lead_id=lead.id, counsellor_id=lead.assigned_counsellor_id, business_id=f'BIZ-{self.token()}',
+            title=f'{lead.company or lead.last_name} enrolment', description='Generated business',
+            value=lead.expected_value, status=status, start_date=created.date(),
+            created_at=created, updated_at=created,
+        )
+
+    def seed_leads(self, counsellor_ids, source_ids):
+        start = self.now - timedelta(days=30 * self.months)
+        remaining = self.leads
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            with transaction.atomic():
+                leads = Lead.objects.bulk_create(
+                    [self.make_lead(counsellor_ids, source_ids, start) for _ in range(size)])
+                if leads and leads[0].id is None:
+                    # Databases that can't return ids from a bulk insert
+                    ids = dict(Lead.objects.filter(lead_id__in=[lead.lead_id for lead in leads])
+                               .values_list('lead_id', 'id'))
+                    for lead in leads:
+                        lead.id = ids[lead.lead_id]
+                activities = [activity for lead in leads for activity in self.make_activities(lead)]
+                businesses = [business for business in map(self.make_business, leads) if business]
+                LeadActivity.objects.bulk_create(activities, batch_size=self.batch_size)
+                Business.objects.bulk_create(businesses, batch_size=self.batch_size)
+            remaining -= size
+            self.counts['leads'] += size
+            self.counts['activities'] += len(activities)
+            self.counts['businesses'] += len(businesses)
+            if self.on_progress:
+                self.on_progress(self.counts)
+        return start
+
+    def seed_notifications(self, counsellor_ids):
+        start = self.now - timedelta(days=30)
+        notifications = [
+            NotificationCounsellor(counsellor_id=counsellor_id, message=message, is_read=self.rng.random() < 0.6,
+                                   created_at=created, updated_at=created)
+            for counsellor_id in counsellor_ids
+            for message, created in (('New leads have been assigned to you', self.random_time(start)),
+                                     ('Follow-ups are due this week', self.random_time(start)),
+                                     ('Monthly performance report is ready', self.random_time(start)))
+        ]
+        admin_times = [self.random_time(start) for _ in range(min(200, max(20, self.leads // 1000)))]
+        admin_notifications = [
+            NotificationAdmin(message=f'Lead transfer requested ({i + 1})', is_read=self.rng.random() < 0.5,
+                              created_at=created, updated_at=created)
+            for i, created in enumerate(admin_times)
+        ]
+        NotificationCounsellor.objects.bulk_create(notifications, batch_size=self.batch_size)
+        NotificationAdmin.objects.bulk_create(admin_notifications, batch_size=self.batch_size)
+        self.counts['notifications'] = len(notifications) + len(admin_notifications)
+
+    def run(self):
+        """Generate everything, then bring the derived data (counters, search index, rollups) up to date"""
+        with historic_timestamps():
+            counsellor_ids = self.seed_counsellors()
+            source_ids = self.seed_sources()
+            start = self.seed_leads(counsellor_ids, source_ids)
+            self.seed_notifications(counsellor_ids)
+        # bulk_create skips the signals that maintain these
+        reconcile_counters(counsellor_ids)
+        rebuild_index()
+        rebuild_performance(month_of(start), month_of(self.now))
+        invalidate_snapshots(counsellor_ids)
+        return self.counts
+
+
+def seed_crm(leads=10000, **options):
+    return CRMSeeder(leads=leads, **options).run()
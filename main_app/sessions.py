@@ -0,0 +1,30 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def session_store():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def prune_sessions(batch_size=None, now=None):
+    """
+    Delete expired sessions from django_session, `batch_size` rows per
+    DELETE so a large backlog never holds a long write lock. Engines without
+    a table (signed cookies, cache) expire on their own. Returns the number of
+    rows deleted.
+    """
+    store = session_store()
+    if not hasattr(store, 'get_model_class'):
+        store.clear_expired()
+        return 0
+    model = store.get_model_class()
+    batch_size = batch_size or settings.SESSION_PRUNE_BATCH_SIZE
+    expired = model.objects.filter(expire_date__lt=now or timezone.now()).order_by()
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += model.objects.filter(session_key__in=keys).delete()[0]
@@ -0,0 +1,146 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .counters import business_changed, lead_changed
+from .models import (Business, Counsellor, Lead, LeadActivity, LeadSource, NotificationAdmin,
+                     NotificationCounsellor)
+from .notifications import forget_admin_unread_count, forget_counsellor_unread_count
+from .performance import month_of, schedule_refresh
+from .roles import remember_role
+from .search import INDEXED_FIELDS, index_leads
+from .snapshots import invalidate_snapshots
+
+
+def _lead_state(instance):
+    # Read from __dict__ so deferred loads (.only()) don't trigger a query
+    return instance.__dict__.get('assigned_counsellor_id'), instance.__dict__.get('status')
+
+
+# Lead fields the dashboard snapshots and performance rollups are computed from
+SNAPSHOT_FIELDS = ('assigned_counsellor', 'status', 'source', 'expected_value', 'actual_value', 'created_at')
+
+
+def _snapshot_state(instance):
+    return tuple(instance.__dict__.get(instance._meta.get_field(name).attname) for name in SNAPSHOT_FIELDS)
+
+
+def _business_state(instance):
+    return (instance.__dict__.get('counsellor_id'), instance.__dict__.get('status'),
+            instance.__dict__.get('value'))
+
+
+@receiver(post_init, sender=Lead)
+def remember_lead_counsellor(sender, instance, **kwargs):
+    instance._loaded_counsellor_id, instance._loaded_status = _lead_state(instance)
+    instance._loaded_snapshot_state = _snapshot_state(instance)
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_delete, sender=Lead)
+def invalidate_lead_snapshots(sender, instance, created=False, update_fields=None, **kwargs):
+    counsellor_id, status = _lead_state(instance)
+    loaded_counsellor_id = getattr(instance, '_loaded_counsellor_id', None)
+    counsellor_ids = {counsellor_id, loaded_counsellor_id}
+    # Saves that leave the counted fields alone (scores, notes, last contact) keep snapshots and rollups
+    touched = update_fields is None or set(update_fields) & set(SNAPSHOT_FIELDS)
+    changed = created or kwargs['signal'] is post_delete or \
+        getattr(instance, '_loaded_snapshot_state', None) != _snapshot_state(instance)
+    if touched and changed:
+        invalidate_snapshots(counsellor_ids)
+        if instance.created_at:
+            schedule_refresh((counsellor_id, month_of(instance.created_at)) for counsellor_id in counsellor_ids)
+    instance._loaded_snapshot_state = _snapshot_state(instance)
+
+    # A status that was deferred at load time is treated as unchanged
+    loaded = (loaded_counsellor_id, getattr(instance, '_loaded_status', None) or status)
+    if kwargs['signal'] is post_delete:
+        lead_changed(loaded, None)
+    else:
+        lead_changed(None if created else loaded, (counsellor_id, status))
+    instance._loaded_counsellor_id, instance._loaded_status = counsellor_id, status
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_delete, sender=Lead)
+def update_lead_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & set(INDEXED_FIELDS):
+        index_leads([instance.pk])
+
+
+@receiver(post_init, sender=Business)
+def remember_business_value(sender, instance, **kwargs):
+    instance._loaded_state = _business_state(instance)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def update_business_counters(sender, instance, created=False, **kwargs):
+    loaded = getattr(instance, '_loaded_state', None)
+    if kwargs['signal'] is post_delete:
+        business_changed(loaded, None)
+    else:
+        business_changed(None if created else loaded, _business_state(instance))
+    instance._loaded_state = _business_state(instance)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+@receiver(post_save, sender=LeadActivity)
+@receiver(post_delete, sender=LeadActivity)
+def invalidate_counsellor_snapshots(sender, instance, **kwargs):
+    invalidate_snapshots([instance.counsellor_id])
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def refresh_business_performance(sender, instance, **kwargs):
+    schedule_refresh([(instance.counsellor_id, month_of(instance.created_at))])
+
+
+@receiver(post_save, sender=LeadActivity)
+@receiver(post_delete, sender=LeadActivity)
+def refresh_activity_performance(sender, instance, update_fields=None, **kwargs):
+    # Only the lead's first activity sets its response time; later ones leave the rollup as it is
+    if update_fields is not None and not set(update_fields) & {'lead', 'completed_date'}:
+        return
+    earlier = LeadActivity.objects.filter(lead_id=instance.lead_id, completed_date__lt=instance.completed_date)
+    if not earlier.exclude(pk=instance.pk).exists():
+        schedule_refresh(lead_ids=[instance.lead_id])
+
+
+@receiver(post_save, sender=Counsellor)
+@receiver(post_delete, sender=Counsellor)
+@receiver(post_save, sender=LeadSource)
+@receiver(post_delete, sender=LeadSource)
+def invalidate_global_snapshots(sender, instance, **kwargs):
+    invalidate_snapshots()
+
+
+@receiver(post_save, sender=Counsellor)
+def add_counsellor_performance(sender, instance, created, **kwargs):
+    if created:
+        schedule_refresh([(instance.id, month_of())])
+
+
+@receiver(post_save, sender=NotificationCounsellor)
+@receiver(post_delete, sender=NotificationCounsellor)
+def reset_counsellor_unread_count(sender, instance, **kwargs):
+    # Use the loaded counsellor if there is one; the id still works after a cascade delete
+    if sender.counsellor.is_cached(instance):
+        forget_counsellor_unread_count(instance.counsellor)
+    else:
+        forget_counsellor_unread_count(instance.counsellor_id)
+
+
+@receiver(post_save, sender=NotificationAdmin)
+@receiver(post_delete, sender=NotificationAdmin)
+def reset_admin_unread_count(sender, instance, **kwargs):
+    forget_admin_unread_count()
+
+
+@receiver(user_logged_in)
+def remember_logged_in_role(sender, request, user, **kwargs):
+    # Every login path (the login page, the admin site, test clients) caches the role for routing
+    if request is not None and hasattr(request, 'session'):
+        remember_role(request, user)
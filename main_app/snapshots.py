@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+GLOBAL_SCOPE = 'admin'
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def scope_for(counsellor_id=None):
+    """Cache scope: the global (admin) scope or a single counsellor"""
+    if counsellor_id is None:
+        return GLOBAL_SCOPE
+    return f'counsellor:{counsellor_id}'
+
+
+def _version_key(scope):
+    return f'dashboard:{scope}:version'
+
+
+def snapshot_key(name, counsellor_id=None):
+    """Versioned cache key; bumping the scope version orphans every old key"""
+    scope = scope_for(counsellor_id)
+    cache = _cache()
+    version = cache.get(_version_key(scope))
+    if version is None:
+        # Seed from the clock so an evicted version never revives old entries
+        cache.add(_version_key(scope), int(time.time() * 1000), None)
+        version = cache.get(_version_key(scope))
+    return f'dashboard:{scope}:v{version}:{name}'
+
+
+def get_snapshot(name, builder, counsellor_id=None):
+    """Return the cached snapshot `name`, building and storing it on a miss"""
+    cache = _cache()
+    key = snapshot_key(name, counsellor_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = builder()
+        cache.set(key, snapshot, _timeout())
+    return snapshot
+
+
+def invalidate_snapshots(counsellor_ids=(), include_global=True):
+    """Drop the snapshots of the given counsellors (and the global ones)"""
+    cache = _cache()
+    scopes = [scope_for(cid) for cid in set(counsellor_ids) if cid is not None]
+    if include_global:
+        scopes.append(GLOBAL_SCOPE)
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            # No version yet, so nothing has been cached for this scope
+            pass
@@ -1,3 +1,1754 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from . import llm_cache
+from .ai_client import AIClient, CircuitBreaker, get_client, reset_client
+from .assignment import (ImportAssigner, apply_plan, assign_leads, assign_round_robin,
+                         assign_workload_balanced, current_workload, plan_workload_balanced, success_matrix)
+from .context_processors import notification_count
+from .counters import reconcile_counters
+from .dashboard import get_dashboard_stats, month_start
+from .jobs import enqueue_import, enqueue_workflow, run_pending_jobs
+from .lead_import import import_leads_file
+from .load_test import compare_load_reports, run_load_test
+from .models import *
+from .notifications import unread_count
+from .performance import build_rollups, month_of, rebuild_performance
+from .profiling import (QueryBudgetExceeded, QueryRecorder, clear_requests, profile_summary, recent_requests,
+                        server_timing)
+from .roles import ROLE_SESSION_KEY
+from .scoring import RateLimiter, lead_heuristic, rescore_leads, score_lead, score_leads
+from .search import FTS_TABLE, ranked_lead_ids, search_backend, search_filter
+from .seeding import CRMSeeder
+from .sessions import prune_sessions, session_store
+from .snapshots import get_snapshot, snapshot_key
+from .workflow import run_workflow
+from .workload import capacity_bucket, workload_summary
+
+# One INFO line per request is noise in test output; budget and slow-request warnings still show
+logging.getLogger('main_app.profiling').setLevel(logging.WARNING)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class CRMTestCase(TestCase):
+    """Shared fixtures: an admin, two counsellors, a lead source; per-view query budgets are enforced"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = CustomUser.objects.create_user(
+            email='admin@example.com', password='admin123', user_type='1'
+        )
+        cls.counsellors = []
+        for i in range(2):
+            user = CustomUser.objects.create_user(
+                email=f'counsellor{i}@example.com', password='counsellor123',
+                user_type='2', first_name='Counsellor', last_name=str(i)
+            )
+            cls.counsellors.append(Counsellor.objects.create(admin=user, employee_id=f'EMP{i:03d}'))
+        cls.source = LeadSource.objects.create(name='Website')
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def make_lead(cls, **kwargs):
+        data = {
+            'first_name': 'Lead', 'last_name': 'Person', 'email': 'lead@example.com',
+            'phone': '0000000000', 'source': cls.source,
+        }
+        data.update(kwargs)
+        return Lead.objects.create(**data)
+
+    @classmethod
+    def make_business(cls, lead, counsellor, **kwargs):
+        data = {
+            'lead': lead, 'counsellor': counsellor, 'title': 'Deal',
+            'description': 'Deal', 'value': 1000, 'start_date': date.today(),
+        }
+        data.update(kwargs)
+        return Business.objects.create(**data)
+
+
+class DashboardStatsTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        statuses = ['NEW', 'NEW', 'CONTACTED', 'QUALIFIED', 'CLOSED_WON', 'CLOSED_LOST']
+        self.leads = [self.make_lead(status=status) for status in statuses]
+        self.make_business(self.leads[4], self.counsellors[0], status='ACTIVE', value=500)
+        self.make_business(self.leads[4], self.counsellors[0], status='PENDING', value=700)
+
+        # Move one lead and one business into the previous calendar month
+        last_month = month_start() - timedelta(days=1)
+        Lead.objects.filter(pk=self.leads[0].pk).update(created_at=last_month)
+        old = self.make_business(self.leads[3], self.counsellors[1], status='ACTIVE', value=300)
+        Business.objects.filter(pk=old.pk).update(created_at=last_month)
+
+    def test_stats_are_correct(self):
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['leads']['total'], 6)
+        self.assertEqual(stats['leads']['status_counts']['NEW'], 2)
+        self.assertEqual(stats['leads']['status_counts']['CLOSED_LOST'], 1)
+        self.assertEqual(stats['leads']['monthly'], 5)
+        self.assertEqual(stats['business']['total'], 800)
+        self.assertEqual(stats['business']['monthly'], 500)
+        self.assertEqual(len(stats['monthly_trend']), 6)
+        self.assertEqual(stats['monthly_trend'][1]['leads'], 1)
+        self.assertEqual(stats['monthly_trend'][1]['business'], 300.0)
+
+    def test_stats_query_count_does_not_grow_with_data(self):
+        with self.assertNumQueries(2):
+            get_dashboard_stats()
+        for _ in range(20):
+            self.make_lead(status='QUALIFIED')
+        with self.assertNumQueries(2):
+            get_dashboard_stats()
+
+    def test_lead_analytics_endpoint(self):
+        self.client.force_login(self.admin_user)
+        with self.assertNumQueries(3):  # session, user with profile, lead aggregate
+            response = self.client.get(reverse('get_lead_analytics'))
+        with self.assertNumQueries(2):  # served from the snapshot cache
+            self.client.get(reverse('get_lead_analytics'))
+        data = response.json()
+        self.assertIn({'status': 'NEW', 'count': 2}, data['status_data'])
+        self.assertEqual(len(data['monthly_data']), 6)
+
+    def test_admin_home_renders(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('admin_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_leads'], 6)
+        self.assertEqual(response.context['closed_won'], 1)
+
+
+class DashboardSnapshotTests(CRMTestCase):
+    def build(self, value):
+        return lambda: value
+
+    def test_snapshot_is_cached_until_invalidated(self):
+        self.assertEqual(get_snapshot('admin_home', self.build(1)), 1)
+        self.assertEqual(get_snapshot('admin_home', self.build(2)), 1)
+        self.make_lead()
+        self.assertEqual(get_snapshot('admin_home', self.build(3)), 3)
+
+    def test_invalidation_is_scoped_to_affected_counsellor(self):
+        first, second = self.counsellors
+        get_snapshot('counsellor_home', self.build('first'), first.id)
+        get_snapshot('counsellor_home', self.build('second'), second.id)
+
+        lead = self.make_lead(assigned_counsellor=first)
+        self.assertEqual(get_snapshot('counsellor_home', self.build('second-new'), second.id), 'second')
+        self.assertEqual(get_snapshot('counsellor_home', self.build('first-new'), first.id), 'first-new')
+
+        # Reassignment invalidates both the old and the new counsellor
+        lead = Lead.objects.get(pk=lead.pk)
+        lead.assigned_counsellor = second
+        lead.save()
+        self.assertEqual(get_snapshot('counsellor_home', self.build('first-3'), first.id), 'first-3')
+        self.assertEqual(get_snapshot('counsellor_home', self.build('second-3'), second.id), 'second-3')
+
+    def test_activity_invalidates_counsellor_and_global(self):
+        counsellor = self.counsellors[0]
+        lead = self.make_lead(assigned_counsellor=counsellor)
+        key = snapshot_key('counsellor_home', counsellor.id)
+        global_key = snapshot_key('admin_home')
+        LeadActivity.objects.create(
+            lead=lead, counsellor=counsellor, activity_type='CALL',
+            subject='Intro', description='Intro call'
+        )
+        self.assertNotEqual(snapshot_key('counsellor_home', counsellor.id), key)
+        self.assertNotEqual(snapshot_key('admin_home'), global_key)
+
+    def test_counsellor_home_renders(self):
+        counsellor = self.counsellors[0]
+        self.make_lead(assigned_counsellor=counsellor, status='QUALIFIED')
+        self.client.force_login(counsellor.admin)
+        response = self.client.get(reverse('counsellor_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['qualified_leads'], 1)
+        response = self.client.get(reverse('get_my_analytics'))
+        self.assertEqual(response.json()['status_data'], [{'status': 'QUALIFIED', 'count': 1}])
+
+
+class LeadListingTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        first, second = self.counsellors
+        for i in range(30):
+            self.make_lead(
+                first_name=f'Lead{i:02d}', company='Acme' if i % 3 == 0 else 'Globex',
+                status='NEW' if i % 2 else 'QUALIFIED', priority='HIGH' if i < 5 else 'MEDIUM',
+                assigned_counsellor=first if i < 20 else second,
+            )
+        self.url = reverse('manage_leads_data')
+
+    def get_page(self, **params):
+        params.setdefault('length', 10)
+        return self.client.get(self.url, params).json()
+
+    def test_cursor_pages_match_offset_pages(self):
+        self.client.force_login(self.admin_user)
+        first_page = self.get_page(draw=1)
+        self.assertEqual(first_page['recordsTotal'], 30)
+        self.assertEqual(len(first_page['data']), 10)
+
+        by_offset = self.get_page(start=10)
+        by_cursor = self.get_page(start=10, cursor=first_page['next_cursor'])
+        self.assertEqual([row['id'] for row in by_offset['data']],
+                         [row['id'] for row in by_cursor['data']])
+
+        ids = [row['id'] for row in first_page['data'] + by_cursor['data']]
+        self.assertEqual(len(set(ids)), 20)
+
+    def test_cursor_for_other_ordering_is_ignored(self):
+        self.client.force_login(self.admin_user)
+        cursor = self.get_page()['next_cursor']
+        params = {'order[0][column]': '0', 'order[0][dir]': 'asc', 'columns[0][data]': 'id'}
+        page = self.get_page(cursor=cursor, **params)
+        self.assertEqual(page['data'][0]['id'], Lead.objects.order_by('id').first().id)
+
+    def test_sort_by_name(self):
+        self.client.force_login(self.admin_user)
+        params = {'order[0][column]': '1', 'order[0][dir]': 'asc', 'columns[1][data]': 'name'}
+        page = self.get_page(**params)
+        second = self.get_page(cursor=page['next_cursor'], **params)
+        names = [row['name'] for row in page['data'] + second['data']]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(names[0], 'Lead00 Person')
+
+    def test_filters_and_search(self):
+        self.client.force_login(self.admin_user)
+        page = self.get_page(status='QUALIFIED', priority='HIGH')
+        self.assertEqual(page['recordsFiltered'], 3)
+        page = self.get_page(**{'search[value]': 'acme'})
+        self.assertEqual(page['recordsFiltered'], 10)
+        page = self.get_page(counsellor=self.counsellors[1].id, source=self.source.id)
+        self.assertEqual(page['recordsFiltered'], 10)
+
+    def test_query_count_is_independent_of_page_depth(self):
+        self.client.force_login(self.admin_user)
+        cursor = self.get_page()['next_cursor']
+        # session, user, total, page
+        with self.assertNumQueries(4):
+            self.get_page(start=10, cursor=cursor)
+
+    def test_total_counts_leads_added_elsewhere(self):
+        self.client.force_login(self.admin_user)
+        self.assertEqual(self.get_page()['recordsTotal'], 30)
+        # bulk_create sends no signals, like a change made by another process
+        Lead.objects.bulk_create([Lead(first_name='Bulk', last_name='Lead', email='bulk@example.com',
+                                       phone='0', source=self.source)])
+        page = self.get_page()
+        self.assertEqual((page['recordsTotal'], page['recordsFiltered']), (31, 31))
+
+    def test_manage_leads_page_does_not_embed_rows(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('manage_leads'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Lead00')
+
+    def test_counsellor_only_sees_own_leads(self):
+        counsellor = self.counsellors[1]
+        self.client.force_login(counsellor.admin)
+        page = self.client.get(reverse('my_leads_data'), {'length': 50}).json()
+        self.assertEqual(page['recordsTotal'], 10)
+        self.assertTrue(all('detail_url' in row for row in page['data']))
+        response = self.client.get(reverse('my_leads'), {'status': 'NEW'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class LeadImportTests(CRMTestCase):
+    header = 'first_name,last_name,email,phone,company,expected_value\n'
+
+    def csv_file(self, rows, name='leads.csv'):
+        return SimpleUploadedFile(name, (self.header + ''.join(rows)).encode(), content_type='text/csv')
+
+    def test_valid_rows_are_bulk_inserted_and_errors_reported(self):
+        rows = [
+            'Ada,Lovelace,ADA@example.com,123,Analytical,1500\n',
+            ',Missing,missing@example.com,123,,\n',
+            'Bad,Email,not-an-email,123,,\n',
+            'Bad,Value,value@example.com,123,,lots\n',
+            'Alan,Turing,alan@example.com,456,,\n',
+        ]
+        report = import_leads_file(self.csv_file(rows), self.source, chunk_size=2)
+        self.assertEqual(report['processed'], 5)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4, 5])
+        self.assertIn('first_name is required', report['errors'][0]['errors'])
+        self.assertIn('email is not a valid address', report['errors'][1]['errors'])
+        self.assertIn('expected_value is not a number', report['errors'][2]['errors'])
+
+        ada = Lead.objects.get(email='ada@example.com')
+        self.assertEqual(ada.expected_value, 1500)
+        self.assertEqual(ada.source, self.source)
+
+    def test_committed_chunks_are_counted_when_a_later_chunk_fails(self):
+        counsellor = self.counsellors[0]
+        rows = [f'Lead,{i},lead{i}@example.com,{i},,\n' for i in range(4)]
+
+        def fail_second_chunk(leads):
+            if Lead.objects.count() > 2:
+                raise RuntimeError('worker died')
+
+        with self.assertRaises(RuntimeError):
+            import_leads_file(self.csv_file(rows), self.source, assigned_counsellor=counsellor,
+                              chunk_size=2, atomic=False, on_chunk=fail_second_chunk)
+        counsellor.refresh_from_db()
+        self.assertEqual((Lead.objects.count(), counsellor.total_leads_assigned), (2, 2))
+
+    def test_auto_assignment_runs_per_chunk(self):
+        assigner = ImportAssigner('round_robin')
+        rows = [f'Lead,{i},lead{i}@example.com,{i},,\n' for i in range(4)]
+        report = import_leads_file(self.csv_file(rows), self.source, chunk_size=1, on_chunk=assigner)
+        self.assertNotIn('leads', report)
+        self.assertEqual(assigner.assigned, 4)
+        self.assertEqual(sorted(Lead.objects.values_list('assigned_counsellor', flat=True)),
+                         sorted([c.id for c in self.counsellors] * 2))
+        self.assertTrue(assigner.message().startswith('Auto-assigned them using Round Robin'))
+
+    def test_defaults_and_duplicate_skipping(self):
+        self.make_lead(email='existing@example.com')
+        rows = [
+            'A,One,existing@example.com,1,,\n',
+            'B,Two,new@example.com,2,,\n',
+            'C,Three,NEW@example.com,3,,\n',
+        ]
+        report = import_leads_file(
+            self.csv_file(rows), self.source, assigned_counsellor=self.counsellors[0],
+            status='QUALIFIED', priority='HIGH', default_value=250, skip_duplicates=True,
+        )
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['skipped'], 2)
+        lead = Lead.objects.get(email='new@example.com')
+        self.assertEqual((lead.status, lead.priority, lead.expected_value), ('QUALIFIED', 'HIGH', 250))
+        self.assertEqual(lead.assigned_counsellor, self.counsellors[0])
+
+    def test_query_count_does_not_grow_per_row(self):
+        rows = [f'First{i},Last,user{i}@example.com,{i},,\n' for i in range(300)]
+        with CaptureQueriesContext(connection) as queries:
+            report = import_leads_file(self.csv_file(rows), self.source, batch_size=500)
+        self.assertEqual(report['created'], 300)
+        # Multi-row INSERTs (SQLite caps each at 999 parameters), not one per row
+        self.assertLess(len(queries), 300 // 10)
+
+    def test_excel_import(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['First_Name', 'Last_Name', 'Email', 'Phone', 'Postal_Code'])
+        sheet.append(['Grace', 'Hopper', 'grace@example.com', 5551234567, 10001])
+        sheet.append([None, None, None, None, None])
+        sheet.append(['Edsger', None, 'edsger@example.com', 555, None])
+        buffer = BytesIO()
+        workbook.save(buffer)
+        upload = SimpleUploadedFile('leads.xlsx', buffer.getvalue())
+
+        report = import_leads_file(upload, self.source)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [{'row': 3, 'errors': ['last_name is required']}])
+        grace = Lead.objects.get(email='grace@example.com')
+        self.assertEqual((grace.phone, grace.postal_code), ('5551234567', '10001'))
+
+    def test_import_view_queues_background_job(self):
+        self.client.force_login(self.admin_user)
+        rows = ['Ada,Lovelace,ada@example.com,123,,\n', 'Bad,Email,nope,123,,\n']
+        response = self.client.post(reverse('import_leads'), {
+            'file': self.csv_file(rows), 'source': self.source.id, 'default_status': 'NEW',
+            'auto_assign': 'on', 'assignment_method': 'round_robin',
+        })
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('import_leads') + f'?job={job.pk}', fetch_redirect_response=False)
+        self.assertEqual(job.status, 'PENDING')
+        self.assertEqual(Lead.objects.count(), 0)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        status = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+        self.assertEqual(status['status'], 'COMPLETED')
+        self.assertEqual((status['rows_processed'], status['rows_created'], status['error_count']), (2, 1, 1))
+        self.assertEqual(status['errors'][0]['row'], 3)
+        self.assertIsNotNone(Lead.objects.get().assigned_counsellor)
+
+        response = self.client.get(reverse('import_leads'), {'job': job.pk})
+        self.assertContains(response, f'Import #{job.pk}')
+
+    @override_settings(LEAD_IMPORT_BACKGROUND=False)
+    def test_import_view_runs_inline_without_worker(self):
+        self.client.force_login(self.admin_user)
+        self.client.post(reverse('import_leads'), {
+            'file': self.csv_file(['Ada,Lovelace,ada@example.com,123,,\n']), 'source': self.source.id,
+        })
+        self.assertEqual(ImportJob.objects.get().status, 'COMPLETED')
+        self.assertEqual(Lead.objects.count(), 1)
+        response = self.client.get(reverse('import_leads'))
+        self.assertContains(response, 'Import finished: 1 leads created, 0 skipped, 0 rows with errors.')
+        self.assertNotContains(response, 'Import queued')
+
+    def test_uploads_are_deleted_when_the_job_ends(self):
+        job = enqueue_import(self.csv_file(['Ada,Lovelace,ada@example.com,123,,\n']), self.source)
+        broken = enqueue_import(SimpleUploadedFile('broken.xlsx', b'not a workbook'), self.source)
+        paths = [job.file.path, broken.file.path]
+        with self.assertLogs('main_app.jobs', 'ERROR'):
+            self.assertEqual(run_pending_jobs(), 2)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertEqual(list(ImportJob.objects.values_list('file', flat=True)), ['', ''])
+
+    def test_stale_running_import_is_failed(self):
+        job = enqueue_import(self.csv_file(['Ada,Lovelace,ada@example.com,123,,\n']), self.source)
+        ImportJob.objects.filter(pk=job.pk).update(status='RUNNING', started_at=timezone.now() - timedelta(hours=3))
+        self.assertEqual(run_pending_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertTrue(job.message.startswith('Import stopped'))
+        self.assertTrue(job.is_finished)
+        self.assertEqual(job.file.name, '')
+
+    def test_failed_job_is_recorded(self):
+        job = enqueue_import(SimpleUploadedFile('broken.xlsx', b'not a workbook'), self.source)
+        with self.assertLogs('main_app.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertTrue(job.message.startswith('Import failed'))
+
+
+class AssignmentTests(CRMTestCase):
+    def make_unassigned(self, count):
+        return Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com',
+                 phone='0000000000', source=self.source)
+            for i in range(count)
+        ])
+
+    def test_round_robin_alternates_counsellors(self):
+        self.make_unassigned(5)
+        self.assertEqual(assign_round_robin(Lead.objects.filter(assigned_counsellor__isnull=True), self.counsellors), 5)
+        counsellor_ids = list(Lead.objects.order_by('id').values_list('assigned_counsellor', flat=True))
+        first, second = self.counsellors
+        self.assertEqual(counsellor_ids, [first.id, second.id, first.id, second.id, first.id])
+
+    def test_workload_balanced_evens_out_existing_load(self):
+        for i in range(4):
+            self.make_lead(email=f'busy{i}@example.com', assigned_counsellor=self.counsellors[0])
+        self.make_unassigned(6)
+        # Fresh instances: the workload comes from the counters the signals just moved
+        counsellors = Counsellor.objects.order_by('id')
+        self.assertEqual(current_workload(counsellors), {self.counsellors[0].id: 4, self.counsellors[1].id: 0})
+        assign_workload_balanced(Lead.objects.filter(assigned_counsellor__isnull=True), counsellors)
+        self.assertEqual(current_workload(Counsellor.objects.all()), {
+            self.counsellors[0].id: 5, self.counsellors[1].id: 5,
+        })
+
+    def test_plan_workload_balanced_uses_lowest_load(self):
+        plan = plan_workload_balanced(range(5), [1, 2, 3], {1: 3, 2: 0, 3: 1})
+        # ties go to the earlier counsellor; everyone ends on 3
+        self.assertEqual(dict(plan), {2: [0, 1, 3], 3: [2, 4]})
+
+    @override_settings(LEAD_ASSIGNMENT_BATCH_SIZE=50)
+    def test_query_count_does_not_grow_per_lead(self):
+        self.make_unassigned(200)
+        with CaptureQueriesContext(connection) as queries:
+            assigned = assign_workload_balanced(
+                Lead.objects.filter(assigned_counsellor__isnull=True), self.counsellors
+            )
+        self.assertEqual(assigned, 200)
+        # id list + 4 batches of won-lead SELECT + 2 counsellors x (2 batches of UPDATE
+        # + counter UPDATE) (+ savepoint)
+        self.assertLess(len(queries), 16)
+
+    def test_assigning_won_leads_moves_won_counters(self):
+        self.make_unassigned(2)
+        Lead.objects.filter(pk=Lead.objects.order_by('id').first().pk).update(status='CLOSED_WON')
+        counsellor = self.counsellors[0]
+        assign_round_robin(Lead.objects.all(), [counsellor])
+        counsellor.refresh_from_db()
+        self.assertEqual((counsellor.total_leads_assigned, counsellor.total_leads_won), (2, 1))
+
+    def test_already_assigned_leads_are_left_alone(self):
+        lead = self.make_lead(assigned_counsellor=self.counsellors[1])
+        self.assertEqual(apply_plan({self.counsellors[0].id: [lead.id]}), 0)
+        lead.refresh_from_db()
+        self.assertEqual(lead.assigned_counsellor, self.counsellors[1])
+
+    def test_assignment_invalidates_counsellor_snapshots(self):
+        counsellor = self.counsellors[0]
+        get_snapshot('counsellor_home', lambda: 0, counsellor.id)
+        key = snapshot_key('counsellor_home', counsellor.id)
+        self.make_unassigned(1)
+        assign_round_robin(Lead.objects.all(), [counsellor])
+        self.assertNotEqual(snapshot_key('counsellor_home', counsellor.id), key)
+
+    def test_assign_view(self):
+        self.make_unassigned(3)
+        self.client.force_login(self.admin_user)
+        response = self.client.post(reverse('assign_leads_to_counsellors'), {'assignment_method': 'workload_balanced'})
+        self.assertRedirects(response, reverse('assign_leads_to_counsellors'), fetch_redirect_response=False)
+        self.assertFalse(Lead.objects.filter(assigned_counsellor__isnull=True).exists())
+
+    def test_success_matrix_is_one_query(self):
+        first, second = self.counsellors
+        self.make_lead(email='a@example.com', industry='Tech', status='CLOSED_WON', assigned_counsellor=first)
+        self.make_lead(email='b@example.com', industry='Tech', assigned_counsellor=first)
+        self.make_lead(email='c@example.com', industry='Retail', status='CLOSED_WON', assigned_counsellor=second)
+        with self.assertNumQueries(1):
+            matrix = success_matrix([first.id, second.id])
+        self.assertEqual(matrix['overall'], {first.id: [2, 1], second.id: [1, 1]})
+        self.assertEqual(matrix['industry'][(first.id, 'Tech')], [2, 1])
+        self.assertEqual(matrix['source'][(second.id, self.source.id)], [1, 1])
+
+    def test_specialization_prefers_industry_expert(self):
+        first, second = self.counsellors
+        self.make_lead(email='a@example.com', industry='Tech', status='CLOSED_WON', assigned_counsellor=second)
+        self.make_lead(email='b@example.com', industry='Retail', assigned_counsellor=first)
+        tech = self.make_lead(email='new@example.com', industry='Tech')
+        self.assertEqual(assign_leads(Lead.objects.filter(pk=tech.pk), self.counsellors, 'specialization_based'), 1)
+        tech.refresh_from_db()
+        self.assertEqual(tech.assigned_counsellor, second)
+
+    def test_specialization_assigns_even_when_everyone_is_busy(self):
+        for i, counsellor in enumerate(self.counsellors):
+            self.make_lead(email=f'busy{i}@example.com', assigned_counsellor=counsellor)
+        self.make_unassigned(3)
+        assign_leads(Lead.objects.filter(assigned_counsellor__isnull=True), self.counsellors, 'specialization_based')
+        self.assertFalse(Lead.objects.filter(assigned_counsellor__isnull=True).exists())
+
+    def test_performance_prefers_best_conversion_rate(self):
+        first, second = self.counsellors
+        self.make_lead(email='a@example.com', assigned_counsellor=first)
+        self.make_lead(email='b@example.com', status='CLOSED_WON', assigned_counsellor=second)
+        self.make_unassigned(2)
+        counsellors = Counsellor.objects.order_by('id')
+        # counsellors (rates come from their counters), ids, savepoint pair, won-lead SELECT,
+        # lead UPDATE, counter UPDATE
+        with self.assertNumQueries(7):
+            assign_leads(Lead.objects.filter(assigned_counsellor__isnull=True), counsellors, 'performance_based')
+        self.assertEqual(Lead.objects.filter(assigned_counsellor=second).count(), 3)
+
+    def test_benchmark_plans_match_previous_algorithms(self):
+        out = StringIO()
+        call_command('benchmark_assignment', counsellors=5, leads=300, stdout=out)
+        self.assertEqual(out.getvalue().count('same plan'), 2)
+
+
+class QueryPlanTests(CRMTestCase):
+    """The dashboard, notification and assignment filters are served by indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Enough rows, mostly assigned and read, for the planner statistics to look like production
+        statuses = [status for status, _ in Lead.LEAD_STATUS]
+        leads = Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'plan{i}@example.com', phone='0',
+                 source=cls.source, status=statuses[i % len(statuses)],
+                 assigned_counsellor=cls.counsellors[i % 2] if i % 20 else None)
+            for i in range(400)
+        ])
+        LeadActivity.objects.bulk_create([
+            LeadActivity(lead=lead, counsellor=cls.counsellors[i % 2], activity_type='CALL',
+                         subject='Call', description='Call')
+            for i, lead in enumerate(leads)
+        ])
+        NotificationCounsellor.objects.bulk_create([
+            NotificationCounsellor(counsellor=cls.counsellors[i % 2], message='Hi', is_read=bool(i % 10))
+            for i in range(400)
+        ])
+        NotificationAdmin.objects.bulk_create([
+            NotificationAdmin(message='Hi', is_read=bool(i % 10)) for i in range(400)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        if connection.vendor == 'postgresql':
+            # Test tables are tiny; make the planner show which index it would pick
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), f'No {index_names} in plan:\n{plan}')
+        if connection.vendor == 'sqlite':
+            self.assertNotRegex(plan, r'SCAN main_app_\w+\s*$', plan)
+
+    def test_lead_status_filter(self):
+        self.assertUsesIndex(Lead.objects.filter(status='NEW'), 'lead_status_idx')
+
+    def test_lead_created_at_range(self):
+        self.assertUsesIndex(Lead.objects.filter(created_at__gte=month_start()), 'lead_created_at_idx')
+
+    def test_counsellor_leads_by_status(self):
+        leads = Lead.objects.filter(assigned_counsellor=self.counsellors[0], status='CLOSED_WON')
+        self.assertUsesIndex(leads, 'lead_counsellor_status_idx')
+
+    def test_counsellor_upcoming_follow_ups(self):
+        leads = Lead.objects.filter(
+            assigned_counsellor=self.counsellors[0], next_follow_up__gte=timezone.now()
+        ).order_by('next_follow_up')
+        self.assertUsesIndex(leads, 'lead_counsellor_followup_idx')
+
+    def test_oldest_unassigned_lead(self):
+        leads = Lead.objects.filter(assigned_counsellor__isnull=True).order_by('created_at')
+        self.assertUsesIndex(leads, 'lead_unassigned_idx')
+
+    def test_counsellor_recent_activities(self):
+        activities = LeadActivity.objects.filter(counsellor=self.counsellors[0]).order_by('-completed_date')
+        self.assertUsesIndex(activities, 'activity_counsellor_date_idx')
+
+    def test_unread_notification_count(self):
+        notifications = NotificationCounsellor.objects.filter(counsellor=self.counsellors[0], is_read=False)
+        self.assertUsesIndex(notifications, 'notif_counsellor_unread_idx', 'notif_counsellor_read_idx')
+        self.assertUsesIndex(NotificationAdmin.objects.filter(is_read=False), 'notif_admin_unread_idx')
+
+
+class NotificationCountTests(CRMTestCase):
+    @override_settings(NOTIFICATION_COUNT_TIMEOUT=0)
+    def test_count_timeout_bounds_staleness(self):
+        counsellor = self.counsellors[0]
+        NotificationCounsellor.objects.create(counsellor=counsellor, message='One')
+        self.assertEqual(unread_count(counsellor.admin), 1)
+        # A change this worker's signals never saw (another worker, update())
+        NotificationCounsellor.objects.update(is_read=True)
+        self.assertEqual(unread_count(counsellor.admin), 0)
+
+    def test_counsellor_count_is_cached_and_reset_by_signals(self):
+        counsellor = self.counsellors[0]
+        user = counsellor.admin
+        NotificationCounsellor.objects.create(counsellor=counsellor, message='One')
+        self.assertEqual(unread_count(user), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(user), 1)
+
+        second = NotificationCounsellor.objects.create(counsellor=counsellor, message='Two')
+        self.assertEqual(unread_count(user), 2)
+        second.is_read = True
+        second.save()
+        self.assertEqual(unread_count(user), 1)
+        second.delete()
+        NotificationCounsellor.objects.create(counsellor=self.counsellors[1], message='Other')
+        self.assertEqual(unread_count(user), 1)
+
+    def test_admin_count_is_cached_and_reset_by_signals(self):
+        NotificationAdmin.objects.create(message='One')
+        self.assertEqual(unread_count(self.admin_user), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.admin_user), 1)
+        NotificationAdmin.objects.get().delete()
+        self.assertEqual(unread_count(self.admin_user), 0)
+
+    def test_mark_all_read_views_reset_count(self):
+        counsellor = self.counsellors[0]
+        NotificationCounsellor.objects.create(counsellor=counsellor, message='One')
+        self.assertEqual(unread_count(counsellor.admin), 1)
+        self.client.force_login(counsellor.admin)
+        self.client.post(reverse('counsellor_view_notifications'))
+        self.assertEqual(unread_count(counsellor.admin), 0)
+
+    def test_context_processor_uses_cached_count(self):
+        counsellor = self.counsellors[0]
+        NotificationCounsellor.objects.create(counsellor=counsellor, message='One')
+        request = RequestFactory().get('/')
+        request.user = counsellor.admin
+        self.assertEqual(notification_count(request), {'notification_count': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(notification_count(request), {'notification_count': 1})
+
+
+class StubAIServer:
+    """
+    Local HTTP server standing in for the AI API.
+
+    `respond(body, call_number)` returns (status, payload dict, headers dict);
+    received request bodies are kept in `requests` and the client ports seen
+    in `connections` (the server speaks keep-alive HTTP/1.1).
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append(body)
+                    stub.connections.add(self.client_address[1])
+                    call_number = len(stub.requests)
+                status, payload, headers = stub.respond(body, call_number)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/v1/responses'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ScoringTests(CRMTestCase):
+    def make_leads(self, count, **kwargs):
+        return Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'score{i}@example.com',
+                 phone='0', source=self.source, **kwargs)
+            for i in range(count)
+        ])
+
+    def test_bulk_scoring_against_stub_server(self):
+        self.make_leads(30)
+        with StubAIServer(lambda body, n: (200, {'output_text': 'Score: 72'}, {})) as stub:
+            with CaptureQueriesContext(connection) as queries:
+                report = score_leads(Lead.objects.all(), api_url=stub.url, api_key='test',
+                                     rate=0, concurrency=4, batch_size=8)
+        self.assertEqual(report, {'scored': 30, 'ai': 30, 'cached': 0, 'fallback': 0})
+        self.assertEqual(len(stub.requests), 30)
+        self.assertEqual(set(Lead.objects.values_list('conversion_score', flat=True)), {72})
+        # 4 batches of (select, cache lookup, cache store + size check, bulk update)
+        # and the final empty select; nothing per lead
+        self.assertLessEqual(len(queries), 4 * 5 + 1)
+
+    def test_retries_rate_limited_calls(self):
+        self.make_leads(1)
+
+        def respond(body, n):
+            if n == 1:
+                return 429, {'error': 'slow down'}, {'Retry-After': '0'}
+            return 200, {'output_text': '55'}, {}
+
+        with StubAIServer(respond) as stub:
+            report = score_leads(Lead.objects.all(), api_url=stub.url, api_key='test', rate=0, backoff=0)
+        self.assertEqual(report['ai'], 1)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(Lead.objects.get().conversion_score, 55)
+
+    @override_settings(AI_SCORING_MAX_RETRIES=1)
+    def test_falls_back_to_heuristic_when_api_keeps_failing(self):
+        self.make_leads(1, status='QUALIFIED', priority='HIGH')
+        with StubAIServer(lambda body, n: (503, {}, {})) as stub:
+            with self.assertLogs('main_app.ai_client', 'WARNING'):
+                report = score_leads(Lead.objects.all(), api_url=stub.url, api_key='test', rate=0, backoff=0)
+        self.assertEqual(report['fallback'], 1)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(Lead.objects.get().conversion_score, 65)
+
+    @override_settings(OPENAI_API_KEY=None)
+    def test_command_without_key_uses_heuristic(self):
+        self.make_leads(3, status='NEGOTIATION')
+        Lead.objects.filter(last_name='0').update(conversion_score=1)
+        out = StringIO()
+        call_command('score_leads', '--unscored', stdout=out)
+        self.assertIn('Scored 2 leads (0 by AI, 0 from cache, 2 by heuristic)', out.getvalue())
+        self.assertEqual(sorted(Lead.objects.values_list('conversion_score', flat=True)), [1, 80, 80])
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = RateLimiter(50, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    @override_settings(OPENAI_API_KEY=None)
+    def test_evaluate_view_saves_heuristic_score(self):
+        counsellor = self.counsellors[0]
+        lead = self.make_lead(assigned_counsellor=counsellor, status='CONTACTED', priority='URGENT')
+        self.client.force_login(counsellor.admin)
+        self.client.get(reverse('evaluate_conversion_score', args=[lead.id]))
+        lead.refresh_from_db()
+        self.assertEqual(lead.conversion_score, 55)
+
+
+class WorkflowTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompts = []
+
+    def ask(self, prompt):
+        self.prompts.append(prompt)
+        if 'data enricher' in prompt:
+            return 'job_title: CTO\nnotes: Runs engineering'
+        if 'conversion likelihood' in prompt:
+            return '77'
+        return 'route=senior_sales\nreason=Large strategic account'
+
+    @override_settings(AI_CACHE_ENABLED=False)
+    def test_steps_run_in_order_and_lead_is_saved_once(self):
+        lead = self.make_lead(company='Acme', industry='Tech')
+        with self.assertNumQueries(1):
+            results = run_workflow(lead, ask=self.ask)
+        self.assertEqual(len(self.prompts), 3)
+        self.assertIn('Enriched: CTO', self.prompts[1])
+        self.assertEqual(results['route']['routed_to'], 'senior_sales')
+        lead.refresh_from_db()
+        self.assertEqual((lead.enriched_job_title, lead.conversion_score, lead.routed_to),
+                         ('CTO', 77, 'senior_sales'))
+
+    def test_unchanged_lead_skips_model_calls(self):
+        lead = self.make_lead(company='Acme')
+        run_workflow(lead, ask=self.ask)
+        self.prompts.clear()
+        results = run_workflow(Lead.objects.get(pk=lead.pk), ask=self.ask)
+        self.assertEqual(self.prompts, [])
+        self.assertTrue(all(step['cached'] for step in results.values()))
+
+        Lead.objects.filter(pk=lead.pk).update(status='QUALIFIED')
+        run_workflow(Lead.objects.get(pk=lead.pk), ask=self.ask)
+        # Enrichment inputs are unchanged; scoring and routing see the new status
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn('Status: QUALIFIED', self.prompts[0])
+
+    def test_score_overlaps_enrichment_when_title_is_known(self):
+        lead = self.make_lead(company='Acme', enriched_job_title='CTO')
+        run_workflow(lead, ask=self.ask)
+        # The speculative score used the stored title, which enrichment confirmed
+        self.assertEqual(len(self.prompts), 3)
+
+        cache.clear()
+        llm_cache.clear()
+        self.prompts.clear()
+        lead = self.make_lead(email='other@example.com', company='Acme', enriched_job_title='Intern')
+        run_workflow(lead, ask=self.ask)
+        self.assertEqual(len(self.prompts), 4)
+        self.assertEqual(Lead.objects.get(pk=lead.pk).enriched_job_title, 'CTO')
+
+    @override_settings(OPENAI_API_KEY=None)
+    def test_heuristics_without_api_key_are_not_memoized(self):
+        lead = self.make_lead(position='Buyer', status='NEGOTIATION')
+        results = run_workflow(lead)
+        self.assertEqual(results['enrich']['job_title'], 'Buyer')
+        self.assertEqual(results['score']['score'], 80)
+        self.assertEqual(results['route']['routed_to'], 'senior_sales')
+        self.assertFalse(any(step['cached'] for step in run_workflow(lead).values()))
+
+    @override_settings(OPENAI_API_KEY=None)
+    def test_view_queues_job_and_lead_page_polls(self):
+        counsellor = self.counsellors[0]
+        lead = self.make_lead(assigned_counsellor=counsellor)
+        self.client.force_login(counsellor.admin)
+        self.client.get(reverse('run_agentic_workflow', args=[lead.id]))
+        self.client.get(reverse('run_agentic_workflow', args=[lead.id]))
+        job = WorkflowJob.objects.get()
+        self.assertEqual(job.status, 'PENDING')
+
+        response = self.client.get(reverse('lead_detail', args=[lead.id]))
+        self.assertContains(response, reverse('workflow_job_status', args=[job.id]))
+
+        self.assertEqual(run_pending_jobs(), 1)
+        status = self.client.get(reverse('workflow_job_status', args=[job.id])).json()
+        self.assertTrue(status['finished'])
+        self.assertEqual(status['status'], 'COMPLETED')
+        self.assertEqual(Lead.objects.get(pk=lead.pk).routed_to, 'junior_sales')
+
+        self.client.force_login(self.counsellors[1].admin)
+        self.assertEqual(self.client.get(reverse('workflow_job_status', args=[job.id])).status_code, 404)
+
+    @override_settings(OPENAI_API_KEY=None)
+    def test_stale_running_job_is_requeued(self):
+        lead = self.make_lead()
+        job = WorkflowJob.objects.create(lead=lead, status='RUNNING',
+                                         started_at=timezone.now() - timedelta(hours=1))
+        fresh = WorkflowJob.objects.create(lead=self.make_lead(email='b@example.com'), status='RUNNING',
+                                           started_at=timezone.now())
+        self.assertEqual(enqueue_workflow(lead), job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.started_at), ('PENDING', None))
+
+        job.status, job.started_at = 'RUNNING', timezone.now() - timedelta(hours=1)
+        job.save()
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((job.status, fresh.status), ('COMPLETED', 'RUNNING'))
+
+    @override_settings(OPENAI_API_KEY=None, AI_WORKFLOW_BACKGROUND=False)
+    def test_view_runs_inline_without_worker(self):
+        counsellor = self.counsellors[0]
+        lead = self.make_lead(assigned_counsellor=counsellor)
+        self.client.force_login(counsellor.admin)
+        self.client.get(reverse('run_agentic_workflow', args=[lead.id]))
+        self.assertEqual(WorkflowJob.objects.get().status, 'COMPLETED')
+        self.assertEqual(Lead.objects.get(pk=lead.pk).conversion_score, 30)
+
+
+class LLMCacheTests(CRMTestCase):
+    def test_lookup_and_store(self):
+        self.assertEqual(llm_cache.lookup('m', ['a', 'b']), {})
+        llm_cache.store('m', {'a': 'A', 'b': None})
+        with self.assertNumQueries(2):  # select + hit counter update
+            self.assertEqual(llm_cache.lookup('m', ['a', 'b']), {'a': 'A'})
+        self.assertEqual(llm_cache.lookup('other-model', ['a']), {})
+        stats = llm_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries'], stats['entry_hits']), (1, 4, 1, 1))
+
+    def test_expired_entries_are_misses(self):
+        llm_cache.store('m', {'a': 'A'})
+        LLMResponse.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(llm_cache.lookup('m', ['a']), {})
+        self.assertEqual(llm_cache.prune(), 1)
+
+    @override_settings(AI_CACHE_MAX_ENTRIES=10, AI_CACHE_PRUNE_EVERY=1)
+    def test_least_recently_used_entries_are_evicted(self):
+        llm_cache.store('m', {str(i): 'x' for i in range(10)})
+        LLMResponse.objects.update(last_used_at=timezone.now() - timedelta(hours=1))
+        llm_cache.lookup('m', ['0'])  # touch one old entry
+        llm_cache.store('m', {'new': 'x'})
+        keys = set(LLMResponse.objects.values_list('key', flat=True))
+        self.assertEqual(len(keys), 9)
+        self.assertIn(llm_cache.prompt_key('m', '0'), keys)
+        self.assertIn(llm_cache.prompt_key('m', 'new'), keys)
+
+    @override_settings(AI_CACHE_MAX_ENTRIES=1, AI_CACHE_PRUNE_EVERY=10 ** 9)
+    def test_store_counts_the_table_on_a_sample(self):
+        llm_cache.store('m', {'a': 'A'})
+        with self.assertNumQueries(1):  # upsert only
+            llm_cache.store('m', {'b': 'B'})
+        self.assertEqual(LLMResponse.objects.count(), 2)
+        with self.settings(AI_CACHE_PRUNE_EVERY=1):
+            llm_cache.store('m', {'c': 'C'})
+        self.assertEqual(LLMResponse.objects.count(), 0)  # trimmed to 90% of one
+
+    def test_bypass_refreshes_entry(self):
+        answers = iter(['first', 'second'])
+        complete = lambda prompt: next(answers)
+        self.assertEqual(llm_cache.cached_completion('m', 'p', complete), 'first')
+        self.assertEqual(llm_cache.cached_completion('m', 'p', complete), 'first')
+        self.assertEqual(llm_cache.cached_completion('m', 'p', complete, bypass=True), 'second')
+        self.assertEqual(llm_cache.cached_completion('m', 'p', complete), 'second')
+
+    @override_settings(AI_CACHE_ENABLED=False)
+    def test_disabled_cache_stores_nothing(self):
+        llm_cache.cached_completion('m', 'p', lambda prompt: 'x')
+        self.assertFalse(LLMResponse.objects.exists())
+
+    def test_repeated_bulk_scoring_is_served_from_cache(self):
+        Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'c{i}@example.com', phone='0', source=self.source)
+            for i in range(5)
+        ])
+        with StubAIServer(lambda body, n: (200, {'output_text': '64'}, {})) as stub:
+            score_leads(Lead.objects.all(), api_url=stub.url, api_key='test', rate=0)
+            report = score_leads(Lead.objects.all(), api_url=stub.url, api_key='test', rate=0)
+            self.assertEqual(report['cached'], 5)
+            self.assertEqual(len(stub.requests), 5)
+            report = score_leads(Lead.objects.all(), api_url=stub.url, api_key='test', rate=0, bypass_cache=True)
+            self.assertEqual(report['ai'], 5)
+            self.assertEqual(len(stub.requests), 10)
+
+    def test_unparseable_answers_are_not_cached(self):
+        Lead.objects.bulk_create([Lead(first_name='A', last_name='B', email='u@example.com', phone='0', source=self.source)])
+        with StubAIServer(lambda body, n: (200, {'output_text': 'no idea'}, {})) as stub:
+            report = score_leads(Lead.objects.all(), api_url=stub.url, api_key='test', rate=0)
+        self.assertEqual(report['fallback'], 1)
+        self.assertFalse(LLMResponse.objects.exists())
+
+    def test_command_reports_stats(self):
+        llm_cache.store('m', {'a': 'A'})
+        out = StringIO()
+        call_command('llm_cache', stdout=out)
+        self.assertIn('1 entries', out.getvalue())
+        self.assertIn('per process', out.getvalue())
+        call_command('llm_cache', '--clear', stdout=out)
+        self.assertFalse(LLMResponse.objects.exists())
+
+
+class AIClientTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_client()
+        self.addCleanup(reset_client)
+
+    def test_calls_reuse_pooled_connections(self):
+        with StubAIServer(lambda body, n: (200, {'output_text': ' 42 '}, {})) as stub:
+            client = AIClient(stub.url, 'test', pool_size=2)
+            answers = [client.complete('p') for _ in range(5)]
+            client.close()
+        self.assertEqual(answers, ['42'] * 5)
+        self.assertEqual(len(stub.connections), 1)
+        metrics = client.metrics.snapshot()
+        self.assertEqual((metrics['calls'], metrics['succeeded'], metrics['failed']), (5, 5, 0))
+        self.assertGreater(metrics['avg_latency_ms'], 0)
+
+    def test_circuit_opens_and_fails_fast(self):
+        with StubAIServer(lambda body, n: (503, {}, {})) as stub:
+            client = AIClient(stub.url, 'test', failure_threshold=2, reset_after=60)
+            with self.assertLogs('main_app.ai_client', 'WARNING'):
+                results = [client.complete('p', max_retries=0) for _ in range(4)]
+        self.assertEqual(results, [None] * 4)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(client.metrics.snapshot()['short_circuited'], 2)
+
+    def test_half_open_trial_closes_circuit(self):
+        with StubAIServer(lambda body, n: (503 if n == 1 else 200, {'output_text': '9'}, {})) as stub:
+            client = AIClient(stub.url, 'test', failure_threshold=1, reset_after=0)
+            with self.assertLogs('main_app.ai_client', 'WARNING'):
+                self.assertIsNone(client.complete('p', max_retries=0))
+            self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertEqual(client.complete('p', max_retries=0), '9')
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_limiter_wait_past_deadline_keeps_half_open_trial(self):
+        with StubAIServer(lambda body, n: (200, {'output_text': '9'}, {})) as stub:
+            client = AIClient(stub.url, 'test', failure_threshold=1, reset_after=0)
+            client.breaker.record_failure()
+            self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+            limiter = RateLimiter(10, burst=1)
+            limiter.acquire()  # empty the bucket so the next call waits ~0.1s
+            with self.assertLogs('main_app.ai_client', 'WARNING'):
+                self.assertIsNone(client.complete('p', max_retries=0, deadline=0.05, limiter=limiter))
+            self.assertEqual(stub.requests, [])
+            self.assertEqual(client.complete('p', max_retries=0), '9')
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_deadline_bounds_retries(self):
+        with StubAIServer(lambda body, n: (503, {}, {'Retry-After': '0.2'})) as stub:
+            client = AIClient(stub.url, 'test', failure_threshold=100)
+            started = time.monotonic()
+            with self.assertLogs('main_app.ai_client', 'WARNING'):
+                self.assertIsNone(client.complete('p', max_retries=10, deadline=0.5))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertLessEqual(len(stub.requests), 3)
+
+    def test_shared_client_follows_settings(self):
+        with override_settings(AI_API_URL='http://127.0.0.1:1/a'):
+            first = get_client()
+            self.assertIs(get_client(), first)
+        self.assertIsNot(get_client(), first)
+
+    def test_open_circuit_scores_with_heuristic(self):
+        lead = self.make_lead(status='QUALIFIED', priority='HIGH')
+        with StubAIServer(lambda body, n: (200, {'output_text': '90'}, {})) as stub:
+            with override_settings(OPENAI_API_KEY='test', AI_API_URL=stub.url):
+                get_client().breaker.opened_at = time.monotonic()
+                self.assertEqual(score_lead(lead), 65)
+                get_client().breaker.record_success()
+                self.assertEqual(score_lead(lead), 90)
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_status_endpoint_is_admin_only(self):
+        self.client.force_login(self.admin_user)
+        data = self.client.get(reverse('ai_service_status')).json()
+        self.assertEqual(data['client']['circuit'], CircuitBreaker.CLOSED)
+        self.assertIn('entries', data['cache'])
+        self.client.force_login(self.counsellors[0].admin)
+        self.assertEqual(self.client.get(reverse('ai_service_status')).status_code, 302)
+
+
+class HeuristicScoringTests(CRMTestCase):
+    def add_activities(self, lead, count):
+        LeadActivity.objects.bulk_create([
+            LeadActivity(lead=lead, counsellor=self.counsellors[0], activity_type='CALL',
+                         subject='Call', description='Call')
+            for _ in range(count)
+        ])
+
+    def test_features_adjust_open_leads_only(self):
+        now = timezone.now()
+        plain = self.make_lead(email='a@example.com', status='QUALIFIED', priority='HIGH')
+        engaged = self.make_lead(email='b@example.com', status='QUALIFIED', priority='HIGH',
+                                 expected_value=600000, last_contact_date=now - timedelta(days=2))
+        self.add_activities(engaged, 6)
+        stale = self.make_lead(email='c@example.com', status='CONTACTED', priority='LOW',
+                               last_contact_date=now - timedelta(days=200))
+        self.add_activities(stale, 1)
+        won = self.make_lead(email='d@example.com', status='CLOSED_WON', priority='URGENT', expected_value=600000)
+        lost = self.make_lead(email='e@example.com', status='CLOSED_LOST', priority='LOW')
+
+        with self.assertNumQueries(2):  # id bounds + one UPDATE
+            self.assertEqual(rescore_leads(Lead.objects.all()), 5)
+        scores = dict(Lead.objects.values_list('pk', 'conversion_score'))
+        self.assertEqual(scores, {
+            plain.pk: 65,
+            engaged.pk: 60 + 5 + 6 + 5 + 5,
+            stale.pk: 45 - 5 + 2 - 5,
+            won.pk: 100,
+            lost.pk: 0,
+        })
+        self.assertEqual(lead_heuristic(engaged), scores[engaged.pk])
+
+    def test_batches_cover_id_gaps(self):
+        leads = [self.make_lead(email=f'{i}@example.com', status='NEGOTIATION') for i in range(7)]
+        Lead.objects.filter(pk=leads[3].pk).delete()
+        with self.assertNumQueries(1 + 4):
+            self.assertEqual(rescore_leads(Lead.objects.all(), batch_size=2), 6)
+        self.assertEqual(set(Lead.objects.values_list('conversion_score', flat=True)), {80})
+        self.assertEqual(rescore_leads(Lead.objects.filter(status='NEW')), 0)
+
+    def test_command_rescores_filtered_leads(self):
+        self.make_lead(email='a@example.com', status='NEW')
+        self.make_lead(email='b@example.com', status='CONTACTED', conversion_score=90)
+        out = StringIO()
+        call_command('rescore_leads', '--unscored', stdout=out)
+        self.assertIn('Rescored 1 leads', out.getvalue())
+        self.assertEqual(sorted(Lead.objects.values_list('conversion_score', flat=True)), [30, 90])
+
+    @override_settings(OPENAI_API_KEY=None)
+    def test_single_lead_paths_use_the_same_engine(self):
+        lead = self.make_lead(status='PROPOSAL_SENT', expected_value=150000)
+        self.add_activities(lead, 3)
+        self.assertEqual(score_lead(lead), 70 + 4 + 3)
+        self.assertEqual(run_workflow(lead)['score']['score'], 77)
+
+
+class PerformanceRollupTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.month = month_of()
+        self.last_month = month_of(month_start() - timedelta(days=1))
+        self.counsellor = self.counsellors[0]
+
+    def seed(self):
+        leads = [
+            self.make_lead(email=f'{status}@example.com', status=status, assigned_counsellor=self.counsellor)
+            for status in ('NEW', 'CONTACTED', 'QUALIFIED', 'CLOSED_WON')
+        ]
+        LeadActivity.objects.create(lead=leads[1], counsellor=self.counsellor, activity_type='CALL',
+                                    subject='Call', description='Call')
+        LeadActivity.objects.filter(lead=leads[1]).update(completed_date=leads[1].created_at + timedelta(hours=6))
+        self.make_business(leads[3], self.counsellor, value=5000, status='ACTIVE')
+        self.make_business(leads[3], self.counsellor, value=700, status='PENDING')
+        old = self.make_lead(email='old@example.com', status='CLOSED_WON', assigned_counsellor=self.counsellor)
+        Lead.objects.filter(pk=old.pk).update(created_at=month_start() - timedelta(days=3))
+        return leads
+
+    def test_rollup_metrics(self):
+        self.seed()
+        with self.assertNumQueries(3):
+            rollups = build_rollups(self.last_month, self.month)
+        current = rollups[(self.counsellor.id, self.month)]
+        self.assertEqual((current.total_leads_assigned, current.total_leads_contacted,
+                          current.total_leads_qualified), (4, 3, 2))
+        self.assertEqual(current.conversion_rate, 25)
+        self.assertEqual(current.total_business_generated, 5000)
+        self.assertEqual(current.average_response_time, 6)
+        previous = rollups[(self.counsellor.id, self.last_month)]
+        self.assertEqual((previous.total_leads_assigned, previous.conversion_rate), (1, 100))
+        # Every active counsellor gets a row for every month
+        self.assertEqual(len(rollups), 2 * len(self.counsellors))
+
+    def test_rebuild_is_idempotent(self):
+        self.seed()
+        rebuild_performance(self.last_month, self.month)
+        Lead.objects.filter(status='NEW').update(status='CONTACTED')
+        self.assertEqual(rebuild_performance(self.last_month, self.month), 4)
+        self.assertEqual(CounsellorPerformance.objects.count(), 4)
+        row = CounsellorPerformance.objects.get(counsellor=self.counsellor, month=self.month)
+        self.assertEqual(row.total_leads_contacted, 4)
+
+    def test_changes_refresh_rollups_after_commit(self):
+        leads = self.seed()
+        rebuild_performance(self.month)
+        with self.captureOnCommitCallbacks(execute=True):
+            leads[0].status = 'CLOSED_WON'
+            leads[0].save()
+        row = CounsellorPerformance.objects.get(counsellor=self.counsellor, month=self.month)
+        self.assertEqual(row.conversion_rate, 50)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_business(leads[0], self.counsellor, value=1000, status='ACTIVE')
+        row.refresh_from_db()
+        self.assertEqual(row.total_business_generated, 6000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            leads[2].assigned_counsellor = self.counsellors[1]
+            leads[2].save()
+        self.assertEqual(CounsellorPerformance.objects.get(
+            counsellor=self.counsellor, month=self.month).total_leads_assigned, 3)
+        self.assertEqual(CounsellorPerformance.objects.get(
+            counsellor=self.counsellors[1], month=self.month).total_leads_assigned, 1)
+
+    def test_unrelated_saves_skip_the_refresh(self):
+        lead = self.make_lead(assigned_counsellor=self.counsellor, status='CONTACTED')
+        LeadActivity.objects.create(lead=lead, counsellor=self.counsellor, activity_type='CALL',
+                                    subject='Call', description='Call')
+        with self.captureOnCommitCallbacks() as callbacks:
+            lead.conversion_score = 80
+            lead.save(update_fields=['conversion_score'])
+            lead.last_contact_date = timezone.now()
+            lead.save()
+            # Only the first activity sets the response time
+            LeadActivity.objects.create(lead=lead, counsellor=self.counsellor, activity_type='EMAIL',
+                                        subject='Email', description='Email')
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            lead.status = 'QUALIFIED'
+            lead.save(update_fields=['status'])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_bulk_assignment_refreshes_rollups(self):
+        leads = [self.make_lead(email=f'{i}@example.com') for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_plan({self.counsellor.id: [lead.id for lead in leads]})
+        row = CounsellorPerformance.objects.get(counsellor=self.counsellor, month=self.month)
+        self.assertEqual(row.total_leads_assigned, 3)
+
+    def test_page_reads_stored_rows(self):
+        self.seed()
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('counsellor_performance'))
+        self.assertEqual(len(response.context['performance_data']), len(self.counsellors))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('counsellor_performance'))
+        rollup_queries = [q for q in queries if 'main_app_counsellorperformance' in q['sql']]
+        self.assertEqual(len(rollup_queries), 1)
+        self.assertFalse([q for q in queries if 'FROM "main_app_lead"' in q['sql']])
+
+
+class RebuildPerformanceCommandTests(CRMTestCase):
+    def test_backfills_history_and_reruns_safely(self):
+        counsellor = self.counsellors[0]
+        old = self.make_lead(email='old@example.com', status='CLOSED_WON', assigned_counsellor=counsellor)
+        Lead.objects.filter(pk=old.pk).update(created_at=month_start() - timedelta(days=40))
+        self.make_lead(email='new@example.com', assigned_counsellor=counsellor)
+        CounsellorPerformance.objects.create(counsellor=counsellor, month=month_of(), total_leads_assigned=99)
+
+        out = StringIO()
+        call_command('rebuild_performance', stdout=out)
+        # Three months (oldest lead to now) for each counsellor, computed in-process on the test database
+        self.assertIn(f'Rebuilt {3 * len(self.counsellors)} rollups for 3 month(s) with 1 worker(s)', out.getvalue())
+        call_command('rebuild_performance', stdout=StringIO())
+        self.assertEqual(CounsellorPerformance.objects.count(), 3 * len(self.counsellors))
+        rows = dict(CounsellorPerformance.objects.filter(counsellor=counsellor)
+                    .values_list('month', 'total_leads_assigned'))
+        self.assertEqual(sorted(rows.values()), [0, 1, 1])
+        self.assertEqual(rows[month_of()], 1)
+
+    def test_limits_to_months_and_counsellors(self):
+        start = month_of(month_start() - timedelta(days=1))
+        call_command('rebuild_performance', '--start', f'{start:%Y-%m}', '--end', f'{month_of():%Y-%m}',
+                     '--counsellor', str(self.counsellors[1].id), stdout=StringIO())
+        self.assertEqual(set(CounsellorPerformance.objects.values_list('counsellor', 'month')),
+                         {(self.counsellors[1].id, start), (self.counsellors[1].id, month_of())})
+        with self.assertRaises(CommandError):
+            call_command('rebuild_performance', '--start', 'last year', stdout=StringIO())
+
+
+class CounsellorCounterTests(CRMTestCase):
+    def counters(self, counsellor):
+        counsellor.refresh_from_db()
+        return (counsellor.total_leads_assigned, counsellor.total_leads_won,
+                counsellor.total_business_generated, counsellor.performance_rating)
+
+    def test_lead_events_move_counters(self):
+        first, second = self.counsellors
+        lead = self.make_lead(assigned_counsellor=first)
+        other = self.make_lead(email='other@example.com', assigned_counsellor=first)
+        self.assertEqual(self.counters(first), (2, 0, 0, 0))
+
+        lead.status = 'CLOSED_WON'
+        lead.save()
+        self.assertEqual(self.counters(first), (2, 1, 0, Decimal('2.50')))
+
+        # Transfer takes the won lead with it
+        lead = Lead.objects.get(pk=lead.pk)
+        lead.assigned_counsellor = second
+        lead.save()
+        self.assertEqual(self.counters(first), (1, 0, 0, 0))
+        self.assertEqual(self.counters(second), (1, 1, 0, Decimal('5.00')))
+
+        other.delete()
+        self.assertEqual(self.counters(first)[0], 0)
+
+    def test_deferred_status_is_not_counted_as_a_change(self):
+        lead = self.make_lead(status='CLOSED_WON', assigned_counsellor=self.counsellors[0])
+        lead = Lead.objects.only('id', 'assigned_counsellor').get(pk=lead.pk)
+        lead.notes = 'x'
+        lead.save()
+        self.assertEqual(self.counters(self.counsellors[0])[:2], (1, 1))
+
+    def test_business_events_move_counters(self):
+        counsellor = self.counsellors[0]
+        lead = self.make_lead(assigned_counsellor=counsellor)
+        business = self.make_business(lead, counsellor, value=1000, status='PENDING')
+        self.assertEqual(self.counters(counsellor)[2], 0)
+        business.status = 'ACTIVE'
+        business.save()
+        self.assertEqual(self.counters(counsellor)[2], 1000)
+        business.value = 1500
+        business.save()
+        self.assertEqual(self.counters(counsellor)[2], 1500)
+        business.delete()
+        self.assertEqual(self.counters(counsellor)[2], 0)
+
+    def test_bulk_assignment_and_import_move_counters(self):
+        counsellor = self.counsellors[0]
+        leads = [self.make_lead(email=f'{i}@example.com') for i in range(3)]
+        apply_plan({counsellor.id: [lead.id for lead in leads]})
+        self.assertEqual(self.counters(counsellor)[0], 3)
+
+        upload = SimpleUploadedFile('leads.csv', b'first_name,last_name,email,phone\nA,B,new@example.com,1\n')
+        import_leads_file(upload, self.source, assigned_counsellor=counsellor, status='CLOSED_WON')
+        self.assertEqual(self.counters(counsellor)[:2], (4, 1))
+
+    def test_reconcile_fixes_drift(self):
+        counsellor = self.counsellors[0]
+        self.make_lead(status='CLOSED_WON', assigned_counsellor=counsellor)
+        Counsellor.objects.filter(pk=counsellor.pk).update(total_leads_assigned=7, performance_rating=1)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('total_leads_assigned 7 -> 1', out.getvalue())
+        self.assertEqual(self.counters(counsellor)[0], 7)
+        call_command('reconcile_counters', stdout=out)
+        self.assertEqual(self.counters(counsellor), (1, 1, 0, Decimal('5.00')))
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_saving_a_stale_counsellor_keeps_counters(self):
+        stale = Counsellor.objects.get(pk=self.counsellors[0].pk)
+        self.make_lead(assigned_counsellor=stale)
+        stale.department = 'Sales'
+        stale.save()
+        self.assertEqual(self.counters(stale)[0], 1)
+        self.assertEqual(stale.department, 'Sales')
+
+    def test_profile_reads_counters(self):
+        counsellor = self.counsellors[0]
+        self.make_lead(status='CLOSED_WON', assigned_counsellor=counsellor)
+        self.make_lead(email='b@example.com', assigned_counsellor=counsellor)
+        self.client.force_login(counsellor.admin)
+        response = self.client.get(reverse('counsellor_view_profile'))
+        self.assertEqual((response.context['total_leads'], response.context['conversion_rate']), (2, 50))
+
+
+class WorkloadSummaryTests(CRMTestCase):
+    def test_summary_queries_do_not_grow_with_counsellors(self):
+        for i in range(12):
+            self.make_lead(email=f'a{i}@example.com', assigned_counsellor=self.counsellors[0])
+        old = self.make_lead(email='old@example.com')
+        Lead.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=9))
+        self.make_lead(email='new@example.com')
+        with self.assertNumQueries(2):
+            summary = workload_summary()
+        self.assertEqual(summary['unassigned_count'], 2)
+        self.assertEqual(summary['oldest_unassigned_days'], 9)
+        self.assertEqual(summary['avg_leads_per_counsellor'], 6)
+        self.assertEqual(summary['capacity_buckets'], {'LOW': 1, 'MEDIUM': 1, 'HIGH': 0})
+        busy = next(row for row in summary['counsellors'] if row['id'] == self.counsellors[0].id)
+        self.assertEqual((busy['name'], busy['lead_count'], busy['workload_status']), ('Counsellor 0', 12, 'MEDIUM'))
+
+    def test_capacity_bucket_edges(self):
+        self.assertEqual([capacity_bucket(n)[0] for n in (0, 10, 11, 25, 26)],
+                         ['LOW', 'LOW', 'MEDIUM', 'MEDIUM', 'HIGH'])
+
+    def test_page_and_json_endpoint(self):
+        self.make_lead(assigned_counsellor=self.counsellors[1])
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('assign_leads_to_counsellors'))
+        self.assertContains(response, 'Counsellor 1')
+        data = self.client.get(reverse('assignment_workload')).json()
+        self.assertEqual(data['active_counsellors_count'], 2)
+        self.assertEqual(sorted(row['lead_count'] for row in data['counsellors']), [0, 1])
+
+
+class ExportTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin_user)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def csv_rows(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(content)))
+
+    def test_lead_csv_honors_filters_and_ordering(self):
+        self.make_lead(first_name='Ada', email='ada@example.com', status='QUALIFIED',
+                       assigned_counsellor=self.counsellors[0], expected_value=10)
+        self.make_lead(first_name='Bob', email='bob@example.com', status='QUALIFIED', expected_value=20)
+        self.make_lead(first_name='Cy', email='cy@example.com', status='NEW')
+        response = self.export('export_leads', status='QUALIFIED', sort='expected_value', dir='desc')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="leads.csv"')
+        header, *rows = self.csv_rows(response)
+        self.assertEqual(header[:3], ['Lead ID', 'First Name', 'Last Name'])
+        self.assertEqual([row[1] for row in rows], ['Bob', 'Ada'])
+        counsellor = header.index('Counsellor')
+        self.assertEqual([row[counsellor] for row in rows], ['', 'Counsellor 0'])
+
+        rows = self.csv_rows(self.export('export_leads', counsellor='unassigned', q='cy'))[1:]
+        self.assertEqual([row[1] for row in rows], ['Cy'])
+
+    def test_csv_neutralises_formulas(self):
+        self.make_lead(company='=HYPERLINK("http://example.com")')
+        header, row = self.csv_rows(self.export('export_leads'))
+        self.assertEqual(row[header.index('Company')], '\'=HYPERLINK("http://example.com")')
+
+    def test_csv_keeps_phone_numbers(self):
+        self.make_lead(phone='+234 (803) 555-0101', company='-2+3', position='-12.5')
+        header, row = self.csv_rows(self.export('export_leads'))
+        self.assertEqual(row[header.index('Phone')], '+234 (803) 555-0101')
+        self.assertEqual(row[header.index('Position')], '-12.5')
+        self.assertEqual(row[header.index('Company')], "'-2+3")
+
+    def test_lead_export_query_count_is_constant(self):
+        for i in range(30):
+            self.make_lead(email=f'l{i}@example.com', assigned_counsellor=self.counsellors[i % 2])
+        with override_settings(EXPORT_CHUNK_SIZE=7), CaptureQueriesContext(connection) as queries:
+            rows = self.csv_rows(self.export('export_leads'))[1:]
+        self.assertEqual(len(rows), 30)
+        # Session/user lookups plus the single export query
+        self.assertEqual(sum('main_app_lead' in query['sql'] for query in queries), 1)
+
+    def test_business_xlsx(self):
+        lead = self.make_lead(first_name='Ada')
+        self.make_business(lead, self.counsellors[1], title='Big deal', status='ACTIVE', value=1500)
+        self.make_business(lead, self.counsellors[1], title='Small deal', status='PENDING')
+        response = self.export('export_businesses', format='xlsx', status='ACTIVE')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'],
+                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        header, *rows = list(workbook.active.values)
+        self.assertEqual(len(rows), 1)
+        row = dict(zip(header, rows[0]))
+        self.assertEqual((row['Title'], row['Lead'], row['Counsellor'], row['Value']),
+                         ('Big deal', 'Ada Person', 'Counsellor 1', 1500))
+
+    @override_settings(XLSX_EXPORT_MAX_ROWS=2)
+    def test_large_xlsx_export_falls_back_to_csv(self):
+        for i in range(3):
+            self.make_lead(email=f'x{i}@example.com')
+        response = self.export('export_leads', format='xlsx')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="leads.csv"')
+        self.assertEqual(len(self.csv_rows(response)), 4)
+        response = self.export('export_leads', format='xlsx', q='x1')
+        self.assertEqual(response['Content-Type'],
+                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    def test_counsellor_exports_only_own_activities(self):
+        lead = self.make_lead(assigned_counsellor=self.counsellors[0])
+        for counsellor, activity_type in ((0, 'CALL'), (0, 'EMAIL'), (1, 'CALL')):
+            LeadActivity.objects.create(lead=lead, counsellor=self.counsellors[counsellor],
+                                        activity_type=activity_type, subject=activity_type, description='-')
+        self.client.force_login(self.counsellors[0].admin)
+        rows = self.csv_rows(self.export('export_my_activities', activity_type='CALL'))[1:]
+        self.assertEqual([row[5] for row in rows], ['CALL'])
+        rows = self.csv_rows(self.export('export_my_activities'))[1:]
+        self.assertEqual(sorted(row[4] for row in rows), ['CALL', 'EMAIL'])
+
+
+class LeadSearchTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ada = self.make_lead(first_name='Adaeze', last_name='Okafor', email='ada@acme.io',
+                                  phone='08031234567', company='Acme Ltd')
+        self.noted = self.make_lead(first_name='Bola', last_name='Ade', email='bola@example.com',
+                                    notes='Referred by Adaeze from the conference')
+        self.other = self.make_lead(first_name='Chidi', last_name='Eze', email='chidi@example.com')
+
+    def found(self, text):
+        return set(search_filter(Lead.objects.all(), text).values_list('id', flat=True))
+
+    def test_sqlite_uses_fts5_table(self):
+        self.assertEqual(search_backend(), 'fts5')
+        self.assertEqual(self.found('adaeze okafor'), {self.ada.id})
+        self.assertEqual(self.found('ACME'), {self.ada.id})
+        self.assertEqual(self.found('0803'), {self.ada.id})
+        self.assertEqual(self.found('ada@acme.io'), {self.ada.id})
+        self.assertEqual(self.found(str(self.other.lead_id)), {self.other.id})
+        self.assertEqual(self.found('nobody'), set())
+
+    def test_ranked_pages_prefer_name_over_notes(self):
+        self.assertEqual(ranked_lead_ids('adaeze'), [self.ada.id, self.noted.id])
+        self.assertEqual(ranked_lead_ids('adaeze', offset=1, limit=1), [self.noted.id])
+
+    def test_index_follows_saves_deletes_and_imports(self):
+        self.other.company = 'Zenith Partners'
+        self.other.save()
+        self.assertEqual(self.found('zenith'), {self.other.id})
+        self.other.delete()
+        self.assertEqual(self.found('zenith'), set())
+
+        header = 'first_name,last_name,email,phone,company\n'
+        upload = SimpleUploadedFile('leads.csv', (header + 'Ngozi,Obi,ngozi@example.com,1,Orbit\n').encode())
+        import_leads_file(upload, self.source)
+        self.assertEqual(Lead.objects.filter(id__in=list(self.found('orbit'))).get().first_name, 'Ngozi')
+
+    def test_listing_and_search_endpoint(self):
+        self.client.force_login(self.admin_user)
+        data = self.client.get(reverse('manage_leads_data'), {'search[value]': 'okafor', 'length': 10}).json()
+        self.assertEqual([row['id'] for row in data['data']], [self.ada.id])
+
+        for i in range(30):
+            self.make_lead(first_name='Tunde', email=f'tunde{i}@example.com')
+        first = self.client.get(reverse('search_leads'), {'q': 'tunde'}).json()
+        second = self.client.get(reverse('search_leads'), {'q': 'tunde', 'page': 2}).json()
+        self.assertEqual((len(first['results']), first['has_next']), (25, True))
+        self.assertEqual((len(second['results']), second['has_next']), (5, False))
+
+    def test_rebuild_command_repopulates_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.found('okafor'), set())
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 lead(s)', out.getvalue())
+        self.assertEqual(self.found('okafor'), {self.ada.id})
+
+
+class ProfilingMiddlewareTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        clear_requests()
+        self.client.force_login(self.admin_user)
+
+    def test_records_queries_and_sets_server_timing(self):
+        self.make_lead()
+        response = self.client.get(reverse('manage_leads_data'))
+        profile = recent_requests()[-1]
+        self.assertEqual((profile['view'], profile['status']), ('manage_leads_data', 200))
+        self.assertGreater(profile['queries'], 0)
+        self.assertFalse(profile['over_budget'])
+        self.assertEqual(response['Server-Timing'],
+                         f'app;dur={profile["duration_ms"]:.1f}, db;dur={profile["db_ms"]:.1f};'
+                         f'desc="{profile["queries"]} queries"')
+
+    def test_recorder_counts_repeated_statements(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for counsellor in self.counsellors:
+                CustomUser.objects.get(pk=counsellor.admin_id)
+            Lead.objects.count()
+        self.assertEqual((recorder.count, recorder.duplicates), (3, 1))
+        self.assertEqual(recorder.repeated()[0][1], 2)
+
+    @override_settings(QUERY_BUDGETS={'manage_leads_data': 1})
+    def test_budget_overrun_fails_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('manage_leads_data'))
+        with override_settings(QUERY_BUDGET_STRICT=False), \
+                self.assertLogs('main_app.profiling', level='WARNING') as logs:
+            response = self.client.get(reverse('manage_leads_data'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view=manage_leads_data', logs.output[0])
+        self.assertIn('budget=1', logs.output[0])
+
+    def test_server_timing_marks_new_connections(self):
+        profile = {'duration_ms': 12.0, 'db_ms': 3.0, 'queries': 2, 'new_connection': True}
+        self.assertTrue(server_timing(profile).endswith(', conn;desc="new"'))
+        profile['new_connection'] = False
+        self.assertNotIn('conn;', server_timing(profile))
+
+    def test_summary_page_is_admin_only(self):
+        for _ in range(3):
+            self.client.get(reverse('manage_leads'))
+        self.assertEqual(profile_summary()[0]['requests'], 3)
+        response = self.client.get(reverse('profiling_summary'))
+        self.assertContains(response, 'manage_leads')
+        self.client.force_login(self.counsellors[0].admin)
+        self.assertRedirects(self.client.get(reverse('profiling_summary')), reverse('counsellor_home'),
+                             fetch_redirect_response=False)
+
+
+class RoleRoutingTests(CRMTestCase):
+    def user_queries(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT "main_app_customuser"')]
+
+    def test_login_caches_role_in_session(self):
+        self.client.post(reverse('user_login'), {'email': 'counsellor0@example.com', 'password': 'counsellor123'})
+        counsellor = self.counsellors[0]
+        self.assertEqual(self.client.session[ROLE_SESSION_KEY], [str(counsellor.admin_id), '2', counsellor.id])
+
+    def test_admin_is_routed_away_without_user_query(self):
+        self.client.force_login(self.admin_user)
+        with self.assertNumQueries(1):  # session only; the role is read from it
+            response = self.client.get(reverse('counsellor_home'))
+        self.assertRedirects(response, reverse('admin_home'), fetch_redirect_response=False)
+
+    def test_counsellor_view_loads_user_with_profile(self):
+        self.client.force_login(self.counsellors[0].admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('counsellor_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_password_change_logs_session_out(self):
+        self.client.force_login(self.counsellors[0].admin)
+        user = CustomUser.objects.get(pk=self.counsellors[0].admin_id)
+        user.set_password('changed123')
+        user.save()
+        response = self.client.get(reverse('counsellor_home'))
+        self.assertRedirects(response, reverse('login_page'), fetch_redirect_response=False)
+
+    def test_stale_role_is_resolved_again(self):
+        self.client.force_login(self.counsellors[1].admin)
+        session = self.client.session
+        session[ROLE_SESSION_KEY] = [str(self.counsellors[1].admin_id), '2', self.counsellors[0].id]
+        session.save()
+        response = self.client.get(reverse('counsellor_view_profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.counsellor, self.counsellors[1])
+        self.assertEqual(self.client.session[ROLE_SESSION_KEY][2], self.counsellors[1].id)
+
+    def test_counsellor_without_profile_gets_404(self):
+        user = CustomUser.objects.create_user(email='orphan@example.com', password='orphan123', user_type='2')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('counsellor_home')).status_code, 404)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class SessionStorageTests(CRMTestCase):
+    def make_session(self, expires_in):
+        store = session_store()()
+        store.set_expiry(expires_in)
+        store.create()
+        return store.session_key
+
+    def test_session_is_read_from_cache(self):
+        self.client.force_login(self.counsellors[0].admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('my_leads_data'))
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+
+    def test_cache_miss_falls_back_to_database(self):
+        self.client.force_login(self.counsellors[0].admin)
+        caches['sessions'].clear()
+        self.assertEqual(self.client.get(reverse('counsellor_home')).status_code, 200)
+
+    def test_messages_use_signed_cookie(self):
+        response = self.client.post(reverse('user_login'), {'email': 'nobody@example.com', 'password': 'x'})
+        self.assertIn('messages', response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_prune_deletes_only_expired_sessions(self):
+        live = self.make_session(3600)
+        for _ in range(3):
+            self.make_session(-60)
+        self.assertEqual(prune_sessions(batch_size=2), 3)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [live])
+
+    def test_command_and_worker_prune(self):
+        self.make_session(-60)
+        out = StringIO()
+        call_command('prune_sessions', stdout=out)
+        self.assertIn('Deleted 1 expired session(s)', out.getvalue())
+        self.make_session(-60)
+        out = StringIO()
+        call_command('run_worker', once=True, stdout=out)
+        self.assertIn('Pruned 1 expired session(s)', out.getvalue())
+        self.assertFalse(Session.objects.exists())
+
+
+class LoadTestTests(LiveServerTestCase):
+    def setUp(self):
+        for i in range(2):
+            user = CustomUser.objects.create_user(email=f'load{i}@seed.example.com', password='counsellor123',
+                                                  user_type='2')
+            Counsellor.objects.create(admin=user, employee_id=f'LOAD{i}')
+
+    def test_concurrent_logins_are_measured(self):
+        credentials = [(f'load{i}@seed.example.com', 'counsellor123') for i in range(2)]
+        report = run_load_test(self.live_server_url, credentials, users=2, rounds=2)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['total']['requests'], 2 * 2 * 5)  # login page, login, three pages
+        self.assertEqual(set(report['steps']), {'login_page', 'login', 'counsellor_home', 'my_leads_data',
+                                                'my_activities'})
+        self.assertEqual(compare_load_reports(report, report)[-1][0], 'total')
+
+    def test_rejected_login_is_an_error(self):
+        report = run_load_test(self.live_server_url, [('load0@seed.example.com', 'wrong')], users=1, rounds=1)
+        self.assertEqual(report['steps']['login']['errors'], 1)
+        self.assertNotIn('counsellor_home', report['steps'])
+
+    def test_command_uses_seeded_counsellors(self):
+        out = StringIO()
+        call_command('load_test', url=self.live_server_url, users=2, rounds=1, stdout=out)
+        self.assertIn('total', out.getvalue())
+        self.assertIn('2 users x 1 logins', out.getvalue())
+
+
+class SeedCRMTests(CRMTestCase):
+    def test_seed_builds_consistent_data(self):
+        out = StringIO()
+        call_command('seed_crm', leads=300, counsellors=3, batch_size=120, months=6, stdout=out)
+        self.assertIn('300 leads', out.getvalue())
+        seeded = Lead.objects.all()
+        self.assertEqual(seeded.count(), 300)
+        self.assertFalse(seeded.exclude(status='NEW').filter(assigned_counsellor__isnull=True).exists())
+        self.assertLess(seeded.order_by('created_at').first().created_at, timezone.now() - timedelta(days=31))
+        self.assertTrue(LeadActivity.objects.exists())
+        self.assertFalse(Business.objects.exclude(lead__status__in=['CLOSED_WON', 'NEGOTIATION']).exists())
+        self.assertTrue(NotificationCounsellor.objects.exists())
+        # Derived data is brought up to date after the bulk inserts
+        self.assertEqual(reconcile_counters(fix=False), [])
+        lead = seeded.first()
+        self.assertIn(lead.id, search_filter(Lead.objects.all(), lead.email).values_list('id', flat=True))
+        self.assertTrue(CounsellorPerformance.objects.filter(month=month_of()).exists())
+
+    def test_same_seed_same_leads(self):
+        now = timezone.now()
+        first, second = CRMSeeder(seed=7, now=now), CRMSeeder(seed=7, now=now)
+        leads = [(seeder.make_lead([1, 2], [self.source.id], now - timedelta(days=30))) for seeder in (first, second)]
+        fields = ('email', 'status', 'assigned_counsellor_id', 'created_at', 'expected_value')
+        self.assertEqual(*[[getattr(lead, field) for field in fields] for lead in leads])
+        self.assertNotEqual(*[lead.lead_id for lead in leads])
+
+    def test_seeding_twice_with_the_same_seed(self):
+        for _ in range(2):
+            call_command('seed_crm', leads=100, counsellors=2, stdout=StringIO())
+        self.assertEqual(Lead.objects.count(), 200)
+        self.assertEqual(Counsellor.objects.filter(admin__email__endswith='@seed.example.com').count(), 4)
+
+
+class BenchmarkCommandTests(CRMTestCase):
+    def test_writes_json_report_and_rolls_back_writes(self):
+        CRMSeeder(leads=200, counsellors=2, batch_size=100).run()
+        leads = Lead.objects.count()
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('benchmark_crm', only=['view.manage_leads_data', 'write.import_leads',
+                                                'write.assign.round_robin'],
+                         repeat=2, import_rows=50, assign=20, output=output.name, stdout=StringIO())
+            report = json.load(open(output.name))
+        self.assertEqual(report['data']['leads'], leads)
+        self.assertEqual(set(report['results']),
+                         {'view.manage_leads_data', 'write.import_leads', 'write.assign.round_robin'})
+        for result in report['results'].values():
+            self.assertEqual(result['runs'], 2)
+            self.assertGreater(result['queries'], 0)
+        self.assertEqual(Lead.objects.count(), leads)
+        self.assertEqual(Lead.objects.filter(assigned_counsellor__isnull=True).count(),
+                         report['data']['leads'] - sum(Counsellor.objects.values_list('total_leads_assigned', flat=True)))
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_crm', only=['nope'], stdout=StringIO())
@@ -45,11 +45,16 @@ urlpatterns = [
     
     # Lead Management
     path("leads/manage/", admin_views.manage_leads, name='manage_leads'),
+    path("leads/manage/data/", admin_views.manage_leads_data, name='manage_leads_data'),
+    path("leads/search/", admin_views.search_leads, name='search_leads'),
+    path("leads/export/", admin_views.export_leads, name='export_leads'),
     path("leads/add/", admin_views.add_lead, name='add_lead'),
     path("leads/edit/<int:lead_id>/", admin_views.edit_lead, name='edit_lead'),
     path("leads/delete/<int:lead_id>/", admin_views.delete_lead, name='delete_lead'),
     path("leads/import/", admin_views.import_leads, name='import_leads'),
+    path("leads/import/jobs/<int:job_id>/", admin_views.import_job_status, name='import_job_status'),
     path("leads/assign/", admin_views.assign_leads_to_counsellors, name='assign_leads_to_counsellors'),
+    path("leads/assign/workload/", admin_views.assignment_workload, name='assignment_workload'),
     path("leads/transfer/<int:lead_id>/", admin_views.transfer_lead, name='transfer_lead'),
     
     # Lead Sources
@@ -60,12 +65,15 @@ urlpatterns = [
     
     # Business Management
     path("businesses/manage/", admin_views.manage_businesses, name='manage_businesses'),
+    path("businesses/export/", admin_views.export_businesses, name='export_businesses'),
     
     # Notifications
     path("notifications/send/", admin_views.send_counsellor_notification, name='send_counsellor_notification'),
     
     # Analytics
     path("analytics/leads/", admin_views.get_lead_analytics, name='get_lead_analytics'),
+    path("analytics/ai/", admin_views.ai_service_status, name='ai_service_status'),
+    path("analytics/profiling/", admin_views.profiling_summary, name='profiling_summary'),
     
     # Counsellor URLs
     path('counsellor/home/', counsellor_views.counsellor_home, name='counsellor_home'),
@@ -75,6 +83,7 @@ urlpatterns = [
     
     # Counsellor Lead Management
     path('counsellor/leads/', counsellor_views.my_leads, name='my_leads'),
+    path('counsellor/leads/data/', counsellor_views.my_leads_data, name='my_leads_data'),
     path('counsellor/leads/<int:lead_id>/', counsellor_views.lead_detail, name='lead_detail'),
     path('counsellor/leads/<int:lead_id>/activity/add/', counsellor_views.add_lead_activity, name='add_lead_activity'),
     path('counsellor/leads/<int:lead_id>/status/update/', counsellor_views.update_lead_status, name='update_lead_status'),
@@ -83,6 +92,7 @@ urlpatterns = [
     path('counsellor/leads/<int:lead_id>/follow-up/schedule/', counsellor_views.schedule_follow_up, name='schedule_follow_up'),
     path('counsellor/leads/<int:lead_id>/conversion/evaluate/', counsellor_views.evaluate_conversion_score, name='evaluate_conversion_score'),
     path('counsellor/leads/<int:lead_id>/workflow/run/', counsellor_views.run_agentic_workflow, name='run_agentic_workflow'),
+    path('counsellor/workflow/jobs/<int:job_id>/', counsellor_views.workflow_job_status, name='workflow_job_status'),
     path('counsellor/leads/<int:lead_id>/mark-lost/', counsellor_views.mark_lead_lost, name='mark_lead_lost'),
     
     # Counsellor Business Management
@@ -92,6 +102,7 @@ urlpatterns = [
     
     # Counsellor Activities
     path('counsellor/activities/', counsellor_views.my_activities, name='my_activities'),
+    path('counsellor/activities/export/', counsellor_views.export_my_activities, name='export_my_activities'),
     
     # Counsellor Analytics
     path('counsellor/analytics/', counsellor_views.get_my_analytics, name='get_my_analytics'),
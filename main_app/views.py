@@ -9,6 +9,7 @@ from django.views.decorators.http import require_POST
 
 from .EmailBackend import EmailBackend
 from .models import Lead, NotificationCounsellor, NotificationAdmin, Counsellor
+from .notifications import forget_admin_unread_count, forget_counsellor_unread_count
 from django.core.management import call_command
 from django.http import HttpResponse
 from io import StringIO
@@ -96,9 +97,10 @@ messaging.setBackgroundMessageHandler(function (payload) {
 
 
 def counsellor_view_notification(request):
-    counsellor = get_object_or_404(Counsellor, admin=request.user)
+    counsellor = request.counsellor or get_object_or_404(Counsellor, admin=request.user)
     # Mark all as read
     NotificationCounsellor.objects.filter(counsellor=counsellor, is_read=False).update(is_read=True)
+    forget_counsellor_unread_count(counsellor)
     notifications = NotificationCounsellor.objects.filter(counsellor=counsellor)
     context = {
         'notifications': notifications,
@@ -110,6 +112,7 @@ def counsellor_view_notification(request):
 def admin_view_notification(request):
     # Mark all as read
     NotificationAdmin.objects.filter(is_read=False).update(is_read=True)
+    forget_admin_unread_count()
     notifications = NotificationAdmin.objects.all()
     context = {
         'notifications': notifications,
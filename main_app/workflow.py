@@ -0,0 +1,252 @@
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import llm_cache
+from .ai_client import get_client
+from .scoring import lead_heuristic, parse_score
+
+ROUTES = ('junior_sales', 'mid_sales', 'senior_sales', 'enterprise_team')
+ROUTE_PATTERN = re.compile(r'route\s*=\s*(%s)' % '|'.join(ROUTES))
+
+
+def _step_timeout():
+    return getattr(settings, 'AI_WORKFLOW_STEP_CACHE_TIMEOUT', 7 * 24 * 60 * 60)
+
+
+def _money(value):
+    # Same text for a fresh instance (float default) and a loaded one (Decimal)
+    return f"{Decimal(str(value or 0)):.2f}"
+
+
+def enrich_inputs(lead):
+    return {
+        'company': lead.company,
+        'position': lead.position,
+        'industry': lead.industry,
+        'notes': lead.notes,
+    }
+
+
+def score_inputs(lead, job_title):
+    return {
+        'company': lead.company,
+        'position': lead.position,
+        'job_title': job_title,
+        'industry': lead.industry,
+        'status': lead.status,
+        'priority': lead.priority,
+        'expected_value': _money(lead.expected_value),
+        'notes': lead.notes,
+    }
+
+
+def route_inputs(lead, job_title, score):
+    return {
+        'score': score,
+        'expected_value': _money(lead.expected_value),
+        'job_title': job_title or lead.position,
+        'industry': lead.industry,
+    }
+
+
+def enrichment_prompt(inputs):
+    return (
+        "You are a data enricher. Given lead data, infer a likely LinkedIn-style job title.\n"
+        "Return JSON with keys: job_title, notes. Keep it brief.\n\n"
+        f"Company: {inputs['company'] or '-'}\n"
+        f"Existing Position: {inputs['position'] or '-'}\n"
+        f"Industry: {inputs['industry'] or '-'}\n"
+        f"Notes: {inputs['notes'] or '-'}\n"
+    )
+
+
+def parse_enrichment(inputs, text):
+    """Agent 1: a LinkedIn-style job title; returns (result, from_model)"""
+    job_title = notes = None
+    if text:
+        m = re.search(r'job_title\s*[:\"]\s*([^\n\"]+)', text, re.I)
+        n = re.search(r'notes\s*[:\"]\s*([^\n]+)', text, re.I)
+        job_title = m.group(1).strip()[:150] if m else None
+        notes = n.group(1).strip() if n else None
+    from_model = bool(job_title)
+    if not job_title:
+        job_title = inputs['position'] or ('Head of ' + inputs['industry'] if inputs['industry'] else 'Decision Maker')
+    if not notes:
+        notes = 'Enriched via heuristic based on existing fields.'
+    return {'job_title': job_title, 'notes': notes}, from_model
+
+
+def scoring_prompt(inputs):
+    description_parts = [
+        f"Company: {inputs['company'] or '-'}",
+        f"Position: {inputs['position'] or '-'} | Enriched: {inputs['job_title'] or '-'}",
+        f"Industry: {inputs['industry'] or '-'}",
+        f"Status: {inputs['status']}",
+        f"Priority: {inputs['priority']}",
+        f"Expected Value: {inputs['expected_value']}",
+        f"Notes: {inputs['notes'] or '-'}",
+    ]
+    return "\n".join(description_parts) + "\n\nReturn ONLY an integer 0-100 for conversion likelihood."
+
+
+def parse_scoring(inputs, text):
+    """Agent 2: conversion score 0-100, None for run_workflow to fill in; returns (result, from_model)"""
+    value = parse_score(text)
+    return {'score': value}, value is not None
+
+
+def routing_prompt(inputs):
+    return (
+        "You are a sales router. Decide assignment path and explain briefly.\n"
+        "Options: junior_sales, mid_sales, senior_sales, enterprise_team.\n"
+        "Respond as: route=<option>\nreason=<one line>.\n\n"
+        f"Score: {inputs['score']}\n"
+        f"Expected Value: {inputs['expected_value']}\n"
+        f"Job Title: {inputs['job_title'] or '-'}\n"
+        f"Industry: {inputs['industry'] or '-'}\n"
+    )
+
+
+def parse_routing(inputs, text):
+    """Agent 3: a sales route and the reason for it; returns (result, from_model)"""
+    text = (text or '').lower()
+    m = ROUTE_PATTERN.search(text)
+    n = re.search(r'reason\s*=\s*(.+)', text)
+    routed_to = m.group(1) if m else None
+    reason = n.group(1).strip() if n else None
+    from_model = bool(routed_to)
+    if not routed_to:
+        # Heuristic: high value or score -> senior/enterprise
+        value = float(inputs['expected_value'] or 0)
+        lead_score = inputs['score'] or 0
+        if value >= 500000 or lead_score >= 80:
+            routed_to = 'senior_sales'
+        elif value >= 200000 or lead_score >= 60:
+            routed_to = 'mid_sales'
+        else:
+            routed_to = 'junior_sales'
+    if not reason:
+        reason = f"Assigned to {routed_to.replace('_', ' ')} based on score {inputs['score']} and value {inputs['expected_value']}."
+    return {'routed_to': routed_to, 'reason': reason[:1000]}, from_model
+
+
+STEPS = {
+    'enrich': (enrichment_prompt, parse_enrichment),
+    'score': (scoring_prompt, parse_scoring),
+    'route': (routing_prompt, parse_routing),
+}
+
+
+class ModelCalls:
+    """
+    Model access for one workflow run: the LLM response cache first, then
+    `complete(prompt)`. Cache reads and writes stay on the calling thread;
+    only `complete` runs on the pool, so it must not touch the database.
+    """
+
+    def __init__(self, complete, model, bypass_cache=False):
+        self.complete = complete
+        self.model = model
+        self.bypass_cache = bypass_cache
+        self.known = {}
+        self.pending = {}
+
+    def prefetch(self, prompts):
+        """Look several prompts up in the cache with one query"""
+        if not self.bypass_cache:
+            self.known.update(llm_cache.lookup(self.model, [p for p in prompts if p not in self.known]))
+
+    def start(self, pool, prompt):
+        """Begin an uncached call in the background"""
+        if prompt not in self.known and prompt not in self.pending:
+            self.pending[prompt] = pool.submit(self.complete, prompt)
+
+    def get(self, prompt):
+        """(text, fresh): fresh answers are not in the cache yet"""
+        if prompt in self.known:
+            return self.known[prompt], False
+        if prompt in self.pending:
+            return self.pending.pop(prompt).result(), True
+        self.prefetch([prompt])
+        if prompt in self.known:
+            return self.known[prompt], False
+        return self.complete(prompt), True
+
+    def remember(self, prompt, text):
+        llm_cache.store(self.model, {prompt: text})
+
+
+def step_key(step, inputs):
+    """Cache key for a step result: the step name plus a hash of its inputs"""
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+    return f'workflow:{step}:{digest}'
+
+
+def run_step(step, inputs, calls):
+    """
+    Run one workflow step, memoized on its inputs.
+
+    Only answers that came from the model are cached, so a lead scored by
+    the heuristic while the API was unavailable is retried next time.
+    """
+    key = step_key(step, inputs)
+    result = cache.get(key)
+    if result is not None:
+        return dict(result, cached=True)
+    build_prompt, parse = STEPS[step]
+    prompt = build_prompt(inputs)
+    text, fresh = calls.get(prompt) if calls else (None, False)
+    result, from_model = parse(inputs, text)
+    if from_model:
+        cache.set(key, result, _step_timeout())
+        if fresh:
+            calls.remember(prompt, text)
+    return dict(result, cached=False)
+
+
+def run_workflow(lead, ask=None, bypass_cache=False):
+    """
+    Enrich, score and route `lead`, then save it once.
+
+    `ask(prompt)` returns the model's text (or None); by default it is the
+    shared AI client when a key is set. Scoring depends on the enriched
+    title, so while enrichment is in flight the lead is speculatively scored
+    with the title from the previous run; that result is used when the title
+    comes back unchanged. Returns the per-step results.
+    """
+    if ask is None and settings.OPENAI_API_KEY:
+        ask = get_client().complete
+    calls = ModelCalls(ask, settings.AI_MODEL, bypass_cache) if ask else None
+
+    enrichment_in = enrich_inputs(lead)
+    speculative_in = score_inputs(lead, lead.enriched_job_title) if lead.enriched_job_title else None
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        if calls and speculative_in and cache.get(step_key('score', speculative_in)) is None:
+            speculative_prompt = scoring_prompt(speculative_in)
+            calls.prefetch([enrichment_prompt(enrichment_in), speculative_prompt])
+            calls.start(pool, speculative_prompt)
+        enrichment = run_step('enrich', enrichment_in, calls)
+        scoring = run_step('score', score_inputs(lead, enrichment['job_title']), calls)
+        if scoring['score'] is None:
+            scoring['score'] = lead_heuristic(lead)
+        routing = run_step('route', route_inputs(lead, enrichment['job_title'], scoring['score']), calls)
+    finally:
+        # Don't wait for a speculative score that turned out to be unneeded
+        pool.shutdown(wait=False)
+
+    lead.enriched_job_title = enrichment['job_title']
+    lead.enrichment_notes = enrichment['notes']
+    lead.conversion_score = scoring['score']
+    lead.routed_to = routing['routed_to']
+    lead.routing_reason = routing['reason']
+    lead.save(update_fields=[
+        'enriched_job_title', 'enrichment_notes', 'conversion_score', 'routed_to', 'routing_reason',
+    ])
+    return {'enrich': enrichment, 'score': scoring, 'route': routing}
@@ -0,0 +1,59 @@
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Counsellor, Lead
+
+# (highest lead count in the bucket, status, label); the last bucket is open-ended
+CAPACITY_BUCKETS = (
+    (10, 'LOW', 'Low (≤10 leads)'),
+    (25, 'MEDIUM', 'Medium (11-25 leads)'),
+    (None, 'HIGH', 'High (26+ leads)'),
+)
+
+
+def capacity_bucket(lead_count):
+    """(workload_status, capacity label) for a counsellor holding lead_count leads"""
+    for limit, status, label in CAPACITY_BUCKETS:
+        if limit is None or lead_count <= limit:
+            return status, label
+
+
+def workload_summary(now=None):
+    """
+    Assignment page summary in two queries: active counsellors with their
+    lead counters (joined to the user row), and the unassigned backlog's
+    size and oldest creation time (served by lead_unassigned_idx).
+    """
+    now = now or timezone.now()
+    rows = Counsellor.objects.filter(is_active=True).order_by('admin__first_name', 'admin__last_name', 'id').values(
+        'id', 'department', 'total_leads_assigned',
+        'admin__first_name', 'admin__last_name', 'admin__email',
+    )
+    counsellors = []
+    buckets = {status: 0 for _, status, _ in CAPACITY_BUCKETS}
+    for row in rows:
+        status, label = capacity_bucket(row['total_leads_assigned'])
+        buckets[status] += 1
+        counsellors.append({
+            'id': row['id'],
+            'name': f"{row['admin__first_name']} {row['admin__last_name']}".strip(),
+            'email': row['admin__email'],
+            'department': row['department'],
+            'lead_count': row['total_leads_assigned'],
+            'capacity': label,
+            'workload_status': status,
+        })
+
+    backlog = Lead.objects.filter(assigned_counsellor__isnull=True).aggregate(
+        count=Count('id'), oldest=Min('created_at'),
+    )
+    total_assigned = sum(counsellor['lead_count'] for counsellor in counsellors)
+    return {
+        'unassigned_count': backlog['count'],
+        'oldest_unassigned_at': backlog['oldest'],
+        'oldest_unassigned_days': (now - backlog['oldest']).days if backlog['oldest'] else 0,
+        'active_counsellors_count': len(counsellors),
+        'avg_leads_per_counsellor': round(total_assigned / len(counsellors), 1) if counsellors else 0,
+        'capacity_buckets': buckets,
+        'counsellors': counsellors,
+    }